@@ -7,6 +7,7 @@ This is where we discover what makes songs successful.
 
 Usage:
     python analyze_performance.py --input ./lyric_embeddings --performance billboard.csv
+    python analyze_performance.py --input ./lyric_embeddings --profile
 """
 
 from __future__ import annotations
@@ -17,20 +18,18 @@ from pathlib import Path
 from typing import Optional
 
 import numpy as np
-import pandas as pd
-from scipy import stats
 
+from embedding_store import load_metadata
+from lazy_imports import lazy_import
+from pipeline_profile import RunProfiler, add_profile_args
 
-def load_cluster_data(input_dir: Path) -> tuple[list[dict], np.ndarray]:
-    """Load songs metadata and cluster labels."""
-    labels = np.load(input_dir / "cluster_labels.npy")
+pd = lazy_import("pandas")
 
-    songs = []
-    with open(input_dir / "metadata.jsonl", "r", encoding="utf-8") as f:
-        for line in f:
-            if line.strip():
-                songs.append(json.loads(line))
 
+def load_cluster_data(input_dir: Path) -> tuple[list[dict], np.ndarray]:
+    """Load the song fields used for matching (any layout) and cluster labels."""
+    labels = np.load(input_dir / "cluster_labels.npy")
+    songs = load_metadata(input_dir, columns=["id", "title", "artist"])
     return songs, labels
 
 
@@ -311,22 +310,28 @@ def main():
     parser.add_argument("--metric", type=str, default="streams", help="Performance metric column")
     parser.add_argument("--match-on", type=str, default="title", choices=["title", "title_artist", "id"])
     parser.add_argument("--output", "-o", type=Path, help="Output directory")
+    add_profile_args(parser)
 
     args = parser.parse_args()
+    profiler = RunProfiler.from_args(args, "analyze_performance")
 
     output_dir = args.output or args.input
 
     # Load cluster data
-    songs, labels = load_cluster_data(args.input)
+    with profiler.stage("load") as stage:
+        songs, labels = load_cluster_data(args.input)
+        stage.items = len(songs)
     print(f"Loaded {len(songs)} songs with cluster labels")
 
     if args.performance:
         # Load and match performance data
-        perf_df = load_performance_data(args.performance)
-        songs = match_songs_to_performance(songs, perf_df, match_on=args.match_on)
+        with profiler.stage("match", items=len(songs)):
+            perf_df = load_performance_data(args.performance)
+            songs = match_songs_to_performance(songs, perf_df, match_on=args.match_on)
 
         # Analyze performance by cluster
-        performance_results = analyze_cluster_performance(songs, labels, metric=args.metric)
+        with profiler.stage("analyze", items=len(songs)):
+            performance_results = analyze_cluster_performance(songs, labels, metric=args.metric)
     else:
         print("\nNo performance data provided.")
         print("Using cluster analysis only (no hit correlation)")
@@ -334,13 +339,16 @@ def main():
 
     # Find hit patterns
     analysis_path = args.input / "cluster_analysis.json"
-    hit_patterns = find_hit_patterns(songs, labels, analysis_path)
+    with profiler.stage("patterns", items=len(songs)):
+        hit_patterns = find_hit_patterns(songs, labels, analysis_path)
 
-    # Generate prompt templates
-    templates = generate_prompt_templates(hit_patterns)
+        # Generate prompt templates
+        templates = generate_prompt_templates(hit_patterns)
 
     # Save everything
-    save_performance_analysis(performance_results, hit_patterns, templates, output_dir)
+    with profiler.stage("save"):
+        save_performance_analysis(performance_results, hit_patterns, templates, output_dir)
+    profiler.save(output_dir)
 
     print(f"\nDone! Results saved to {output_dir}")
     print("\nNext steps:")
@@ -7,58 +7,507 @@ Analyzes what makes each cluster distinctive.
 
 Usage:
     python cluster_lyrics.py --input ./lyric_embeddings --clusters 20
+    python cluster_lyrics.py --input ./lyric_embeddings --profile
+    python cluster_lyrics.py --input ./big_embeddings --mode minibatch --memory-mb 256
+    python cluster_lyrics.py --input ./lyric_embeddings --sweep 5:60:5 --workers 4
+    python cluster_lyrics.py --input ./lyric_embeddings --warm-start
+    python cluster_lyrics.py --input ./lyric_embeddings --assign ./new_embeddings
+
+Fitted models are cached by (embeddings hash, k, mode and its settings),
+so a sweep's fits are reused by later sweeps and by the final --clusters
+run; --no-cluster-cache always refits. The cache keeps the most recently
+used fits under --cluster-cache-mb; --clear-cluster-cache empties it.
 """
 
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
+import os
+import time
 from collections import Counter
+from functools import partial
 from pathlib import Path
 
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
-from sklearn.feature_extraction.text import TfidfVectorizer
 
+from embedding_store import EmbeddingMatrix, load_embedding_dir
+from pipeline_profile import RunProfiler, add_profile_args
 
-def load_embeddings(input_dir: Path) -> tuple[list[dict], np.ndarray]:
-    """Load embeddings and metadata."""
-    embeddings = np.load(input_dir / "embeddings.npy")
+# Metadata fields the cluster analysis reads; everything else stays on disk
+SONG_COLUMNS = ["title", "artist", "genre", "lyrics_clean"]
 
-    metadata = []
-    with open(input_dir / "metadata.jsonl", "r", encoding="utf-8") as f:
-        for line in f:
-            if line.strip():
-                metadata.append(json.loads(line))
+DEFAULT_CLUSTER_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "lyric-pipeline" / "kmeans"
+DEFAULT_CLUSTER_CACHE_MB = 512
+SWEEP_FILE = "k_sweep.json"
+CENTERS_FILE = "cluster_centers.npy"
+MODEL_FILE = "cluster_model.json"
+ASSIGNED_FILE = "assigned_clusters.npy"
+RANDOM_STATE = 42
 
-    return metadata, embeddings
+
+def load_embeddings(input_dir: Path, mmap: bool = False) -> tuple[list[dict], np.ndarray | EmbeddingMatrix]:
+    """Load embeddings and the metadata columns we use (any directory layout)."""
+    return load_embedding_dir(input_dir, mmap=mmap, columns=SONG_COLUMNS)
 
 
 def cluster_embeddings(
     embeddings: np.ndarray,
     n_clusters: int = 20,
     random_state: int = 42,
+    init: np.ndarray | None = None,
 ) -> tuple[np.ndarray, np.ndarray]:
     """
     Cluster embeddings with K-means.
 
+    With `init` (e.g. the previous run's centers) a single run starts from
+    those centers, so it converges in a few iterations and cluster i stays
+    cluster i.
+
     Returns:
         (cluster_labels, cluster_centers)
     """
-    print(f"Clustering {len(embeddings)} embeddings into {n_clusters} clusters...")
+    from sklearn.cluster import KMeans
+
+    print(f"Clustering {len(embeddings)} embeddings into {n_clusters} clusters{' (warm start)' if init is not None else ''}...")
 
     kmeans = KMeans(
         n_clusters=n_clusters,
         random_state=random_state,
-        n_init=10,
+        init=init if init is not None else "k-means++",
+        n_init=1 if init is not None else 10,
         max_iter=300,
     )
     labels = kmeans.fit_predict(embeddings)
+    print(f"Converged in {kmeans.n_iter_} iterations")
+
+    return labels, kmeans.cluster_centers_
+
+
+def _chunk_rows(embeddings: np.ndarray | EmbeddingMatrix, memory_mb: float, n_clusters: int) -> int:
+    """Rows of float32 embeddings that fit in `memory_mb` (at least n_clusters)."""
+    return max(n_clusters, int(memory_mb * 1024 * 1024) // (4 * max(embeddings.shape[1], 1)))
+
+
+def _rows(embeddings: np.ndarray | EmbeddingMatrix, start: int, stop: int) -> np.ndarray:
+    return np.asarray(embeddings[start:stop], dtype=np.float32)
+
+
+def cluster_minibatch(
+    embeddings: np.ndarray | EmbeddingMatrix,
+    n_clusters: int = 20,
+    batch_size: int = 4096,
+    memory_mb: float = 256,
+    epochs: int = 3,
+    random_state: int = 42,
+    init: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Cluster embeddings with MiniBatchKMeans, streaming from disk.
+
+    Each epoch visits contiguous chunks of at most `memory_mb` of float32
+    rows in random order, shuffles each chunk and feeds it to partial_fit
+    in batches of `batch_size`, so a memory-mapped EmbeddingMatrix is
+    never loaded whole. A final pass assigns every row. `init` starts
+    from given centers, as in cluster_embeddings.
 
+    Returns:
+        (cluster_labels, cluster_centers)
+    """
+    from sklearn.cluster import MiniBatchKMeans
+
+    rng = np.random.default_rng(random_state)
+    n = len(embeddings)
+    chunk = _chunk_rows(embeddings, memory_mb, n_clusters)
+    batch_size = max(n_clusters, min(batch_size, chunk))
+    print(f"MiniBatch clustering {n} embeddings into {n_clusters} clusters "
+          f"({epochs} epochs, chunks of {chunk} rows, batches of {batch_size})...")
+
+    kmeans = MiniBatchKMeans(
+        n_clusters=n_clusters, batch_size=batch_size, random_state=random_state,
+        init=init if init is not None else "k-means++", n_init=1 if init is not None else "auto",
+    )
+    fitted = False
+    for _ in range(epochs):
+        for start in rng.permutation(np.arange(0, n, chunk)):
+            rows = _rows(embeddings, start, start + chunk)
+            rows = rows[rng.permutation(len(rows))]
+            for b in range(0, len(rows), batch_size):
+                batch = rows[b:b + batch_size]
+                # The first batch initializes the centers, so it needs n_clusters rows
+                if not fitted and len(batch) < n_clusters:
+                    continue
+                kmeans.partial_fit(batch)
+                fitted = True
+
+    labels = assign_clusters(embeddings, kmeans.cluster_centers_, batch_rows=chunk)
     return labels, kmeans.cluster_centers_
 
 
+def assign_clusters(
+    embeddings: np.ndarray | EmbeddingMatrix,
+    centers: np.ndarray,
+    batch_rows: int = 65536,
+) -> np.ndarray:
+    """
+    Nearest-centroid cluster id for every row, `batch_rows` at a time.
+
+    Works on in-memory arrays and memory-mapped EmbeddingMatrix alike, so
+    new songs get a cluster without re-running the clustering.
+    """
+    centers = np.asarray(centers, dtype=np.float32)
+    center_norms = np.einsum("ij,ij->i", centers, centers)
+    labels = np.empty(len(embeddings), dtype=np.int32)
+    for start in range(0, len(embeddings), batch_rows):
+        rows = _rows(embeddings, start, start + batch_rows)
+        # argmin ||x - c||^2 = argmin (||c||^2 - 2 x.c); ||x||^2 is the same for every c
+        labels[start:start + len(rows)] = np.argmin(center_norms - 2 * rows @ centers.T, axis=1)
+    return labels
+
+
+def save_centers(output_dir: Path, centers: np.ndarray, model: dict):
+    """Write cluster_centers.npy plus the settings it was fitted with (cluster_model.json)."""
+    from embedding_store import atomic_write_json
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    np.save(output_dir / CENTERS_FILE, np.asarray(centers, dtype=np.float32))
+    atomic_write_json(output_dir / MODEL_FILE, {"n_clusters": int(len(centers)), "dim": int(centers.shape[1]), **model})
+    print(f"Saved centers: {output_dir / CENTERS_FILE} ({len(centers)} x {centers.shape[1]})")
+
+
+def load_centers(model_dir: Path) -> tuple[np.ndarray, dict]:
+    """(centers, model settings) saved by a previous run."""
+    path = Path(model_dir) / MODEL_FILE
+    model = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    return np.load(Path(model_dir) / CENTERS_FILE), model
+
+
+def sample_rows(
+    embeddings: np.ndarray | EmbeddingMatrix,
+    sample_size: int,
+    memory_mb: float = 256,
+    random_state: int = RANDOM_STATE,
+) -> tuple[np.ndarray, np.ndarray]:
+    """(sorted row indices, float32 rows) of a seeded random sample, read chunk by chunk."""
+    n = len(embeddings)
+    rng = np.random.default_rng(random_state)
+    picks = np.sort(rng.choice(n, size=min(sample_size, n), replace=False))
+    chunk = _chunk_rows(embeddings, memory_mb, 1)
+    sample = np.concatenate([
+        _rows(embeddings, start, start + chunk)[picks[(picks >= start) & (picks < start + chunk)] - start]
+        for start in range(0, n, chunk)
+    ]) if n else np.zeros((0, embeddings.shape[1]), dtype=np.float32)
+    return picks, sample
+
+
+def fit_clusters(
+    embeddings: np.ndarray | EmbeddingMatrix,
+    n_clusters: int,
+    mode: str = "full",
+    settings: dict | None = None,
+    init: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """cluster_embeddings or cluster_minibatch(**settings), by mode."""
+    if mode == "minibatch":
+        return cluster_minibatch(embeddings, n_clusters=n_clusters, init=init, **(settings or {}))
+    return cluster_embeddings(np.asarray(embeddings), n_clusters=n_clusters, init=init)
+
+
+def embeddings_fingerprint(embeddings: np.ndarray | EmbeddingMatrix, batch_rows: int = 65536) -> str:
+    """sha256 of the float32 embedding rows, streamed in batches."""
+    digest = hashlib.sha256(str(embeddings.shape).encode())
+    for start in range(0, len(embeddings), batch_rows):
+        digest.update(np.ascontiguousarray(_rows(embeddings, start, start + batch_rows)).tobytes())
+    return digest.hexdigest()
+
+
+def _cache_path(
+    cache_dir: Path, fingerprint: str, n_clusters: int, mode: str, settings: dict | None, init: np.ndarray | None,
+) -> Path:
+    key = {"embeddings": fingerprint, "k": n_clusters, "mode": mode, "random_state": RANDOM_STATE, **(settings or {})}
+    if init is not None:
+        key["init"] = hashlib.sha256(np.ascontiguousarray(init, dtype=np.float32).tobytes()).hexdigest()
+    key = json.dumps(key, sort_keys=True)
+    return cache_dir / f"k{n_clusters:03d}_{mode}_{hashlib.sha256(key.encode()).hexdigest()[:16]}.npz"
+
+
+def _cached_fits(cache_dir: Path) -> list[Path]:
+    # Skip *.tmp.npz: another sweep worker may still be writing it
+    return [path for path in cache_dir.glob("*.npz") if not path.name.endswith(".tmp.npz")]
+
+
+def prune_cluster_cache(cache_dir: Path, max_size_mb: float = DEFAULT_CLUSTER_CACHE_MB, keep: Path | None = None) -> int:
+    """
+    Delete least-recently-used fits (oldest mtime first) until the cache
+    fits in `max_size_mb`; `keep` is never deleted. Returns the count removed.
+    """
+    entries = []
+    for path in _cached_fits(cache_dir):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:  # pruned by a concurrent worker
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    excess = sum(size for _, size, _ in entries) - int(max_size_mb * 1024 * 1024)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if excess <= 0:
+            break
+        if path == keep:
+            continue
+        path.unlink(missing_ok=True)
+        excess -= size
+        removed += 1
+    return removed
+
+
+def clear_cluster_cache(cache_dir: Path) -> int:
+    """Delete every cached fit; returns the count removed."""
+    if not cache_dir.exists():
+        return 0
+    paths = list(cache_dir.glob("*.npz"))
+    for path in paths:
+        path.unlink(missing_ok=True)
+    return len(paths)
+
+
+def fit_cached(
+    embeddings: np.ndarray | EmbeddingMatrix,
+    n_clusters: int,
+    mode: str = "full",
+    settings: dict | None = None,
+    cache_dir: Path | None = DEFAULT_CLUSTER_CACHE_DIR,
+    fingerprint: str | None = None,
+    init: np.ndarray | None = None,
+    cache_mb: float = DEFAULT_CLUSTER_CACHE_MB,
+) -> tuple[np.ndarray, np.ndarray, bool]:
+    """
+    fit_clusters through the on-disk model cache (cache_dir=None disables it).
+
+    A hit refreshes the fit's mtime; a new fit is written, then the cache
+    is pruned back under `cache_mb` least-recently-used first.
+
+    Returns:
+        (cluster_labels, cluster_centers, cache_hit)
+    """
+    if cache_dir is None:
+        return (*fit_clusters(embeddings, n_clusters, mode, settings, init), False)
+
+    path = _cache_path(cache_dir, fingerprint or embeddings_fingerprint(embeddings), n_clusters, mode, settings, init)
+    try:
+        with np.load(path) as cached:
+            labels, centers = cached["labels"], cached["centers"]
+        os.utime(path)
+        return labels, centers, True
+    except FileNotFoundError:  # never fitted, or pruned by a concurrent worker
+        pass
+
+    labels, centers = fit_clusters(embeddings, n_clusters, mode, settings, init)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, labels=labels, centers=centers)
+    tmp.replace(path)  # concurrent sweep workers never see a half-written model
+    prune_cluster_cache(cache_dir, cache_mb, keep=path)
+    return labels, centers, False
+
+
+def parse_sweep(spec: str) -> list[int]:
+    """'5:60:5' -> [5, 10, ..., 60] (stop inclusive, step optional); '8,12,16' also works."""
+    if "," in spec:
+        return sorted({int(k) for k in spec.split(",")})
+    parts = [int(p) for p in spec.split(":")]
+    start, stop, step = (parts + [1])[:3] if len(parts) >= 2 else (parts[0], parts[0], 1)
+    if start < 2 or step < 1 or stop < start:
+        raise ValueError(f"Bad --sweep {spec!r}: need start:stop[:step] with 2 <= start <= stop")
+    return list(range(start, stop + 1, step))
+
+
+def _score_k(
+    n_clusters: int,
+    input_dir: Path,
+    mode: str,
+    settings: dict | None,
+    cache_dir: Path | None,
+    fingerprint: str,
+    picks: np.ndarray,
+    sample: np.ndarray,
+    threads: int | None,
+    cache_mb: float = DEFAULT_CLUSTER_CACHE_MB,
+) -> dict:
+    """Fit (or load) one k and score it on the shared sample; runs in a sweep worker."""
+    from sklearn.metrics import davies_bouldin_score, silhouette_score
+    from threadpoolctl import threadpool_limits
+
+    from embedding_store import open_embeddings
+
+    started = time.perf_counter()
+    with threadpool_limits(limits=threads):
+        embeddings = open_embeddings(input_dir)
+        labels, centers, cached = fit_cached(
+            embeddings, n_clusters, mode, settings, cache_dir, fingerprint, cache_mb=cache_mb,
+        )
+        fit_seconds = time.perf_counter() - started
+
+        sample_labels = labels[picks]
+        distances = (
+            np.einsum("ij,ij->i", sample, sample)[:, None] - 2 * sample @ centers.T
+            + np.einsum("ij,ij->i", centers, centers)
+        )
+        separable = len(np.unique(sample_labels)) > 1
+        return {
+            "k": n_clusters,
+            "silhouette": round(float(silhouette_score(sample, sample_labels)), 4) if separable else None,
+            "davies_bouldin": round(float(davies_bouldin_score(sample, sample_labels)), 4) if separable else None,
+            "sample_inertia": round(float(np.maximum(distances.min(axis=1), 0).sum()), 4),
+            "cluster_sizes": np.bincount(labels, minlength=n_clusters).tolist(),
+            "cached": cached,
+            "fit_seconds": round(fit_seconds, 2),
+        }
+
+
+def sweep_k(
+    input_dir: Path,
+    ks: list[int],
+    mode: str = "full",
+    settings: dict | None = None,
+    cache_dir: Path | None = DEFAULT_CLUSTER_CACHE_DIR,
+    sample_size: int = 5000,
+    workers: int = 1,
+    cache_mb: float = DEFAULT_CLUSTER_CACHE_MB,
+) -> list[dict]:
+    """
+    Fit every k in `ks` across `workers` processes and score each on one
+    fixed random sample (silhouette, Davies-Bouldin, sample inertia), so
+    scoring cost stays O(sample^2) however large the corpus is.
+    """
+    from embedding_store import open_embeddings
+    from prefetch import pool_map
+
+    embeddings = open_embeddings(input_dir)
+    fingerprint = embeddings_fingerprint(embeddings)
+    picks, sample = sample_rows(embeddings, sample_size, (settings or {}).get("memory_mb", 256))
+    workers = max(1, min(workers, len(ks)))
+    print(f"Sweeping k in {ks} on {len(embeddings)} embeddings ({workers} workers, {len(sample)}-row scoring sample)")
+
+    # Split the cores between workers instead of letting each BLAS/OpenMP pool take all of them
+    threads = max(1, (os.cpu_count() or 1) // workers) if workers > 1 else None
+    score = partial(
+        _score_k, input_dir=input_dir, mode=mode, settings=settings, cache_dir=cache_dir,
+        fingerprint=fingerprint, picks=picks, sample=sample, threads=threads, cache_mb=cache_mb,
+    )
+    results = []
+    for result in pool_map(score, ks, workers):
+        results.append(result)
+        source = "cached" if result["cached"] else f"fit {result['fit_seconds']}s"
+        print(f"  k={result['k']:3d}  silhouette {result['silhouette']}  "
+              f"davies-bouldin {result['davies_bouldin']}  ({source})")
+    return results
+
+
+def best_k(results: list[dict]) -> int | None:
+    """Highest silhouette, ties to the lower Davies-Bouldin."""
+    scored = [r for r in results if r["silhouette"] is not None]
+    if not scored:
+        return None
+    return max(scored, key=lambda r: (r["silhouette"], -r["davies_bouldin"]))["k"]
+
+
+def compare_with_full(
+    embeddings: np.ndarray | EmbeddingMatrix,
+    centers: np.ndarray,
+    sample_size: int = 10000,
+    memory_mb: float = 256,
+    random_state: int = 42,
+) -> dict:
+    """
+    Inertia and label agreement of `centers` against full K-means fitted
+    on a random sample of the embeddings (read chunk by chunk).
+    """
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import adjusted_rand_score
+
+    _, sample = sample_rows(embeddings, sample_size, memory_mb, random_state)
+
+    started = time.perf_counter()
+    full = KMeans(n_clusters=len(centers), random_state=random_state, n_init=10, max_iter=300).fit(sample)
+    full_seconds = time.perf_counter() - started
+
+    distances = (
+        np.einsum("ij,ij->i", sample, sample)[:, None] - 2 * sample @ centers.T + np.einsum("ij,ij->i", centers, centers)
+    )
+    labels = distances.argmin(axis=1)
+    inertia = float(np.maximum(distances[np.arange(len(sample)), labels], 0).sum())
+
+    comparison = {
+        "sample": len(sample),
+        "full_inertia": round(float(full.inertia_), 4),
+        "minibatch_inertia": round(inertia, 4),
+        "inertia_gap_pct": round(100 * (inertia / full.inertia_ - 1), 2) if full.inertia_ else 0.0,
+        "adjusted_rand": round(float(adjusted_rand_score(full.labels_, labels)), 4),
+        "full_fit_seconds": round(full_seconds, 2),
+    }
+    print(f"Quality vs full K-means on {comparison['sample']} sampled rows: "
+          f"inertia {comparison['minibatch_inertia']:.2f} vs {comparison['full_inertia']:.2f} "
+          f"({comparison['inertia_gap_pct']:+.2f}%), adjusted Rand {comparison['adjusted_rand']:.3f}")
+    return comparison
+
+
+def class_tfidf(
+    texts: list[str],
+    labels: np.ndarray,
+    top_terms: int = 15,
+    max_features: int = 50000,
+) -> dict[int, list[dict]]:
+    """
+    Distinctive terms per cluster by class-based TF-IDF.
+
+    One CountVectorizer (1-3-grams, English stop words, min_df=2) is fit
+    on the whole corpus. A sparse cluster-indicator matrix times the
+    document-term matrix sums the counts per cluster in one product.
+    Each cluster's term frequencies are then weighted by
+    log(1 + average cluster size in words / corpus frequency), so scores
+    are comparable across clusters.
+
+    Returns:
+        {cluster_id: [{"term", "score"}, ...]}, best first ([] if nothing survives)
+    """
+    from scipy import sparse
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    cluster_ids, rows = np.unique(np.asarray(labels), return_inverse=True)
+    vectorizer = CountVectorizer(
+        max_features=max_features,
+        stop_words="english",
+        ngram_range=(1, 3),  # Unigrams to trigrams
+        min_df=2,
+    )
+    try:
+        counts = vectorizer.fit_transform(texts)
+    except ValueError:  # empty vocabulary (tiny or empty corpus)
+        return {int(c): [] for c in cluster_ids}
+    feature_names = vectorizer.get_feature_names_out()
+
+    indicator = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows.reshape(-1), np.arange(len(rows)))), shape=(len(cluster_ids), len(rows)),
+    )
+    class_counts = (indicator @ counts).toarray().astype(np.float64)  # (clusters, terms)
+
+    class_words = class_counts.sum(axis=1, keepdims=True)
+    tf = class_counts / np.maximum(class_words, 1)
+    idf = np.log(1 + class_words.mean() / np.maximum(class_counts.sum(axis=0), 1))
+    scores = tf * idf
+
+    terms = {}
+    for row, cluster_id in enumerate(cluster_ids):
+        top = np.argsort(-scores[row], kind="stable")[:top_terms]
+        terms[int(cluster_id)] = [
+            {"term": feature_names[i], "score": float(scores[row, i])} for i in top if scores[row, i] > 0
+        ]
+    return terms
+
+
 def extract_cluster_patterns(
     songs: list[dict],
     labels: np.ndarray,
@@ -66,10 +515,12 @@ def extract_cluster_patterns(
 ) -> dict[int, dict]:
     """
     Extract distinctive patterns for each cluster.
-    Uses TF-IDF to find unique phrases.
+    Uses class-based TF-IDF (class_tfidf) to find unique phrases.
     """
     print("Extracting cluster patterns...")
 
+    distinctive = class_tfidf([s.get("lyrics_clean") or "" for s in songs], labels, top_terms=top_terms)
+
     # Group songs by cluster
     clusters = {}
     for i, song in enumerate(songs):
@@ -82,29 +533,7 @@ def extract_cluster_patterns(
     patterns = {}
 
     for cluster_id, cluster_songs in clusters.items():
-        lyrics_list = [s.get("lyrics_clean", "") for s in cluster_songs]
-
-        # TF-IDF for distinctive terms
-        try:
-            vectorizer = TfidfVectorizer(
-                max_features=200,
-                stop_words="english",
-                ngram_range=(1, 3),  # Unigrams to trigrams
-                min_df=2,
-            )
-            tfidf = vectorizer.fit_transform(lyrics_list)
-            feature_names = vectorizer.get_feature_names_out()
-
-            # Average TF-IDF scores
-            avg_tfidf = tfidf.mean(axis=0).A1
-            top_indices = avg_tfidf.argsort()[-top_terms:][::-1]
-
-            distinctive_terms = [
-                {"term": feature_names[i], "score": float(avg_tfidf[i])}
-                for i in top_indices
-            ]
-        except Exception:
-            distinctive_terms = []
+        distinctive_terms = distinctive[cluster_id]
 
         # Genre distribution
         genres = [s.get("genre", "unknown") for s in cluster_songs if s.get("genre")]
@@ -128,11 +557,19 @@ def extract_cluster_patterns(
     return patterns
 
 
-def analyze_structural_features(songs: list[dict], labels: np.ndarray) -> dict[int, dict]:
+def analyze_structural_features(
+    songs: list[dict],
+    labels: np.ndarray,
+    structural: np.ndarray | None = None,
+) -> dict[int, dict]:
     """
     Analyze structural features per cluster.
+
+    With `structural` (song_analyzer.py's per-song rows) the averages
+    come from the arrays and the lyrics are not re-tokenized.
     """
-    import re
+    if structural is not None:
+        return _structural_from_arrays(np.asarray(structural), labels)
 
     clusters_features = {}
 
@@ -185,6 +622,30 @@ def analyze_structural_features(songs: list[dict], labels: np.ndarray) -> dict[i
     return results
 
 
+def _structural_from_arrays(structural: np.ndarray, labels: np.ndarray) -> dict[int, dict]:
+    """analyze_structural_features over song_analyzer.STRUCTURAL_COLUMNS rows."""
+    labels = np.asarray(labels)
+    has_words = structural[:, 0] > 0
+    _, first = np.unique(labels, return_index=True)
+
+    results = {}
+    for cluster_id in labels[np.sort(first)]:  # first-seen order, like the per-song loop
+        rows = structural[(labels == cluster_id) & has_words]
+        if len(rows):
+            word_count, unique_ratio, line_count, repetition = rows.T
+            results[int(cluster_id)] = {
+                "avg_word_count": np.mean(word_count),
+                "avg_unique_ratio": np.mean(unique_ratio),
+                "avg_line_count": np.mean(line_count),
+                "avg_repetition_score": np.mean(repetition),
+            }
+        else:
+            results[int(cluster_id)] = {
+                "avg_word_count": 0, "avg_unique_ratio": 0, "avg_line_count": 0, "avg_repetition_score": 0,
+            }
+    return results
+
+
 def save_analysis(
     patterns: dict,
     structural: dict,
@@ -242,27 +703,22 @@ def save_analysis(
 
 
 def generate_pca_visualization(
-    embeddings: np.ndarray,
+    embeddings: np.ndarray | EmbeddingMatrix,
     labels: np.ndarray,
     output_dir: Path,
+    method: str = "covariance",
+    tile_points: int = 4096,
 ):
-    """Generate PCA coordinates for visualization."""
-    print("Generating PCA visualization data...")
-
-    pca = PCA(n_components=2, random_state=42)
-    coords = pca.fit_transform(embeddings)
+    """
+    Generate PCA coordinates for visualization.
 
-    viz_data = {
-        "x": coords[:, 0].tolist(),
-        "y": coords[:, 1].tolist(),
-        "cluster": labels.tolist(),
-        "explained_variance": pca.explained_variance_ratio_.tolist(),
-    }
+    Streams over the embeddings (see pca_tiles.py) and writes the uint16
+    tile pyramid, plus pca_visualization.json for small corpora.
+    """
+    from pca_tiles import write_projection
 
-    viz_path = output_dir / "pca_visualization.json"
-    with open(viz_path, "w") as f:
-        json.dump(viz_data, f)
-    print(f"Saved PCA data: {viz_path}")
+    print("Generating PCA visualization data...")
+    write_projection(embeddings, labels, output_dir, method=method, tile_points=tile_points)
 
 
 def main():
@@ -270,27 +726,139 @@ def main():
     parser.add_argument("--input", "-i", type=Path, default=Path("./lyric_embeddings"), help="Input directory with embeddings")
     parser.add_argument("--output", "-o", type=Path, help="Output directory (defaults to input)")
     parser.add_argument("--clusters", "-k", type=int, default=20, help="Number of clusters")
+    parser.add_argument("--mode", choices=["full", "minibatch"], default="full", help="In-memory K-means or streamed MiniBatchKMeans")
+    parser.add_argument("--batch-size", type=int, default=4096, help="Rows per MiniBatchKMeans step (--mode minibatch)")
+    parser.add_argument("--memory-mb", type=float, default=256, help="Embedding rows held in memory at once (--mode minibatch)")
+    parser.add_argument("--epochs", type=int, default=3, help="Passes over the embeddings (--mode minibatch)")
+    parser.add_argument("--compare-sample", type=int, default=10000, help="Rows to compare against full K-means (--mode minibatch, 0 = skip)")
+    parser.add_argument("--sweep", type=str, help="Score candidate k values, e.g. 5:60:5 or 8,12,16, and exit")
+    parser.add_argument("--workers", type=int, default=max(1, min(4, os.cpu_count() or 1)), help="Processes for --sweep")
+    parser.add_argument("--sweep-sample", type=int, default=5000, help="Rows scored per k in --sweep")
+    parser.add_argument("--cluster-cache-dir", type=Path, default=DEFAULT_CLUSTER_CACHE_DIR, help="Fitted model cache")
+    parser.add_argument("--cluster-cache-mb", type=float, default=DEFAULT_CLUSTER_CACHE_MB, help="Fitted model cache size cap (least recently used fits go first)")
+    parser.add_argument("--no-cluster-cache", "--no-cache", action="store_true", help="Always refit, ignoring the model cache")
+    parser.add_argument("--clear-cluster-cache", "--clear-cache", action="store_true", help="Delete every cached fit and exit")
+    parser.add_argument("--warm-start", action="store_true", help=f"Start from the output dir's {CENTERS_FILE} (keeps cluster ids)")
+    parser.add_argument("--pca-method", choices=["covariance", "incremental"], default="covariance", help="Streaming PCA for the visualization")
+    parser.add_argument("--tile-points", type=int, default=4096, help="Points per visualization tile")
+    parser.add_argument("--assign", type=Path, help=f"Label another embedding dir with the saved centers ({ASSIGNED_FILE}) and exit")
+    add_profile_args(parser)
 
     args = parser.parse_args()
+    profiler = RunProfiler.from_args(args, "cluster_lyrics")
 
     output_dir = args.output or args.input
+    settings = (
+        {"batch_size": args.batch_size, "memory_mb": args.memory_mb, "epochs": args.epochs}
+        if args.mode == "minibatch" else None
+    )
+    cache_dir = None if args.no_cluster_cache else args.cluster_cache_dir
+
+    if args.clear_cluster_cache:
+        removed = clear_cluster_cache(args.cluster_cache_dir)
+        print(f"Cleared {removed} cached fits from {args.cluster_cache_dir}")
+        return
+
+    if args.assign:
+        from embedding_store import open_embeddings
+
+        centers, model = load_centers(output_dir)
+        with profiler.stage("assign") as stage:
+            labels = assign_clusters(open_embeddings(args.assign), centers)
+            stage.items = len(labels)
+        np.save(args.assign / ASSIGNED_FILE, labels)
+        sizes = np.bincount(labels, minlength=len(centers))
+        print(f"Assigned {len(labels)} songs to {len(centers)} clusters from {output_dir} "
+              f"(largest: {', '.join(f'{c}({sizes[c]})' for c in np.argsort(-sizes)[:5])})")
+        print(f"Saved: {args.assign / ASSIGNED_FILE}")
+        profiler.save(args.assign)
+        return
+
+    if args.sweep:
+        from embedding_store import atomic_write_json
+
+        ks = parse_sweep(args.sweep)
+        with profiler.stage("sweep", items=len(ks)):
+            results = sweep_k(
+                args.input, ks, args.mode, settings, cache_dir,
+                sample_size=args.sweep_sample, workers=args.workers, cache_mb=args.cluster_cache_mb,
+            )
+        best = best_k(results)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(output_dir / SWEEP_FILE, {
+            "mode": args.mode,
+            "settings": settings,
+            "sample": args.sweep_sample,
+            "best_k": best,
+            "results": results,
+        })
+        print(f"Saved sweep: {output_dir / SWEEP_FILE}")
+        profiler.save(output_dir)
+        if best is not None:
+            print(f"\nBest k by silhouette: {best}")
+            mode = f" --mode {args.mode}" if args.mode != "full" else ""
+            print(f"Next: python cluster_lyrics.py --input {args.input} --clusters {best}{mode} (reuses the cached fit)")
+        return
 
     # Load data
-    songs, embeddings = load_embeddings(args.input)
+    with profiler.stage("load") as stage:
+        songs, embeddings = load_embeddings(args.input, mmap=args.mode == "minibatch")
+        stage.items = len(songs)
     print(f"Loaded {len(songs)} songs with {embeddings.shape[1]}-dim embeddings")
 
-    # Cluster
-    labels, centers = cluster_embeddings(embeddings, n_clusters=args.clusters)
-
-    # Analyze patterns
-    patterns = extract_cluster_patterns(songs, labels)
-    structural = analyze_structural_features(songs, labels)
+    # Cluster (optionally from the previous run's centers)
+    init, previous = None, None
+    n_clusters = args.clusters
+    if args.warm_start:
+        init, _ = load_centers(output_dir)
+        if init.shape[1] != embeddings.shape[1]:
+            raise ValueError(f"{output_dir / CENTERS_FILE} is {init.shape[1]}-dim, embeddings are {embeddings.shape[1]}-dim")
+        if len(init) != n_clusters:
+            print(f"Warm start: using the previous {len(init)} clusters instead of --clusters {n_clusters}")
+            n_clusters = len(init)
+        if (output_dir / "cluster_labels.npy").exists():
+            previous = np.load(output_dir / "cluster_labels.npy")
+
+    with profiler.stage("cluster", items=len(songs)):
+        labels, centers, cached = fit_cached(
+            embeddings, n_clusters, args.mode, settings, cache_dir, init=init, cache_mb=args.cluster_cache_mb,
+        )
+    if cached:
+        print(f"Reused cached k={n_clusters} {args.mode} fit from {cache_dir}")
+    if previous is not None:
+        # Rows only ever get appended, so the previous labels line up with the first rows
+        overlap = min(len(previous), len(labels))
+        kept = float(np.mean(previous[:overlap] == labels[:overlap])) if overlap else 0.0
+        print(f"Warm start: {kept:.1%} of {overlap} previously clustered songs kept their cluster id")
+    save_centers(output_dir, centers, {
+        "mode": args.mode,
+        "settings": settings,
+        "random_state": RANDOM_STATE,
+        "rows": len(labels),
+        "warm_start": args.warm_start,
+    })
+    if args.mode == "minibatch" and args.compare_sample:
+        with profiler.stage("compare", items=min(args.compare_sample, len(songs))):
+            compare_with_full(embeddings, centers, args.compare_sample, memory_mb=args.memory_mb)
+
+    # Analyze patterns (structure from song_analyzer.py's arrays when present)
+    with profiler.stage("patterns", items=len(songs)):
+        from song_analyzer import load_analysis
+
+        analysis = load_analysis(args.input, rows=len(songs))
+        patterns = extract_cluster_patterns(songs, labels)
+        structural = analyze_structural_features(
+            songs, labels, structural=analysis["structural"] if analysis is not None else None,
+        )
 
     # Save results
-    save_analysis(patterns, structural, labels, output_dir)
+    with profiler.stage("save"):
+        save_analysis(patterns, structural, labels, output_dir)
 
     # Generate visualization
-    generate_pca_visualization(embeddings, labels, output_dir)
+    with profiler.stage("pca", items=len(songs)):
+        generate_pca_visualization(embeddings, labels, output_dir, method=args.pca_method, tile_points=args.tile_points)
+    profiler.save(output_dir)
 
     print(f"\nDone! Analysis saved to {output_dir}")
     print("Next: Run analyze_performance.py to correlate with hit metrics")
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - Near-Duplicate Removal (MinHash LSH)
+
+Scraped corpora repeat the same song as reposts, remixes and partial
+copies. LyricDeduplicator sits between cleaning and encoding: each song
+becomes a set of hashed word shingles, a MinHash signature estimates
+Jaccard similarity between sets, and banded LSH buckets mean a song is
+only compared against the few earlier songs that share a band.
+
+Songs are processed in input order and the first copy wins, so the kept
+set and the dropped -> canonical report are deterministic. Signatures
+are computed in a process pool; bucketing is a single cheap pass. The
+buckets persist across keep_mask() calls, so a corpus can be fed through
+in consecutive batches, with signatures computed elsewhere via
+signature_fn().
+
+Usage:
+    python dedup_lyrics.py --input ./lyric_embeddings --threshold 0.8
+    python dedup_lyrics.py --input songs.jsonl --report dedup_report.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+# Largest prime below 2**32: (a * x + b) stays inside uint64 for 32-bit a, x, b
+_PRIME = np.uint64(4294967291)
+_SHINGLE_BASE = np.uint64(1000003)
+
+
+def shingle_hashes(text: str, k: int = 5) -> np.ndarray:
+    """Unique 32-bit hashes of the word k-grams of `text` (lowercased)."""
+    words = text.lower().split()
+    if not words:
+        return np.zeros(1, dtype=np.uint64)
+
+    word_hashes = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words))
+    k = min(k, len(words))
+    windows = np.lib.stride_tricks.sliding_window_view(word_hashes, k)
+    powers = _SHINGLE_BASE ** np.arange(k, dtype=np.uint64)
+    return np.unique((windows * powers).sum(axis=1) & np.uint64(0xFFFFFFFF))
+
+
+def minhash(shingles: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """MinHash signature: per permutation, the min of (a * x + b) mod p over shingles."""
+    x = shingles % _PRIME
+    return ((a[:, None] * x[None, :] + b[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def _signatures(texts: list[str], a: np.ndarray, b: np.ndarray, k: int) -> np.ndarray:
+    if not texts:
+        return np.zeros((0, len(a)), dtype=np.uint32)
+    return np.stack([minhash(shingle_hashes(t, k), a, b) for t in texts])
+
+
+def optimal_bands(threshold: float, num_perm: int) -> tuple[int, int]:
+    """
+    (bands, rows) with bands * rows <= num_perm that minimizes the summed
+    false-positive and false-negative probability mass around `threshold`.
+    """
+    s = np.linspace(0, 1, 1001)
+    below = s < threshold
+    best, best_error = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        p = 1 - (1 - s ** rows) ** bands  # P(candidate | Jaccard = s)
+        error = p[below].sum() + (1 - p[~below]).sum()
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class LyricDeduplicator:
+    """Drop near-duplicate lyrics, keeping the first copy of each."""
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        shingle_size: int = 5,
+        workers: int = 1,
+        seed: int = 42,
+    ):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.workers = workers
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+
+        self.seen = 0
+        self.duplicates: dict[str, dict] = {}
+
+        # Every kept song so far: signature, id, and its index in each band's buckets
+        self._kept: list[np.ndarray] = []
+        self._kept_ids: list[str] = []
+        self._buckets: list[dict[bytes, list[int]]] = [{} for _ in range(self.bands)]
+
+    def signature_fn(self):
+        """Picklable texts -> signatures function, for computing them in another process."""
+        return partial(_signatures, a=self.a, b=self.b, k=self.shingle_size)
+
+    def signatures(self, texts: list[str], chunksize: int = 256) -> np.ndarray:
+        """MinHash signatures for `texts`, optionally across a process pool."""
+        compute = self.signature_fn()
+        if self.workers <= 1 or len(texts) <= chunksize:
+            return compute(texts)
+
+        chunks = [texts[i:i + chunksize] for i in range(0, len(texts), chunksize)]
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            return np.concatenate(list(pool.map(compute, chunks)))
+
+    def keep_mask(self, ids: list[str], texts: list[str], signatures: np.ndarray | None = None) -> np.ndarray:
+        """
+        Boolean mask of songs to keep.
+
+        Songs are compared with every song kept so far, including earlier
+        calls. Pass `signatures` if they were already computed. Dropped
+        songs are recorded in self.duplicates as
+        {dropped_id: {"canonical": kept_id, "similarity": estimate}}.
+        """
+        if signatures is None:
+            signatures = self.signatures(texts)
+        span = self.bands * self.rows
+        keep = np.ones(len(signatures), dtype=bool)
+
+        for i, signature in enumerate(signatures):
+            keys = [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+            candidates = {j for band, key in enumerate(keys) for j in self._buckets[band].get(key, ())}
+            match, similarity = None, 0.0
+            for j in sorted(candidates):
+                estimate = float(np.mean(self._kept[j][:span] == signature[:span]))
+                if estimate >= self.threshold and estimate > similarity:
+                    match, similarity = j, estimate
+
+            if match is not None:
+                keep[i] = False
+                self.duplicates[str(ids[i])] = {"canonical": self._kept_ids[match], "similarity": round(similarity, 4)}
+                continue
+
+            # Only kept songs are indexed, so every canonical id survives
+            for band, key in enumerate(keys):
+                self._buckets[band].setdefault(key, []).append(len(self._kept))
+            self._kept.append(signature)
+            self._kept_ids.append(str(ids[i]))
+
+        self.seen += len(signatures)
+        return keep
+
+    def stats(self) -> dict:
+        return {
+            "threshold": self.threshold,
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "rows_per_band": self.rows,
+            "shingle_size": self.shingle_size,
+            "songs": self.seen,
+            "dropped": len(self.duplicates),
+        }
+
+    def save_report(self, path: Path):
+        """Write stats plus the dropped -> canonical id map as JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({**self.stats(), "duplicates": self.duplicates}, f, indent=2)
+        print(f"Saved dedup report: {path} ({len(self.duplicates)} dropped)")
+
+
+def _load_texts(path: Path) -> tuple[list[str], list[str]]:
+    if path.is_dir():
+        from embedding_store import load_metadata
+
+        songs = load_metadata(path, columns=["id", "lyrics_clean"])
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            songs = [json.loads(line) for line in f if line.strip()]
+
+    from lyric_cleaning import clean_lyrics
+
+    ids = [str(s.get("id", i)) for i, s in enumerate(songs)]
+    texts = [s.get("lyrics_clean") or clean_lyrics(s.get("lyrics", "")) for s in songs]
+    return ids, texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate lyrics with MinHash LSH")
+    parser.add_argument("--input", "-i", type=Path, required=True, help="Embedding directory or songs JSONL")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Jaccard similarity to call a duplicate")
+    parser.add_argument("--num-perm", type=int, default=128, help="MinHash permutations")
+    parser.add_argument("--shingle-size", type=int, default=5, help="Words per shingle")
+    parser.add_argument("--workers", type=int, default=4, help="Processes for signatures")
+    parser.add_argument("--report", type=Path, help="Write the dropped -> canonical report here")
+
+    args = parser.parse_args()
+
+    ids, texts = _load_texts(args.input)
+    dedup = LyricDeduplicator(args.threshold, args.num_perm, args.shingle_size, workers=args.workers)
+    print(f"Checking {len(texts)} songs (threshold {args.threshold}, {dedup.bands} bands x {dedup.rows} rows)")
+
+    keep = dedup.keep_mask(ids, texts)
+    print(f"Kept {int(keep.sum())}, dropped {len(dedup.duplicates)}")
+    for dropped, info in list(dedup.duplicates.items())[:10]:
+        print(f"  {dropped} -> {info['canonical']} (~{info['similarity']:.2f})")
+
+    if args.report:
+        dedup.save_report(args.report)
+
+
+if __name__ == "__main__":
+    main()
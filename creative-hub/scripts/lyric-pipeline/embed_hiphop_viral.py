@@ -10,25 +10,51 @@ Focused on patterns that make music GO VIRAL:
 
 Usage:
     python embed_hiphop_viral.py --max-samples 5000 --output ./hiphop_embeddings
+    python embed_hiphop_viral.py --max-samples 5000 --no-cache
+    python embed_hiphop_viral.py --max-samples 5000 --workers 4 --benchmark-workers
+    python embed_hiphop_viral.py --max-samples 5000 --dedup --dedup-threshold 0.7
+    python embed_hiphop_viral.py --max-samples 5000 --profile
+    python embed_hiphop_viral.py --max-samples 5000 --feature-workers 4 --chunk-size 512
+    python embed_hiphop_viral.py --max-samples 5000 --hook-engine automaton
+    python embed_hiphop_viral.py --benchmark-features
 """
 
 from __future__ import annotations
 
 import argparse
 import json
-import re
+import os
 import sys
+import time
 from collections import Counter
+from functools import partial
+from itertools import chain, islice
 from pathlib import Path
 from typing import Iterator
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
+import lyric_cleaning
+from embedding_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE_MB, EmbeddingCache
+from embedding_store import STORAGE_DTYPES, clear_shards, save_embeddings
+from dedup_lyrics import LyricDeduplicator
+from encoders import add_server_args, load_encoder
+from hook_finder import find_hooks
+from pipeline_profile import NULL_PROFILER, RunProfiler, add_profile_args
+from prefetch import pool_map, prefetch
+from song_store import METADATA_FORMATS, write_songs
+from viral_scorer import FEATURE_COLUMNS, SCORE_CAP, VIRAL_WEIGHTS, distribution, save_features
+
 # Embedding model
 MODEL_NAME = "all-MiniLM-L6-v2"
 
+# Hook detectors: fixed 2-5 word n-grams (default) or hook_finder's maximal repeats
+HOOK_ENGINES = ("ngram", "automaton")
+
+# Feature processes running beside the encoder; leave a core for the main process
+FEATURE_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+
 # Hip hop ad-libs and energy markers
 ADLIBS = {
     "yeah", "yuh", "aye", "skrt", "brr", "gang", "woo", "sheesh",
@@ -65,6 +91,11 @@ def extract_viral_features(lyrics: str) -> dict:
     hooks = [(p, c) for p, c in phrase_counts.most_common(10) if c >= 3]
     hook_score = len(hooks)  # More repeated phrases = catchier
 
+    return _viral_features(_raw_features(lyrics, words, lines, hook_score), [p for p, _ in hooks[:5]])
+
+
+def _raw_features(lyrics: str, words: list[str], lines: list[str], hook_score: int) -> dict:
+    """Features 1-7, unrounded, keyed by viral_scorer.FEATURE_COLUMNS."""
     # 2. Repetition ratio (viral songs are repetitive)
     unique_words = set(words)
     repetition_ratio = 1 - (len(unique_words) / max(len(words), 1))
@@ -89,50 +120,197 @@ def extract_viral_features(lyrics: str) -> dict:
     first_line_words = len(first_line.split())
     first_line_punch = 1 if first_line_words <= 8 else 0
 
-    # 8. Calculate overall viral score (0-100)
-    viral_score = min(100, int(
-        (hook_score * 10) +
-        (repetition_ratio * 30) +
-        (adlib_density * 100) +
-        (short_line_ratio * 20) +
-        (first_line_punch * 10) +
-        (phonk_score * 50)
-    ))
-
     return {
         "hook_score": hook_score,
-        "repetition_ratio": round(repetition_ratio, 3),
-        "adlib_density": round(adlib_density, 4),
-        "short_line_ratio": round(short_line_ratio, 3),
-        "exclamation_energy": exclamation_count,
-        "phonk_score": round(phonk_score, 4),
+        "repetition_ratio": repetition_ratio,
+        "adlib_density": adlib_density,
+        "short_line_ratio": short_line_ratio,
         "first_line_punch": first_line_punch,
-        "viral_score": viral_score,
+        "phonk_score": phonk_score,
+        "exclamation_energy": exclamation_count,
         "word_count": len(words),
         "line_count": len(lines),
-        "top_hooks": [p for p, _ in hooks[:5]],
     }
 
 
-def clean_lyrics(lyrics: str) -> str:
-    """Clean lyrics for embedding."""
-    if not lyrics:
-        return ""
+def _viral_features(raw: dict, top_hooks: list[str]) -> dict:
+    """Rounded feature dict plus viral_score, shared by the single and batch extractors."""
+    # 8. Calculate overall viral score (0-100), summed in VIRAL_WEIGHTS order
+    viral_score = min(SCORE_CAP, int(sum(raw[name] * weight for name, weight in VIRAL_WEIGHTS.items())))
 
-    # Remove section markers
-    cleaned = re.sub(r"\[.*?\]", "", lyrics)
-    cleaned = re.sub(r"\(.*?\)", "", cleaned)
+    return {
+        "hook_score": raw["hook_score"],
+        "repetition_ratio": round(raw["repetition_ratio"], 3),
+        "adlib_density": round(raw["adlib_density"], 4),
+        "short_line_ratio": round(raw["short_line_ratio"], 3),
+        "exclamation_energy": raw["exclamation_energy"],
+        "phonk_score": round(raw["phonk_score"], 4),
+        "first_line_punch": raw["first_line_punch"],
+        "viral_score": viral_score,
+        "word_count": raw["word_count"],
+        "line_count": raw["line_count"],
+        "top_hooks": top_hooks,
+    }
 
-    # Remove common metadata
-    cleaned = re.sub(r"^\d+\s*Contributors.*$", "", cleaned, flags=re.MULTILINE)
-    cleaned = re.sub(r"^.*Lyrics$", "", cleaned, flags=re.MULTILINE)
-    cleaned = re.sub(r"Embed$", "", cleaned)
 
-    # Normalize whitespace but keep line breaks for analysis
-    lines = [" ".join(line.split()) for line in cleaned.split('\n')]
-    cleaned = "\n".join(line for line in lines if line)
+def song_ngrams(tokens: np.ndarray, song: np.ndarray, vocab_size: int, max_n: int = 5) -> Iterator[tuple]:
+    """
+    Song-scoped integer n-gram ids for n = 1..max_n over a flat token array.
 
-    return cleaned.strip()
+    Every n-gram gets an exact id built from its (n-1)-gram id and the
+    next word, densified per n with one np.unique, which also counts
+    them. N-grams that run across a song boundary become singletons.
+
+    Yields:
+        (n, ids per start position, first position of each id, count of each id)
+    """
+    _, first, grams, counts = np.unique(
+        song * vocab_size + tokens, return_index=True, return_inverse=True, return_counts=True,
+    )
+    grams = grams.reshape(-1)
+    yield 1, grams, first, counts
+    for n in range(2, max_n + 1):
+        m = len(tokens) - n + 1
+        if m <= 0:
+            return
+        keys = grams[:m] * vocab_size + tokens[n - 1:]
+        crossing = song[:m] != song[n - 1:]
+        keys[crossing] = -1 - np.arange(np.count_nonzero(crossing))
+
+        _, first, grams, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+        grams = grams.reshape(-1)
+        yield n, grams, first, counts
+
+
+def hook_spans(grams: Iterator[tuple], song: np.ndarray, songs: int, min_count: int = 3,
+               top: int = 10) -> tuple[np.ndarray, list[list[tuple[int, int]]]]:
+    """
+    hook_score and top-5 (start, n) hook spans per song from song_ngrams(),
+    with starts as flat token positions.
+
+    Ties are ordered the way Counter.most_common orders them: shorter
+    n-grams first, then by first occurrence.
+    """
+    found = []  # (song, n, start, count) of every 2-5-gram repeated min_count+ times
+    for n, _, first, counts in grams:
+        if n < 2:
+            continue
+        repeated = counts >= min_count
+        starts = first[repeated]
+        found.append((song[starts], np.full(len(starts), n), starts, counts[repeated]))
+
+    scores = np.zeros(songs, dtype=np.int64)
+    spans: list[list[tuple[int, int]]] = [[] for _ in range(songs)]
+    if not found:
+        return scores, spans
+
+    owners, ns, starts, counts = (np.concatenate(column) for column in zip(*found))
+    order = np.lexsort((starts, ns, -counts, owners))
+    bounds = np.searchsorted(owners[order], np.arange(songs + 1))
+    for i in np.flatnonzero(np.diff(bounds)):
+        best = order[bounds[i]:bounds[i + 1]][:top]
+        scores[i] = len(best)
+        spans[i] = [(int(starts[j]), int(ns[j])) for j in best[:5]]
+    return scores, spans
+
+
+def _batch_hooks(word_lists: list[list[str]], min_count: int = 3, top: int = 10) -> list[tuple[int, list[str]]]:
+    """
+    (hook_score, top 5 hooks) per song, matching extract_viral_features.
+
+    The 2-5-grams of the whole batch are counted as integer ids (see
+    song_ngrams), so they cost a few sorts instead of one Python string
+    each. Only the hooks that are returned are joined back to text.
+    """
+    flat = [w for words in word_lists for w in words]
+    vocab = {w: i for i, w in enumerate(dict.fromkeys(flat))}
+    tokens = np.fromiter(map(vocab.__getitem__, flat), dtype=np.int64, count=len(flat))
+    lengths = np.fromiter(map(len, word_lists), dtype=np.int64, count=len(word_lists))
+    song = np.repeat(np.arange(len(word_lists), dtype=np.int64), lengths)
+
+    scores, spans = hook_spans(song_ngrams(tokens, song, len(vocab)), song, len(word_lists), min_count, top)
+    return [
+        (int(score), [" ".join(flat[start:start + n]) for start, n in song_spans])
+        for score, song_spans in zip(scores, spans)
+    ]
+
+
+def extract_viral_features_batch(lyrics_list: list[str], matrix: bool = False, hook_engine: str = "ngram"):
+    """
+    extract_viral_features for many songs at once, with identical output.
+
+    Hook detection runs over the whole batch on integer n-gram ids (see
+    _batch_hooks); the per-song scores are computed as before. With
+    hook_engine="automaton", hook_score and top_hooks come from
+    hook_finder.find_hooks instead (maximal repeats of any length), so
+    they no longer match extract_viral_features. With matrix=True also
+    returns the unrounded features as a float64 array with
+    viral_scorer.FEATURE_COLUMNS columns (zeros for empty lyrics).
+
+    Returns:
+        list of feature dicts, or (dicts, matrix) with matrix=True
+    """
+    word_lists = [lyrics.lower().split() for lyrics in lyrics_list]
+    if hook_engine == "automaton":
+        hooks = []
+        for words in word_lists:
+            found = find_hooks(words)
+            hooks.append((len(found), [p for p, _ in found[:5]]))
+    elif hook_engine == "ngram":
+        hooks = _batch_hooks(word_lists)
+    else:
+        raise ValueError(f"Unknown hook engine: {hook_engine} (expected one of {', '.join(HOOK_ENGINES)})")
+
+    features = []
+    rows = np.zeros((len(lyrics_list), len(FEATURE_COLUMNS)), dtype=np.float64)
+    for i, (lyrics, words, (hook_score, top_hooks)) in enumerate(zip(lyrics_list, word_lists, hooks)):
+        if not lyrics:
+            features.append({})
+            continue
+        lines = [l.strip() for l in lyrics.split('\n') if l.strip()]
+        raw = _raw_features(lyrics, words, lines, hook_score)
+        rows[i] = [raw[name] for name in FEATURE_COLUMNS]
+        features.append(_viral_features(raw, top_hooks))
+    return (features, rows) if matrix else features
+
+
+def benchmark_features(corpus: Path, repeats: int = 3) -> dict:
+    """Time extract_viral_features against extract_viral_features_batch and check outputs match."""
+    with open(corpus, "r", encoding="utf-8") as f:
+        songs = [json.loads(line) for line in f if line.strip()]
+    texts = [s.get("lyrics") or s.get("lyrics_clean") or s.get("lyrics_preview", "") for s in songs]
+    print(f"Corpus: {corpus} ({len(texts)} songs, {sum(len(t.split()) for t in texts)} words)")
+
+    def best_of(fn) -> float:
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    single = best_of(lambda: [extract_viral_features(t) for t in texts])
+    batch = best_of(lambda: extract_viral_features_batch(texts))
+    mismatches = sum(
+        1 for old, new in zip((extract_viral_features(t) for t in texts), extract_viral_features_batch(texts))
+        if json.dumps(old) != json.dumps(new)
+    )
+
+    print(f"  extract_viral_features:       {single * 1000:8.1f} ms")
+    print(f"  extract_viral_features_batch: {batch * 1000:8.1f} ms  ({single / batch:.2f}x)")
+    print(f"  output mismatches: {mismatches}")
+    return {
+        "songs": len(texts),
+        "single_sec": round(single, 4),
+        "batch_sec": round(batch, 4),
+        "speedup": round(single / batch, 2),
+        "mismatches": mismatches,
+    }
+
+
+def clean_lyrics(lyrics: str) -> str:
+    """Clean lyrics for embedding, keeping line breaks for line-based features."""
+    return lyric_cleaning.clean_lyrics(lyrics, keep_line_breaks=True)
 
 
 def load_hiphop_dataset(max_samples: int = 5000) -> Iterator[dict]:
@@ -145,7 +323,7 @@ def load_hiphop_dataset(max_samples: int = 5000) -> Iterator[dict]:
     dataset = load_dataset("Cropinky/rap_lyrics_english", split="train", streaming=True)
 
     count = 0
-    for item in tqdm(dataset, desc="Loading", total=max_samples):
+    for item in tqdm(prefetch(dataset), desc="Loading", total=max_samples):
         if count >= max_samples:
             break
 
@@ -163,90 +341,158 @@ def load_hiphop_dataset(max_samples: int = 5000) -> Iterator[dict]:
     print(f"Loaded {count} hip hop tracks")
 
 
-def process_and_embed(
-    songs: Iterator[dict],
-    model_name: str = MODEL_NAME,
-    batch_size: int = 32,
-) -> tuple[list[dict], np.ndarray]:
-    """Process songs with viral features and generate embeddings."""
-
-    print(f"Loading embedding model: {model_name}")
-    model = SentenceTransformer(model_name)
-
-    processed = []
-    lyrics_for_embedding = []
-
-    print("Processing lyrics and extracting viral features...")
-    for song in songs:
-        clean = clean_lyrics(song.get("lyrics", ""))
-        if len(clean) < 50:
-            continue
+def _prepare_chunk(
+    songs: list[dict], signer=None, hook_engine: str = "ngram",
+) -> tuple[list[dict], list[str], np.ndarray, np.ndarray | None]:
+    """
+    Clean one chunk of songs and extract their viral features (runs in a worker).
 
-        # Extract viral features
-        features = extract_viral_features(clean)
+    Returns:
+        (records, cleaned lyrics, feature matrix, MinHash signatures from `signer` or None)
+    """
+    cleaned = [(song, clean_lyrics(song.get("lyrics", ""))) for song in songs]
+    cleaned = [(song, clean) for song, clean in cleaned if len(clean) >= 50]
+    texts = [clean for _, clean in cleaned]
+    features, matrix = extract_viral_features_batch(texts, matrix=True, hook_engine=hook_engine)
 
-        processed.append({
+    records = [
+        {
             "id": song["id"],
             "source": song.get("source", "unknown"),
             "lyrics_preview": clean[:200],  # Just a preview
             **features,
-        })
+        }
+        for (song, clean), features in zip(cleaned, features)
+    ]
+    return records, texts, matrix, signer(texts) if signer is not None else None
 
-        # Use cleaned lyrics for semantic embedding
-        lyrics_for_embedding.append(clean)
 
-    print(f"Generating embeddings for {len(lyrics_for_embedding)} tracks...")
-    embeddings = model.encode(
-        lyrics_for_embedding,
-        batch_size=batch_size,
-        show_progress_bar=True,
-        convert_to_numpy=True,
+def process_and_embed(
+    songs: Iterator[dict],
+    model_name: str = MODEL_NAME,
+    batch_size: int = 32,
+    cache: EmbeddingCache | None = None,
+    workers: int = 1,
+    server: str | None = None,
+    dedup: LyricDeduplicator | None = None,
+    profiler: RunProfiler | None = None,
+    feature_workers: int = FEATURE_WORKERS,
+    chunk_size: int = 256,
+    max_in_flight: int | None = None,
+    hook_engine: str = "ngram",
+) -> tuple[list[dict], np.ndarray, np.ndarray]:
+    """
+    Process songs with viral features and generate embeddings.
+
+    Songs move through in chunks of `chunk_size`: `feature_workers`
+    processes clean them and extract viral features while this process
+    encodes the chunks that are ready, so feature work overlaps with the
+    model (feature_workers=1 runs them inline, chunk by chunk). At most
+    `max_in_flight` chunks (default 2 per worker) are queued, so full
+    lyrics are only held for those chunks; what is kept is the preview +
+    features and the vectors.
+
+    With a cache, tracks whose cleaned lyrics are already cached skip the model.
+    With workers > 1, encoding is split across a process pool. With server
+    (a URL), a running embed_server with this model is used instead of a
+    local copy. With
+    dedup, the workers also compute MinHash signatures and near-duplicate
+    tracks are dropped before encoding. `hook_engine` picks the hook
+    detector (see extract_viral_features_batch).
+
+    Returns:
+        (processed_songs, embeddings, features) where features holds the
+        unrounded viral features, one row per song (see viral_scorer)
+    """
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage("model"):
+        model = load_encoder(model_name, cache, workers=workers, server=server)
+
+    source = iter(profiler.iterate("load", songs))
+    chunks = iter(lambda: list(islice(source, chunk_size)), [])
+    prepare = partial(
+        _prepare_chunk, signer=dedup.signature_fn() if dedup is not None else None, hook_engine=hook_engine,
     )
 
-    return processed, embeddings
+    processed = []
+    vectors = []
+    feature_rows = []
+
+    print(f"Extracting viral features ({feature_workers} workers) and encoding in chunks of {chunk_size}...")
+    progress = tqdm(desc="Tracks", unit="track")
+    prepared = pool_map(prepare, chunks, feature_workers, depth=max_in_flight)
+    for records, texts, matrix, signatures in profiler.iterate("features", prepared, size=lambda chunk: len(chunk[1])):
+        if dedup is not None:
+            with profiler.stage("dedup", items=len(texts)):
+                keep = dedup.keep_mask([r["id"] for r in records], texts, signatures)
+            records = [r for r, kept in zip(records, keep) if kept]
+            texts = [t for t, kept in zip(texts, keep) if kept]
+            matrix = matrix[keep]
+
+        if texts:
+            with profiler.stage("encode", items=len(texts)):
+                vectors.append(model.encode(
+                    texts,
+                    batch_size=batch_size,
+                    show_progress_bar=False,
+                    convert_to_numpy=True,
+                ))
+        processed.extend(records)
+        feature_rows.append(matrix)
+        progress.update(len(records))
+    progress.close()
+
+    if dedup is not None:
+        print(f"Dropped {len(dedup.duplicates)} near-duplicate tracks (Jaccard >= {dedup.threshold})")
+    print(f"Embedded {len(processed)} tracks")
+    if vectors:
+        embeddings = np.concatenate(vectors)
+    else:  # keep the model's width so an empty run still saves a (0, dim) matrix
+        embeddings = np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    features = np.concatenate(feature_rows) if feature_rows else np.zeros((0, len(FEATURE_COLUMNS)))
+    return processed, embeddings, features
 
 
 def analyze_viral_distribution(songs: list[dict]) -> dict:
     """Analyze the distribution of viral scores."""
-    viral_scores = [s["viral_score"] for s in songs]
-
-    return {
-        "total_tracks": len(songs),
-        "avg_viral_score": round(np.mean(viral_scores), 2),
-        "max_viral_score": max(viral_scores),
-        "min_viral_score": min(viral_scores),
-        "high_viral_count": sum(1 for v in viral_scores if v >= 50),
-        "score_distribution": {
-            "0-20": sum(1 for v in viral_scores if v < 20),
-            "20-40": sum(1 for v in viral_scores if 20 <= v < 40),
-            "40-60": sum(1 for v in viral_scores if 40 <= v < 60),
-            "60-80": sum(1 for v in viral_scores if 60 <= v < 80),
-            "80-100": sum(1 for v in viral_scores if v >= 80),
-        }
-    }
+    return distribution(np.array([s["viral_score"] for s in songs]))
 
 
 def save_results(
     songs: list[dict],
     embeddings: np.ndarray,
     output_dir: Path,
+    extra_stats: dict | None = None,
+    storage_dtype: str = "float32",
+    metadata_format: str = "parquet",
+    profiler: RunProfiler | None = None,
+    features: np.ndarray | None = None,
 ):
-    """Save processed songs and embeddings."""
+    """
+    Save processed songs and embeddings (stored as float32, float16 or int8),
+    plus the viral feature matrix as features.npy when given.
+
+    A run where no track survived still writes every output, with zero
+    rows and a zeroed viral analysis.
+    """
+    profiler = profiler or NULL_PROFILER
     output_dir.mkdir(parents=True, exist_ok=True)
+    clear_shards(output_dir)  # a stale checkpoint would shadow the new files
+
+    with profiler.stage("save", items=len(songs)):
+        # Save metadata first: if it fails, the old embeddings still match the old metadata
+        metadata_path = write_songs(output_dir / "metadata.jsonl", songs, metadata_format)
+        print(f"Saved metadata: {metadata_path}")
 
-    # Save embeddings
-    embeddings_path = output_dir / "embeddings.npy"
-    np.save(embeddings_path, embeddings)
-    print(f"Saved embeddings: {embeddings_path} (shape: {embeddings.shape})")
+        # Save embeddings
+        embeddings_path = output_dir / "embeddings.npy"
+        save_embeddings(embeddings_path, embeddings, storage_dtype)
+        print(f"Saved embeddings: {embeddings_path} (shape: {embeddings.shape}, {storage_dtype})")
 
-    # Save metadata
-    metadata_path = output_dir / "metadata.jsonl"
-    with open(metadata_path, "w", encoding="utf-8") as f:
-        for song in songs:
-            f.write(json.dumps(song) + "\n")
-    print(f"Saved metadata: {metadata_path}")
+        if features is not None:
+            save_features(output_dir, features)
 
-    # Analyze viral distribution
+    # Analyze viral distribution (all zeros when no track survived)
     analysis = analyze_viral_distribution(songs)
 
     # Save stats
@@ -256,6 +502,7 @@ def save_results(
         "model": MODEL_NAME,
         "genre_focus": "hip_hop_viral",
         "viral_analysis": analysis,
+        **(extra_stats or {}),
     }
     stats_path = output_dir / "stats.json"
     with open(stats_path, "w") as f:
@@ -269,6 +516,9 @@ def save_results(
     print(f"Total tracks: {analysis['total_tracks']}")
     print(f"Avg viral score: {analysis['avg_viral_score']}")
     print(f"High viral (50+): {analysis['high_viral_count']} tracks")
+    if not songs:
+        print("\nNo tracks survived filtering; saved empty outputs")
+        return
     print("\nScore distribution:")
     for bucket, count in analysis['score_distribution'].items():
         pct = count / analysis['total_tracks'] * 100
@@ -281,15 +531,76 @@ def main():
     parser.add_argument("--max-samples", type=int, default=5000, help="Max tracks to process")
     parser.add_argument("--output", "-o", type=Path, default=Path("./hiphop_embeddings"), help="Output dir")
     parser.add_argument("--batch-size", type=int, default=32, help="Embedding batch size")
+    parser.add_argument("--storage", choices=STORAGE_DTYPES, default="float32", help="On-disk embedding precision")
+    parser.add_argument("--metadata-format", choices=METADATA_FORMATS, default="parquet", help="Song metadata file format")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR, help="Embedding cache directory")
+    parser.add_argument("--cache-size-mb", type=float, default=DEFAULT_MAX_SIZE_MB, help="Embedding cache size cap")
+    parser.add_argument("--no-cache", action="store_true", help="Encode every track, ignoring the cache")
+    parser.add_argument("--workers", type=int, default=1, help="Encoder processes (CPU only)")
+    parser.add_argument("--feature-workers", type=int, default=FEATURE_WORKERS, help="Processes cleaning + extracting features while encoding (1 = inline)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Tracks per feature/encode chunk")
+    parser.add_argument("--hook-engine", choices=HOOK_ENGINES, default="ngram", help="Hook detector: 2-5 word n-grams or maximal repeats (hook_finder.py)")
+    parser.add_argument("--dedup", action="store_true", help="Drop near-duplicate tracks (changes row counts)")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8, help="Jaccard similarity that marks a near-duplicate")
+    parser.add_argument("--benchmark-workers", action="store_true", help="Record songs/sec for 1, 2, 4 and 8 workers in stats.json")
+    parser.add_argument("--benchmark-samples", type=int, default=512, help="Tracks to encode per benchmark run")
+    parser.add_argument("--benchmark-features", action="store_true", help="Time batched vs per-song feature extraction and exit")
+    parser.add_argument(
+        "--corpus", type=Path,
+        default=Path(__file__).parent / "hiphop_embeddings" / "metadata.jsonl",
+        help="JSONL corpus for --benchmark-features (lyrics, lyrics_clean or lyrics_preview field)",
+    )
+    add_server_args(parser)
+    add_profile_args(parser)
 
     args = parser.parse_args()
 
+    if args.benchmark_features:
+        benchmark_features(args.corpus)
+        return
+
+    profiler = RunProfiler.from_args(args, "embed_hiphop_viral")
+
+    cache = None if args.no_cache else EmbeddingCache(args.cache_dir, args.cache_size_mb)
+    extra_stats = {"hook_engine": args.hook_engine}
+
     # Load and process
     songs = load_hiphop_dataset(max_samples=args.max_samples)
-    processed, embeddings = process_and_embed(songs, batch_size=args.batch_size)
+
+    if args.benchmark_workers:
+        from encode_pool import benchmark_workers
+
+        sample = list(islice(songs, args.benchmark_samples))
+        songs = chain(sample, songs)
+        texts = [clean_lyrics(s.get("lyrics", "")) for s in sample]
+        print("Benchmarking encoder throughput...")
+        extra_stats["throughput"] = benchmark_workers(
+            MODEL_NAME, [t for t in texts if len(t) >= 50], batch_size=args.batch_size,
+        )
+
+    dedup = None
+    if args.dedup:
+        dedup = LyricDeduplicator(args.dedup_threshold)
+
+    processed, embeddings, features = process_and_embed(
+        songs, batch_size=args.batch_size, cache=cache, workers=args.workers,
+        server=args.server, dedup=dedup, profiler=profiler,
+        feature_workers=args.feature_workers, chunk_size=args.chunk_size, hook_engine=args.hook_engine,
+    )
 
     # Save results
-    save_results(processed, embeddings, args.output)
+    if cache is not None:
+        extra_stats["cache"] = cache.stats()
+    if dedup is not None:
+        extra_stats["dedup"] = dedup.stats()
+        args.output.mkdir(parents=True, exist_ok=True)
+        dedup.save_report(args.output / "dedup_report.json")
+    save_results(
+        processed, embeddings, args.output, extra_stats=extra_stats,
+        storage_dtype=args.storage, metadata_format=args.metadata_format, profiler=profiler,
+        features=features,
+    )
+    profiler.save(args.output)
 
     print(f"\nDone! Ready to upload to Qdrant.")
     print(f"Next: python upload_to_qdrant.py --input {args.output} --collection hiphop_viral")
@@ -8,48 +8,55 @@ Uses Sentence Transformers for semantic embeddings.
 Usage:
     python embed_lyrics.py --input lyrics.jsonl --output embeddings.npy
     python embed_lyrics.py --hf-dataset vishnupriyavr/spotify-million-song-dataset
+    python embed_lyrics.py --hf-dataset vishnupriyavr/spotify-million-song-dataset --hf-num-proc 8
+    python embed_lyrics.py --input lyrics.jsonl --stream --shard-size 1000
+    python embed_lyrics.py --input lyrics.jsonl --resume
+    python embed_lyrics.py --input new_songs.jsonl --append
+    python embed_lyrics.py --input lyrics.jsonl --no-cache
+    python embed_lyrics.py --input lyrics.jsonl --workers 4 --benchmark-workers
+    python embed_lyrics.py --input lyrics.jsonl --windowed --pooling attention
+    python embed_lyrics.py --input lyrics.jsonl --metadata-format jsonl
+    python embed_lyrics.py --input lyrics.jsonl --server
+    python embed_lyrics.py --input lyrics.jsonl --profile
 """
 
 from __future__ import annotations
 
 import argparse
 import json
-import re
 import sys
+from itertools import chain, islice
 from pathlib import Path
 from typing import Iterator
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
+from embedding_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE_MB, EmbeddingCache
+from embedding_store import (
+    STORAGE_DTYPES,
+    ShardWriter,
+    atomic_write_json,
+    clear_shards,
+    content_hash,
+    load_metadata,
+    open_for_append,
+    read_manifest,
+    record_segment,
+    save_embeddings,
+)
+from encoders import add_server_args, load_encoder
+from lyric_cleaning import clean_lyrics
+from lyric_windows import POOLING_MODES, LyricWindows
+from prefetch import prefetch
+from pipeline_profile import NULL_PROFILER, RunProfiler, add_profile_args
+from song_store import METADATA_FORMATS, write_songs
+
 # Default model - good balance of quality and speed
 DEFAULT_MODEL = "all-MiniLM-L6-v2"  # 384 dim, fast
 # Alternative: "all-mpnet-base-v2"  # 768 dim, higher quality
 
 
-def clean_lyrics(lyrics: str) -> str:
-    """
-    Clean lyrics for embedding.
-    Removes section markers, normalizes whitespace.
-    """
-    if not lyrics:
-        return ""
-
-    # Remove section markers like [Verse 1], [Chorus], (Hook), etc.
-    cleaned = re.sub(r"\[.*?\]", "", lyrics)
-    cleaned = re.sub(r"\(.*?\)", "", cleaned)
-
-    # Remove common metadata patterns
-    cleaned = re.sub(r"^\d+\s*Contributors.*$", "", cleaned, flags=re.MULTILINE)
-    cleaned = re.sub(r"^.*Lyrics$", "", cleaned, flags=re.MULTILINE)
-
-    # Normalize whitespace
-    cleaned = " ".join(cleaned.split())
-
-    return cleaned.strip()
-
-
 def load_jsonl(path: Path) -> Iterator[dict]:
     """Load songs from JSONL file."""
     with open(path, "r", encoding="utf-8") as f:
@@ -58,107 +65,352 @@ def load_jsonl(path: Path) -> Iterator[dict]:
                 yield json.loads(line)
 
 
-def load_hf_dataset(dataset_name: str, split: str = "train", max_samples: int | None = None):
-    """Load lyrics from HuggingFace dataset."""
-    from datasets import load_dataset
+LYRICS_COLUMNS = ["lyrics", "text", "lyric", "song_lyrics"]
 
-    print(f"Loading HuggingFace dataset: {dataset_name}")
-    dataset = load_dataset(dataset_name, split=split)
 
-    # Common column names for lyrics
-    lyrics_cols = ["lyrics", "text", "lyric", "song_lyrics"]
-    lyrics_col = None
+def _lyrics_column(column_names: list[str]) -> str:
+    """Pick the lyrics column from common names."""
+    for col in LYRICS_COLUMNS:
+        if col in column_names:
+            print(f"Using lyrics column: {col}")
+            return col
+
+    print(f"Available columns: {column_names}")
+    raise ValueError(f"No lyrics column found in dataset. Tried: {LYRICS_COLUMNS}")
 
-    for col in lyrics_cols:
-        if col in dataset.column_names:
-            lyrics_col = col
-            break
 
-    if not lyrics_col:
-        print(f"Available columns: {dataset.column_names}")
-        raise ValueError(f"No lyrics column found in dataset. Tried: {lyrics_cols}")
+def _hf_song(item: dict, i: int, lyrics_col: str, source: str) -> dict:
+    # Row numbers restart at 0 in every dataset, so qualify them with the source
+    return {
+        "id": f"{source}:{i}",
+        "title": item.get("song", item.get("track", item.get("title", f"song_{i}"))),
+        "artist": item.get("artist", item.get("singer", "Unknown")),
+        "lyrics": item.get(lyrics_col, ""),
+        "genre": item.get("genre", item.get("tag", "")),
+    }
 
-    print(f"Using lyrics column: {lyrics_col}")
 
-    for i, item in enumerate(dataset):
-        if max_samples and i >= max_samples:
-            break
-        yield {
-            "id": str(i),
-            "title": item.get("song", item.get("track", item.get("title", f"song_{i}"))),
-            "artist": item.get("artist", item.get("singer", "Unknown")),
-            "lyrics": item.get(lyrics_col, ""),
-            "genre": item.get("genre", item.get("tag", "")),
-        }
+def _clean_hf_batch(batch: dict, indices: list[int], lyrics_col: str, source: str) -> dict:
+    """datasets.map() worker: raw rows -> songs with lyrics_clean (raw lyrics dropped)."""
+    songs = []
+    for j, i in enumerate(indices):
+        song = _hf_song({k: v[j] for k, v in batch.items()}, i, lyrics_col, source)
+        song["lyrics_clean"] = clean_lyrics(song.pop("lyrics") or "")
+        songs.append(song)
+    return {k: [song[k] for song in songs] for k in ("id", "title", "artist", "genre", "lyrics_clean")}
+
+
+def _long_enough(batch: dict) -> list[bool]:
+    return [len(text) >= 50 for text in batch["lyrics_clean"]]
+
+
+def load_hf_dataset(
+    dataset_name: str,
+    split: str = "train",
+    max_samples: int | None = None,
+    prefetch_depth: int = 1024,
+    num_proc: int | None = None,
+) -> Iterator[dict]:
+    """
+    Load lyrics from HuggingFace dataset.
+
+    By default the split is streamed (max_samples stops the download early)
+    and read ahead on a background thread. With num_proc, the split is
+    downloaded to the Arrow cache instead and cleaning + length filtering
+    run in parallel via datasets.map(num_proc=N); those songs arrive with
+    lyrics_clean already set and no raw lyrics.
+    """
+    from datasets import load_dataset
+
+    print(f"Loading HuggingFace dataset: {dataset_name}")
+
+    if num_proc:
+        dataset = load_dataset(dataset_name, split=split)
+        if max_samples:
+            dataset = dataset.select(range(min(max_samples, len(dataset))))
+        lyrics_col = _lyrics_column(dataset.column_names)
+
+        print(f"Cleaning with {num_proc} processes...")
+        dataset = dataset.map(
+            _clean_hf_batch,
+            batched=True,
+            with_indices=True,
+            num_proc=num_proc,
+            fn_kwargs={"lyrics_col": lyrics_col, "source": dataset_name},
+            remove_columns=dataset.column_names,
+        )
+        dataset = dataset.filter(_long_enough, batched=True, num_proc=num_proc)
+        yield from dataset
+        return
+
+    dataset = load_dataset(dataset_name, split=split, streaming=True)
+    if max_samples:
+        dataset = dataset.take(max_samples)
+
+    rows = iter(dataset)
+    column_names = dataset.column_names
+    if column_names is None:  # features unknown until the first row arrives
+        first = next(rows, None)
+        if first is None:
+            return
+        column_names = list(first)
+        rows = chain([first], rows)
+    lyrics_col = _lyrics_column(column_names)
+
+    for i, item in enumerate(prefetch(rows, prefetch_depth)):
+        yield _hf_song(item, i, lyrics_col, dataset_name)
+
+
+def _clean_song(song: dict) -> str:
+    """Cleaned lyrics, reusing lyrics_clean from the parallel HF path."""
+    if "lyrics" not in song and "lyrics_clean" in song:
+        return song["lyrics_clean"]
+    return clean_lyrics(song.get("lyrics", ""))
 
 
 def embed_lyrics(
     songs: Iterator[dict],
     model_name: str = DEFAULT_MODEL,
     batch_size: int = 32,
+    cache: EmbeddingCache | None = None,
+    workers: int = 1,
+    windows: LyricWindows | None = None,
+    server: str | None = None,
+    profiler: RunProfiler | None = None,
 ) -> tuple[list[dict], np.ndarray]:
     """
     Generate embeddings for lyrics.
 
+    With a cache, only songs whose cleaned lyrics were never encoded by
+    this model are sent to SentenceTransformer.encode. With workers > 1,
+    encoding is split across a process pool. With windows, long lyrics are
+    embedded as overlapping token windows pooled back into one vector.
+    With server (a URL), a running embed_server with this model is used
+    instead of a local copy.
+
     Returns:
         (processed_songs, embeddings) where embeddings is shape (n_songs, embed_dim)
     """
-    print(f"Loading model: {model_name}")
-    model = SentenceTransformer(model_name)
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage("model"):
+        model = load_encoder(model_name, cache, workers=workers, server=server)
 
     processed = []
     lyrics_batch = []
 
     print("Processing lyrics...")
-    for song in tqdm(songs, desc="Cleaning"):
-        clean = clean_lyrics(song.get("lyrics", ""))
-        if len(clean) < 50:  # Skip very short lyrics
-            continue
-
-        processed.append({
-            **song,
-            "lyrics_clean": clean,
-        })
-        lyrics_batch.append(clean)
+    with profiler.stage("clean") as stage:
+        for song in tqdm(profiler.iterate("load", songs), desc="Cleaning"):
+            clean = _clean_song(song)
+            if len(clean) < 50:  # Skip very short lyrics
+                continue
+
+            processed.append({
+                **song,
+                "lyrics_clean": clean,
+            })
+            lyrics_batch.append(clean)
+        stage.items = len(processed)
 
     print(f"Generating embeddings for {len(lyrics_batch)} songs...")
-    embeddings = model.encode(
-        lyrics_batch,
-        batch_size=batch_size,
-        show_progress_bar=True,
-        convert_to_numpy=True,
-    )
+    with profiler.stage("encode", items=len(lyrics_batch)):
+        if windows is not None:
+            embeddings = windows.encode(model, lyrics_batch, batch_size=batch_size, show_progress_bar=True)
+        else:
+            embeddings = model.encode(
+                lyrics_batch,
+                batch_size=batch_size,
+                show_progress_bar=True,
+                convert_to_numpy=True,
+            )
 
     return processed, embeddings
 
 
+def embed_lyrics_streaming(
+    songs: Iterator[dict],
+    output_dir: Path,
+    model_name: str = DEFAULT_MODEL,
+    batch_size: int = 32,
+    shard_size: int = 1000,
+    resume: bool = False,
+    cache: EmbeddingCache | None = None,
+    workers: int = 1,
+    windows: LyricWindows | None = None,
+    extra_stats: dict | None = None,
+    storage_dtype: str = "float32",
+    metadata_format: str = "parquet",
+    server: str | None = None,
+    append: bool = False,
+    profiler: RunProfiler | None = None,
+) -> int:
+    """
+    Encode lyrics in fixed-size chunks, writing each chunk as a shard.
+
+    Only one shard of songs is held in memory at a time. With resume=True
+    the input songs covered by the last finished shard are skipped. With
+    append=True new shards go after the existing rows, songs whose id or
+    cleaned lyrics are already in the directory are skipped, and the run
+    is recorded as a new segment in manifest.json. Songs without an id
+    are only deduplicated by lyrics and are stored under their content
+    hash as id. Encode and save time
+    is profiled per shard; the rest of the loop counts as "clean".
+
+    Returns:
+        Total number of songs embedded (including resumed shards)
+    """
+    profiler = profiler or NULL_PROFILER
+    seen_ids, seen_hashes = set(), set()
+    append_stats = {"added": 0, "duplicate_id": 0, "duplicate_content": 0}
+    if append:
+        writer = open_for_append(
+            output_dir, model_name, shard_size=shard_size,
+            storage_dtype=storage_dtype, metadata_format=metadata_format,
+        )
+        if writer.total_rows:
+            for meta in load_metadata(output_dir, columns=["id", "lyrics_clean"]):
+                if meta.get("id") is not None:
+                    seen_ids.add(meta["id"])
+                seen_hashes.add(content_hash(meta.get("lyrics_clean") or ""))
+            print(f"Appending to {writer.total_rows} existing songs in {output_dir}")
+        consumed = writer.songs_consumed
+    else:
+        writer = ShardWriter(
+            output_dir, model_name, shard_size=shard_size, resume=resume,
+            storage_dtype=storage_dtype, metadata_format=metadata_format,
+        )
+        if writer.complete:
+            print(f"Nothing to resume: {output_dir} is already complete")
+            return writer.total_rows
+
+        consumed = writer.songs_consumed
+        if consumed:
+            print(f"Resuming after {consumed} input songs ({len(writer.checkpoint['shards'])} shards done)")
+            songs = islice(songs, consumed, None)
+
+    with profiler.stage("model"):
+        model = load_encoder(model_name, cache, workers=workers, server=server)
+
+    pending = []
+    embedding_dim = None
+
+    def flush():
+        nonlocal embedding_dim
+        texts = [song["lyrics_clean"] for song in pending]
+        with profiler.stage("encode", items=len(texts)):
+            if windows is not None:
+                embeddings = windows.encode(model, texts, batch_size=batch_size)
+            else:
+                embeddings = model.encode(
+                    texts,
+                    batch_size=batch_size,
+                    show_progress_bar=False,
+                    convert_to_numpy=True,
+                )
+        embedding_dim = embeddings.shape[1]
+        with profiler.stage("save", items=len(pending)):
+            writer.write_shard(pending, embeddings, consumed)
+        pending.clear()
+
+    with profiler.stage("clean") as stage:
+        start = consumed
+        for song in tqdm(profiler.iterate("load", songs), desc="Streaming"):
+            consumed += 1
+            clean = _clean_song(song)
+            if len(clean) < 50:  # Skip very short lyrics
+                continue
+
+            if append:
+                digest = content_hash(clean)
+                if song.get("id") is None:
+                    song = {**song, "id": digest}
+                elif song["id"] in seen_ids:
+                    append_stats["duplicate_id"] += 1
+                    continue
+                if digest in seen_hashes:
+                    append_stats["duplicate_content"] += 1
+                    continue
+                seen_ids.add(song["id"])
+                seen_hashes.add(digest)
+                append_stats["added"] += 1
+
+            pending.append({
+                **song,
+                "lyrics_clean": clean,
+            })
+            if len(pending) >= shard_size:
+                flush()
+
+        if pending:
+            flush()
+        stage.items = consumed - start
+
+    with profiler.stage("save"):
+        writer.finish(consumed)
+        segment = record_segment(output_dir)
+
+    if embedding_dim is None:
+        embedding_dim = next(
+            (s["embedding_dim"] for s in writer.checkpoint["shards"] if s["rows"]), 0
+        )
+
+    stats = {
+        "total_songs": writer.total_rows,
+        "embedding_dim": embedding_dim,
+        "model": model_name,
+        "shards": len(writer.checkpoint["shards"]),
+        "segments": len((read_manifest(output_dir) or {"segments": []})["segments"]),
+        **(extra_stats or {}),
+    }
+    if cache is not None:
+        stats["cache"] = cache.stats()
+    if windows is not None:
+        stats["windowing"] = windows.stats()
+    if append:
+        stats["last_append"] = {**append_stats, "segment": segment}
+        print(f"Appended {append_stats['added']} songs, skipped {append_stats['duplicate_id']} "
+              f"duplicate ids and {append_stats['duplicate_content']} duplicate lyrics")
+    atomic_write_json(output_dir / "stats.json", stats)
+    print(f"Saved {stats['shards']} shards to {output_dir}")
+
+    return writer.total_rows
+
+
 def save_results(
     songs: list[dict],
     embeddings: np.ndarray,
     output_dir: Path,
+    extra_stats: dict | None = None,
+    storage_dtype: str = "float32",
+    metadata_format: str = "parquet",
+    profiler: RunProfiler | None = None,
 ):
-    """Save processed songs and embeddings."""
+    """Save processed songs and embeddings (stored as float32, float16 or int8)."""
+    profiler = profiler or NULL_PROFILER
     output_dir.mkdir(parents=True, exist_ok=True)
-
-    # Save embeddings as numpy array
-    embeddings_path = output_dir / "embeddings.npy"
-    np.save(embeddings_path, embeddings)
-    print(f"Saved embeddings: {embeddings_path} (shape: {embeddings.shape})")
-
-    # Save metadata as JSONL (without embeddings)
-    metadata_path = output_dir / "metadata.jsonl"
-    with open(metadata_path, "w", encoding="utf-8") as f:
-        for song in songs:
-            # Remove full lyrics to save space
-            meta = {k: v for k, v in song.items() if k != "lyrics"}
-            f.write(json.dumps(meta) + "\n")
-    print(f"Saved metadata: {metadata_path}")
+    clear_shards(output_dir)  # a stale checkpoint would shadow the new files
+
+    with profiler.stage("save", items=len(songs)):
+        # Save metadata first (without full lyrics, to save space): if it
+        # fails, the old embeddings are still paired with the old metadata
+        metadata_path = write_songs(
+            output_dir / "metadata.jsonl",
+            [{k: v for k, v in song.items() if k != "lyrics"} for song in songs],
+            metadata_format,
+        )
+        print(f"Saved metadata: {metadata_path}")
+
+        # Save embeddings as numpy array
+        embeddings_path = output_dir / "embeddings.npy"
+        save_embeddings(embeddings_path, embeddings, storage_dtype)
+        print(f"Saved embeddings: {embeddings_path} (shape: {embeddings.shape}, {storage_dtype})")
 
     # Save summary stats
     stats = {
         "total_songs": len(songs),
         "embedding_dim": embeddings.shape[1],
         "model": DEFAULT_MODEL,
+        **(extra_stats or {}),
     }
     stats_path = output_dir / "stats.json"
     with open(stats_path, "w") as f:
@@ -173,25 +425,117 @@ def main():
     parser.add_argument("--output", "-o", type=Path, default=Path("./lyric_embeddings"), help="Output directory")
     parser.add_argument("--model", type=str, default=DEFAULT_MODEL, help="Sentence transformer model")
     parser.add_argument("--max-samples", type=int, help="Limit number of samples")
+    parser.add_argument("--prefetch", type=int, default=1024, help="Streamed HF rows to read ahead (0 disables)")
+    parser.add_argument("--hf-num-proc", type=int, help="Download the HF split and clean it with N processes (datasets.map)")
     parser.add_argument("--batch-size", type=int, default=32, help="Embedding batch size")
+    parser.add_argument("--storage", choices=STORAGE_DTYPES, default="float32", help="On-disk embedding precision")
+    parser.add_argument("--metadata-format", choices=METADATA_FORMATS, default="parquet", help="Song metadata file format")
+    parser.add_argument("--stream", action="store_true", help="Encode in chunks and write numbered shards")
+    parser.add_argument("--shard-size", type=int, default=1000, help="Songs per shard in --stream mode")
+    parser.add_argument("--resume", action="store_true", help="Continue a --stream run from its last finished shard")
+    parser.add_argument("--append", action="store_true", help="Add only new songs to an existing output directory")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR, help="Embedding cache directory")
+    parser.add_argument("--cache-size-mb", type=float, default=DEFAULT_MAX_SIZE_MB, help="Embedding cache size cap")
+    parser.add_argument("--no-cache", action="store_true", help="Encode every song, ignoring the cache")
+    parser.add_argument("--workers", type=int, default=1, help="Encoder processes (CPU only)")
+    parser.add_argument("--benchmark-workers", action="store_true", help="Record songs/sec for 1, 2, 4 and 8 workers in stats.json")
+    parser.add_argument("--benchmark-samples", type=int, default=512, help="Songs to encode per benchmark run")
+    parser.add_argument("--windowed", action="store_true", help="Embed long lyrics as pooled overlapping token windows")
+    parser.add_argument("--window-overlap", type=int, default=64, help="Tokens shared by consecutive windows")
+    parser.add_argument("--pooling", choices=POOLING_MODES, default="mean", help="How window vectors are combined")
+    parser.add_argument("--max-seq-length", type=int, default=256, help="Model max sequence length (tokens)")
+    parser.add_argument("--max-windows", type=int, help="Cap windows per song (songs beyond it stay truncated)")
+    add_server_args(parser)
+    add_profile_args(parser)
 
     args = parser.parse_args()
+    profiler = RunProfiler.from_args(args, "embed_lyrics")
 
     if args.input:
         songs = load_jsonl(args.input)
     elif args.hf_dataset:
-        songs = load_hf_dataset(args.hf_dataset, max_samples=args.max_samples)
+        songs = load_hf_dataset(
+            args.hf_dataset,
+            max_samples=args.max_samples,
+            prefetch_depth=args.prefetch,
+            num_proc=args.hf_num_proc,
+        )
     else:
         print("Error: Provide --input or --hf-dataset")
         sys.exit(1)
 
+    cache = None if args.no_cache else EmbeddingCache(args.cache_dir, args.cache_size_mb)
+    extra_stats = {}
+
+    windows = None
+    if args.windowed:
+        windows = LyricWindows(
+            args.model,
+            max_seq_length=args.max_seq_length,
+            overlap=args.window_overlap,
+            pooling=args.pooling,
+            max_windows=args.max_windows,
+        )
+
+    if args.benchmark_workers:
+        from encode_pool import benchmark_workers
+
+        sample = list(islice(songs, args.benchmark_samples))
+        songs = chain(sample, songs)
+        texts = [_clean_song(s) for s in sample]
+        print("Benchmarking encoder throughput...")
+        extra_stats["throughput"] = benchmark_workers(
+            args.model, [t for t in texts if len(t) >= 50], batch_size=args.batch_size,
+        )
+
+    if args.append and args.resume:
+        print("Error: --append and --resume are separate modes")
+        sys.exit(1)
+
+    if args.stream or args.resume or args.append:
+        total = embed_lyrics_streaming(
+            songs,
+            args.output,
+            model_name=args.model,
+            batch_size=args.batch_size,
+            shard_size=args.shard_size,
+            resume=args.resume,
+            cache=cache,
+            workers=args.workers,
+            windows=windows,
+            extra_stats=extra_stats,
+            storage_dtype=args.storage,
+            metadata_format=args.metadata_format,
+            server=args.server,
+            append=args.append,
+            profiler=profiler,
+        )
+        profiler.save(args.output)
+        print(f"\nDone! Processed {total} songs.")
+        print(f"Next: Run cluster_lyrics.py to find patterns")
+        return
+
     processed, embeddings = embed_lyrics(
         songs,
         model_name=args.model,
         batch_size=args.batch_size,
+        cache=cache,
+        workers=args.workers,
+        windows=windows,
+        server=args.server,
+        profiler=profiler,
     )
 
-    save_results(processed, embeddings, args.output)
+    if cache is not None:
+        extra_stats["cache"] = cache.stats()
+    if windows is not None:
+        extra_stats["windowing"] = windows.stats()
+        print(f"Truncated songs: {windows.truncated_before} before windowing, {windows.truncated_after} after")
+    save_results(
+        processed, embeddings, args.output, extra_stats=extra_stats,
+        storage_dtype=args.storage, metadata_format=args.metadata_format, profiler=profiler,
+    )
+    profiler.save(args.output)
 
     print(f"\nDone! Processed {len(processed)} songs.")
     print(f"Next: Run cluster_lyrics.py to find patterns")
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - Local Embedding Server
+
+Keeps one SentenceTransformer warm in a long-lived process so CLI runs
+skip the import + model load. Requests that arrive within a short window
+are merged into one model.encode call (micro-batching), then split back
+per request. Vectors travel as raw float32 bytes, not JSON floats.
+
+Both embedders use it through encoders.load_encoder() when asked to with
+--server [URL] or LYRIC_EMBED_SERVER=URL, and load the model themselves
+when nothing usable answers there. The probe is opt-in because whatever
+answers on that port supplies the vectors.
+
+    GET  /health  -> {"model", "dim", "requests", "batches", ...}
+    POST /encode  {"texts": [...]} -> float32 rows (X-Rows / X-Dim headers)
+
+Usage:
+    python embed_server.py
+    python embed_server.py --model all-MiniLM-L6-v2 --port 8765 --window-ms 10
+    python embed_lyrics.py --input lyrics.jsonl --server
+    LYRIC_EMBED_SERVER=http://127.0.0.1:9000 python embed_lyrics.py --input lyrics.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import queue
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+
+# Texts per HTTP request from the client; keeps bodies a few MB at most
+_CLIENT_CHUNK = 1024
+
+
+class MicroBatcher:
+    """
+    Merge concurrent encode requests into shared model batches.
+
+    The worker thread waits for one request, then keeps collecting for up
+    to `window_ms` (or until `max_batch` texts) before encoding them all.
+    """
+
+    def __init__(self, model, window_ms: float = 5.0, max_batch: int = 256, batch_size: int = 32):
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batch_size = batch_size
+        self.requests: queue.Queue[tuple[list[str], Future]] = queue.Queue()
+
+        self.stats = {"requests": 0, "batches": 0, "texts": 0, "encode_seconds": 0.0}
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: list[str]) -> Future:
+        future = Future()
+        self.requests.put((texts, future))
+        return future
+
+    def _collect(self) -> list[tuple[list[str], Future]]:
+        pending = [self.requests.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            texts = [t for request_texts, _ in pending for t in request_texts]
+            try:
+                start = time.perf_counter()
+                vectors = np.asarray(
+                    self.model.encode(
+                        texts,
+                        batch_size=self.batch_size,
+                        show_progress_bar=False,
+                        convert_to_numpy=True,
+                    ),
+                    dtype=np.float32,
+                )
+                self.stats["encode_seconds"] += time.perf_counter() - start
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            self.stats["requests"] += len(pending)
+            self.stats["batches"] += 1
+            self.stats["texts"] += len(texts)
+
+            offset = 0
+            for request_texts, future in pending:
+                future.set_result(vectors[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+
+
+def make_handler(batcher: MicroBatcher, model_name: str, dim: int):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, data: dict):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self._send_json(404, {"error": "not found"})
+                return
+            stats = dict(batcher.stats)
+            stats["mean_batch_texts"] = round(stats["texts"] / stats["batches"], 1) if stats["batches"] else 0.0
+            self._send_json(200, {"model": model_name, "dim": dim, **stats})
+
+        def do_POST(self):
+            if self.path != "/encode":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                texts = json.loads(self.rfile.read(length))["texts"]
+                vectors = batcher.submit(texts).result()
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+                return
+
+            body = vectors.tobytes()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("X-Rows", str(vectors.shape[0]))
+            self.send_header("X-Dim", str(vectors.shape[1]))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # one line per request drowns out the startup banner
+
+    return Handler
+
+
+class ServerEncoder:
+    """SentenceTransformer.encode-compatible client for a running embed_server."""
+
+    def __init__(self, url: str, model_name: str, dim: int, timeout: float = 600.0):
+        self.url = url.rstrip("/")
+        self.model_name = model_name
+        self.dim = dim
+        self.timeout = timeout
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _post(self, texts: list[str]) -> np.ndarray:
+        request = urllib.request.Request(
+            f"{self.url}/encode",
+            data=json.dumps({"texts": texts}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            rows = int(response.headers["X-Rows"])
+            dim = int(response.headers["X-Dim"])
+            return np.frombuffer(response.read(), dtype=np.float32).reshape(rows, dim)
+
+    def encode(
+        self,
+        sentences: list[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+        **kwargs,
+    ) -> np.ndarray:
+        if not sentences:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        chunks = range(0, len(sentences), _CLIENT_CHUNK)
+        if show_progress_bar:
+            from tqdm import tqdm
+
+            chunks = tqdm(chunks, desc="Encoding (server)")
+        return np.concatenate([self._post(sentences[i:i + _CLIENT_CHUNK]) for i in chunks])
+
+
+def find_server(model_name: str, url: str = DEFAULT_URL, timeout: float = 0.5) -> ServerEncoder | None:
+    """Return a client for a running server with `model_name` loaded, else None."""
+    try:
+        with urllib.request.urlopen(f"{url.rstrip('/')}/health", timeout=timeout) as response:
+            health = json.loads(response.read())
+        model, dim = health.get("model"), int(health["dim"])
+    except (OSError, ValueError, http.client.HTTPException, AttributeError, KeyError, TypeError):
+        # Nothing listening, or something that isn't an embed_server
+        print(f"No embedding server at {url}; loading locally")
+        return None
+
+    if model != model_name:
+        print(f"Embedding server at {url} has {model}, not {model_name}; loading locally")
+        return None
+    return ServerEncoder(url, model_name, dim)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a warm sentence transformer over localhost HTTP")
+    parser.add_argument("--model", type=str, default=DEFAULT_MODEL, help="Sentence transformer model")
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST, help="Bind address (keep it local)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port")
+    parser.add_argument("--window-ms", type=float, default=5.0, help="Micro-batching window")
+    parser.add_argument("--max-batch", type=int, default=256, help="Texts per merged batch before encoding early")
+    parser.add_argument("--batch-size", type=int, default=32, help="Model batch size")
+
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    print(f"Loading model: {args.model}")
+    start = time.perf_counter()
+    model = SentenceTransformer(args.model)
+    dim = model.get_sentence_embedding_dimension()
+    print(f"Model ready in {time.perf_counter() - start:.1f}s ({dim} dims)")
+
+    batcher = MicroBatcher(model, window_ms=args.window_ms, max_batch=args.max_batch, batch_size=args.batch_size)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(batcher, args.model, dim))
+    server.daemon_threads = True
+
+    print(f"Serving {args.model} on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Stopped after {batcher.stats['requests']} requests in {batcher.stats['batches']} batches")
+
+
+if __name__ == "__main__":
+    main()
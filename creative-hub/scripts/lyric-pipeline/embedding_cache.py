@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - Embedding Cache
+
+Persistent, content-addressed cache for lyric embeddings.
+Vectors are keyed by sha256(model name + cleaned lyrics), so a re-run
+only sends new or changed songs to the model. The cache is a single
+SQLite file with a size cap and least-recently-used eviction.
+
+Usage:
+    python embedding_cache.py
+    python embedding_cache.py --clear
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "lyric-pipeline" / "embeddings"
+DEFAULT_MAX_SIZE_MB = 512
+
+# Stay well under SQLite's host-parameter limit
+_QUERY_CHUNK = 500
+
+
+def cache_key(model_name: str, clean_lyrics: str) -> str:
+    """Content hash identifying one (model, cleaned lyrics) pair."""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(clean_lyrics.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk LRU cache of float32 vectors, bounded by total vector bytes."""
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, max_size_mb: float = DEFAULT_MAX_SIZE_MB):
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.path = cache_dir / "embeddings.sqlite"
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self.conn.commit()
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Look up vectors for `keys`, refreshing their LRU timestamp."""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), _QUERY_CHUNK):
+            chunk = unique[start:start + _QUERY_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                chunk,
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+
+        if found:
+            now = time.time()
+            self.conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+            self.conn.commit()
+        return found
+
+    def put_many(self, keys: list[str], vectors: np.ndarray):
+        """Store vectors, then evict least-recently-used rows over the size cap."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, dim, vector, nbytes, last_used) VALUES (?, ?, ?, ?, ?)",
+            [
+                (key, vec.shape[0], vec.tobytes(), vec.nbytes, now)
+                for key, vec in zip(keys, vectors)
+            ],
+        )
+        self.conn.commit()
+        self._evict()
+
+    def size_bytes(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+
+    def _evict(self):
+        excess = self.size_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+
+        doomed = []
+        for key, nbytes in self.conn.execute("SELECT key, nbytes FROM embeddings ORDER BY last_used"):
+            doomed.append((key,))
+            excess -= nbytes
+            if excess <= 0:
+                break
+
+        self.conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+        self.conn.commit()
+        self.evictions += len(doomed)
+
+    def clear(self):
+        self.conn.execute("DELETE FROM embeddings")
+        self.conn.commit()
+        self.conn.execute("VACUUM")
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this run plus current cache size."""
+        lookups = self.hits + self.misses
+        entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_mb": round(self.size_bytes() / (1024 * 1024), 2),
+            "max_size_mb": round(self.max_bytes / (1024 * 1024), 2),
+        }
+
+
+class CachedEncoder:
+    """
+    Drop-in replacement for SentenceTransformer.encode that consults the cache.
+
+    The underlying model is only loaded when the first cache miss happens,
+    so a fully cached re-run never pays model start-up time.
+    """
+
+    def __init__(self, load_model: Callable[[], object], model_name: str, cache: EmbeddingCache):
+        self._load_model = load_model
+        self._model = None
+        self.model_name = model_name
+        self.cache = cache
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self._load_model()
+        return self._model
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(
+        self,
+        sentences: list[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+        **kwargs,
+    ) -> np.ndarray:
+        keys = [cache_key(self.model_name, s) for s in sentences]
+        found = self.cache.get_many(keys)
+
+        missing = {}
+        for key, sentence in zip(keys, sentences):
+            if key not in found and key not in missing:
+                missing[key] = sentence
+
+        self.cache.misses += len(missing)
+        self.cache.hits += len(sentences) - len(missing)
+
+        if missing:
+            print(f"Cache: {len(sentences) - len(missing)} hits, encoding {len(missing)} misses")
+            vectors = self.model.encode(
+                list(missing.values()),
+                batch_size=batch_size,
+                show_progress_bar=show_progress_bar,
+                convert_to_numpy=True,
+                **kwargs,
+            )
+            vectors = np.asarray(vectors, dtype=np.float32)
+            self.cache.put_many(list(missing), vectors)
+            found.update(zip(missing, vectors))
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the lyric embedding cache")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR, help="Cache directory")
+    parser.add_argument("--clear", action="store_true", help="Delete all cached vectors")
+
+    args = parser.parse_args()
+
+    cache = EmbeddingCache(args.cache_dir)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared cache: {cache.path}")
+
+    stats = cache.stats()
+    print(f"Cache: {cache.path}")
+    print(f"Entries: {stats['entries']}")
+    print(f"Size: {stats['size_mb']} MB (cap {stats['max_size_mb']} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - Embedding Store
+
+Reads and writes embedding directories in either layout:
+
+    embeddings.npy + metadata.parquet                (single file)
+    shards/embeddings-00000.npy + metadata-00000.parquet
+    + checkpoint.json                                (streaming mode)
+
+Metadata goes through song_store, so .jsonl files from older runs load
+the same way and readers can project just the columns they need.
+
+Vectors can be stored as float32, float16, or int8 with per-dimension
+scales in a sibling *.scales.npy file. open_embeddings() memory-maps the
+files and dequantizes to float32 one batch at a time, so consumers never
+hold more than a batch of float32 rows they didn't ask for.
+
+Downstream scripts call load_embedding_dir() / open_embeddings() and
+never need to know which layout or precision produced the directory.
+
+Sharded directories also carry manifest.json: one segment per run
+(initial embed, then each --append) with its row offset and shard range,
+so load_segments() can hand consumers only the rows added since the last
+segment they saw.
+
+Usage:
+    python embedding_store.py --input ./lyric_embeddings
+    python embedding_store.py --input ./lyric_embeddings --recall-check
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from song_store import iter_song_batches, read_songs, resolve, write_songs
+
+SHARD_DIR = "shards"
+CHECKPOINT_FILE = "checkpoint.json"
+MANIFEST_FILE = "manifest.json"
+STORAGE_DTYPES = ("float32", "float16", "int8")
+
+
+def atomic_write_json(path: Path, data: dict):
+    """Write JSON via a temp file + rename so readers never see a partial file."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def shard_paths(output_dir: Path, index: int) -> tuple[Path, Path]:
+    """Embedding and metadata paths for shard number `index`."""
+    shard_dir = output_dir / SHARD_DIR
+    return (
+        shard_dir / f"embeddings-{index:05d}.npy",
+        shard_dir / f"metadata-{index:05d}.jsonl",
+    )
+
+
+def scales_path(embeddings_path: Path) -> Path:
+    """Per-dimension int8 scales stored next to an embeddings file."""
+    return embeddings_path.with_suffix(".scales.npy")
+
+
+def quantize(embeddings: np.ndarray, dtype: str = "float32") -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    Convert float32 vectors to the storage dtype.
+
+    int8 is symmetric per dimension: column j is stored as
+    round(x / scale_j) with scale_j = max|x_j| / 127.
+
+    Returns:
+        (stored_array, scales) where scales is None unless dtype is int8
+    """
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown storage dtype {dtype!r}, expected one of {STORAGE_DTYPES}")
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dtype != "int8":
+        return embeddings.astype(dtype), None
+
+    scales = np.abs(embeddings).max(axis=0) / 127.0 if len(embeddings) else np.ones(embeddings.shape[1:], np.float32)
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    stored = np.clip(np.rint(embeddings / scales), -127, 127).astype(np.int8)
+    return stored, scales
+
+
+def dequantize(stored: np.ndarray, scales: np.ndarray | None) -> np.ndarray:
+    """Inverse of quantize(), always returning float32."""
+    if scales is None:
+        return np.asarray(stored, dtype=np.float32)
+    return stored.astype(np.float32) * scales
+
+
+def save_embeddings(embeddings_path: Path, embeddings: np.ndarray, dtype: str = "float32"):
+    """Save vectors in the storage dtype (plus scales for int8)."""
+    stored, scales = quantize(embeddings, dtype)
+    np.save(embeddings_path, stored)
+    extra = scales_path(embeddings_path)
+    if scales is not None:
+        np.save(extra, scales)
+    elif extra.exists():
+        extra.unlink()
+
+
+def read_checkpoint(input_dir: Path) -> dict | None:
+    """Load the streaming checkpoint, or None for single-file directories."""
+    path = input_dir / CHECKPOINT_FILE
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_manifest(input_dir: Path) -> dict | None:
+    """Load the segment manifest, or None if the directory has none."""
+    path = input_dir / MANIFEST_FILE
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def clear_shards(output_dir: Path):
+    """Remove shard files, checkpoint and manifest left over from a streaming run."""
+    shard_dir = output_dir / SHARD_DIR
+    if shard_dir.exists():
+        for path in shard_dir.glob("*-[0-9][0-9][0-9][0-9][0-9]*"):
+            path.unlink()
+    for name in (CHECKPOINT_FILE, MANIFEST_FILE):
+        path = output_dir / name
+        if path.exists():
+            path.unlink()
+
+
+def content_hash(clean_lyrics: str) -> str:
+    """Model-independent hash of cleaned lyrics, for duplicate detection."""
+    return hashlib.sha256(clean_lyrics.encode("utf-8")).hexdigest()
+
+
+class ShardWriter:
+    """
+    Write embeddings + metadata as numbered shards.
+
+    The checkpoint is rewritten only after a shard's files are fully on
+    disk, so after a crash it always points at the last complete shard.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        model_name: str,
+        shard_size: int = 1000,
+        resume: bool = False,
+        storage_dtype: str = "float32",
+        metadata_format: str = "parquet",
+    ):
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.storage_dtype = storage_dtype
+        (output_dir / SHARD_DIR).mkdir(parents=True, exist_ok=True)
+
+        checkpoint = read_checkpoint(output_dir) if resume else None
+        if checkpoint is None:
+            clear_shards(output_dir)
+            checkpoint = {
+                "model": model_name,
+                "shard_size": shard_size,
+                "songs_consumed": 0,
+                "shards": [],
+                "metadata_format": metadata_format,
+                "complete": False,
+            }
+        elif checkpoint["model"] != model_name:
+            raise ValueError(
+                f"Checkpoint was written with model {checkpoint['model']}, not {model_name}"
+            )
+        self.checkpoint = checkpoint
+
+    @property
+    def songs_consumed(self) -> int:
+        """Input songs (kept or skipped) covered by finished shards."""
+        return self.checkpoint["songs_consumed"]
+
+    @property
+    def total_rows(self) -> int:
+        return sum(s["rows"] for s in self.checkpoint["shards"])
+
+    @property
+    def complete(self) -> bool:
+        return self.checkpoint["complete"]
+
+    def write_shard(self, songs: list[dict], embeddings: np.ndarray, songs_consumed: int):
+        """Persist one shard, then advance the checkpoint past it."""
+        index = len(self.checkpoint["shards"])
+        embeddings_path, metadata_path = shard_paths(self.output_dir, index)
+
+        write_songs(
+            metadata_path,
+            [{k: v for k, v in song.items() if k != "lyrics"} for song in songs],
+            # Checkpoints from before Parquet metadata keep writing JSONL on resume
+            self.checkpoint.get("metadata_format", "jsonl"),
+        )
+        save_embeddings(embeddings_path, embeddings, self.storage_dtype)
+
+        self.checkpoint["shards"].append({
+            "index": index,
+            "rows": len(songs),
+            "embedding_dim": int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+        })
+        self.checkpoint["songs_consumed"] = songs_consumed
+        atomic_write_json(self.output_dir / CHECKPOINT_FILE, self.checkpoint)
+
+    def finish(self, songs_consumed: int):
+        """Mark the run complete so --resume knows there is nothing left."""
+        self.checkpoint["songs_consumed"] = songs_consumed
+        self.checkpoint["complete"] = True
+        atomic_write_json(self.output_dir / CHECKPOINT_FILE, self.checkpoint)
+
+
+def convert_to_shards(output_dir: Path, model_name: str):
+    """
+    Turn a single-file directory into shard 0 of a sharded one.
+
+    Files are hard-linked into shards/ and the checkpoint is written before
+    the originals are removed, so a crash leaves one readable layout.
+    """
+    embeddings_path = output_dir / "embeddings.npy"
+    metadata_path = resolve(output_dir / "metadata.jsonl")
+    stats_path = output_dir / "stats.json"
+    if stats_path.exists():
+        with open(stats_path, "r", encoding="utf-8") as f:
+            written_with = json.load(f).get("model", model_name)
+        if written_with != model_name:
+            raise ValueError(f"{output_dir} was embedded with {written_with}, not {model_name}")
+
+    stored = np.load(embeddings_path, mmap_mode="r")
+    (output_dir / SHARD_DIR).mkdir(parents=True, exist_ok=True)
+    shard_embeddings, shard_metadata = shard_paths(output_dir, 0)
+    moves = [
+        (embeddings_path, shard_embeddings),
+        (metadata_path, shard_metadata.with_suffix(metadata_path.suffix)),
+    ]
+    if scales_path(embeddings_path).exists():
+        moves.append((scales_path(embeddings_path), scales_path(shard_embeddings)))
+    for src, dst in moves:
+        if dst.exists():
+            dst.unlink()
+        os.link(src, dst)
+
+    atomic_write_json(output_dir / CHECKPOINT_FILE, {
+        "model": model_name,
+        "shard_size": len(stored),
+        "songs_consumed": len(stored),
+        "shards": [{"index": 0, "rows": len(stored), "embedding_dim": int(stored.shape[1])}],
+        "metadata_format": metadata_path.suffix.lstrip("."),
+        "complete": True,
+    })
+    for src, _ in moves:
+        src.unlink()
+
+
+def record_segment(output_dir: Path) -> dict | None:
+    """
+    Add one manifest segment covering shards not in any segment yet.
+
+    Returns the new segment, or None if every shard is already covered.
+    """
+    checkpoint = read_checkpoint(output_dir)
+    manifest = read_manifest(output_dir) or {"segments": []}
+    segments = manifest["segments"]
+
+    first = segments[-1]["shards"][1] if segments else 0
+    new_shards = checkpoint["shards"][first:]
+    if not new_shards:
+        return None
+
+    segment = {
+        "segment": len(segments),
+        "row_offset": segments[-1]["row_offset"] + segments[-1]["rows"] if segments else 0,
+        "rows": sum(shard["rows"] for shard in new_shards),
+        "shards": [first, len(checkpoint["shards"])],
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    segments.append(segment)
+    atomic_write_json(output_dir / MANIFEST_FILE, manifest)
+    return segment
+
+
+def open_for_append(
+    output_dir: Path,
+    model_name: str,
+    shard_size: int = 1000,
+    storage_dtype: str = "float32",
+    metadata_format: str = "parquet",
+) -> ShardWriter:
+    """
+    ShardWriter that adds shards after whatever the directory already holds.
+
+    Single-file directories are converted to shard 0 first, and existing
+    rows are recorded as their own segment so the append is a clean delta.
+    """
+    if read_checkpoint(output_dir) is None and (output_dir / "embeddings.npy").exists():
+        print(f"Converting {output_dir} to the sharded layout for appending")
+        convert_to_shards(output_dir, model_name)
+
+    checkpoint = read_checkpoint(output_dir)
+    resume = checkpoint is not None
+    if resume and checkpoint["shards"]:
+        # Keep one precision per directory, whatever --storage says
+        existing = str(np.load(shard_paths(output_dir, 0)[0], mmap_mode="r").dtype)
+        if existing != storage_dtype:
+            print(f"Appending as {existing} to match existing shards (not {storage_dtype})")
+            storage_dtype = existing
+
+    writer = ShardWriter(
+        output_dir, model_name, shard_size=shard_size, resume=resume,
+        storage_dtype=storage_dtype, metadata_format=metadata_format,
+    )
+    if resume:
+        record_segment(output_dir)
+    return writer
+
+
+def metadata_paths(input_dir: Path) -> list[Path]:
+    """Metadata files in row order (suffix resolved later by song_store)."""
+    checkpoint = read_checkpoint(input_dir)
+    if checkpoint is None:
+        return [input_dir / "metadata.jsonl"]
+    return [shard_paths(input_dir, shard["index"])[1] for shard in checkpoint["shards"]]
+
+
+def load_metadata(input_dir: Path, columns: list[str] | None = None) -> list[dict]:
+    """Load song metadata from either directory layout, optionally only `columns`."""
+    metadata = []
+    for path in metadata_paths(input_dir):
+        metadata.extend(read_songs(path, columns))
+    return metadata
+
+
+def iter_metadata(input_dir: Path, columns: list[str] | None = None, batch_size: int = 1024):
+    """Stream song metadata in batches without loading the whole directory."""
+    for path in metadata_paths(input_dir):
+        yield from iter_song_batches(path, columns, batch_size)
+
+
+def metadata_fingerprint(input_dir: Path) -> str:
+    """Hash of the metadata files' bytes, for outputs derived from them to detect a changed corpus."""
+    digest = hashlib.sha256()
+    for path in metadata_paths(Path(input_dir)):
+        path = resolve(path)
+        digest.update(path.name.encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class EmbeddingMatrix:
+    """
+    Read-only float32 view over one or more memory-mapped embedding files.
+
+    Rows are dequantized on access, so iter_batches() touches one batch of
+    float32 data at a time regardless of the on-disk dtype.
+    """
+
+    dtype = np.dtype(np.float32)
+
+    def __init__(
+        self,
+        parts: list[tuple[np.ndarray, np.ndarray | None]],
+        dim: int = 0,
+        storage_dtype: str = "float32",
+    ):
+        self.parts = [(stored, scales) for stored, scales in parts if len(stored)]
+        self.starts = np.cumsum([0] + [len(stored) for stored, _ in self.parts])
+        # Empty parts still carry the width and dtype; `dim` is for stores with no files at all
+        shaped = self.parts[0][0] if self.parts else next(
+            (stored for stored, _ in parts if stored.ndim == 2 and stored.shape[1]), None
+        )
+        self.dim = shaped.shape[1] if shaped is not None else dim
+        self.storage_dtype = str(shaped.dtype) if shaped is not None else storage_dtype
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return (int(self.starts[-1]), self.dim)
+
+    def __len__(self) -> int:
+        return int(self.starts[-1])
+
+    def _rows(self, start: int, stop: int) -> np.ndarray:
+        chunks = []
+        for (stored, scales), part_start in zip(self.parts, self.starts[:-1]):
+            lo = max(start - part_start, 0)
+            hi = min(stop - part_start, len(stored))
+            if lo < hi:
+                chunks.append(dequantize(stored[lo:hi], scales))
+        if not chunks:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return self._rows(start, stop)
+            picked = np.arange(start, stop, step)
+            if not len(picked):
+                return np.zeros((0, self.dim), dtype=np.float32)
+            low = int(picked.min())
+            return self._rows(low, int(picked.max()) + 1)[picked - low]
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError(index)
+            return self._rows(index, index + 1)[0]
+        return self.to_array()[index]
+
+    def iter_batches(self, batch_size: int = 4096):
+        """Yield (start_row, float32 batch) pairs."""
+        for start in range(0, len(self), batch_size):
+            yield start, self._rows(start, min(start + batch_size, len(self)))
+
+    def to_array(self) -> np.ndarray:
+        return self._rows(0, len(self))
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.to_array()
+        return array if dtype is None else array.astype(dtype)
+
+
+def _open_part(embeddings_path: Path) -> tuple[np.ndarray, np.ndarray | None]:
+    stored = np.load(embeddings_path, mmap_mode="r")
+    extra = scales_path(embeddings_path)
+    scales = np.load(extra) if extra.exists() else None
+    return stored, scales
+
+
+def _open_shards(input_dir: Path, shards: list[dict]) -> EmbeddingMatrix:
+    dim = next((shard["embedding_dim"] for shard in shards if shard["embedding_dim"]), 0)
+    return EmbeddingMatrix([
+        _open_part(shard_paths(input_dir, shard["index"])[0])
+        for shard in shards
+    ], dim=dim)
+
+
+def open_embeddings(input_dir: Path) -> EmbeddingMatrix:
+    """Memory-map the embedding matrix from either directory layout."""
+    checkpoint = read_checkpoint(input_dir)
+    if checkpoint is None:
+        return EmbeddingMatrix([_open_part(input_dir / "embeddings.npy")])
+    return _open_shards(input_dir, checkpoint["shards"])
+
+
+def load_embeddings(input_dir: Path) -> np.ndarray:
+    """Load the full float32 embedding matrix from either directory layout."""
+    return open_embeddings(input_dir).to_array()
+
+
+def load_embedding_dir(
+    input_dir: Path,
+    mmap: bool = False,
+    columns: list[str] | None = None,
+) -> tuple[list[dict], np.ndarray | EmbeddingMatrix]:
+    """
+    Load (metadata, embeddings) from a single-file or sharded directory.
+
+    With mmap=True the embeddings come back as a lazily dequantized
+    EmbeddingMatrix instead of an in-memory float32 array. `columns`
+    limits which metadata fields are read.
+    """
+    metadata = load_metadata(input_dir, columns)
+    embeddings = open_embeddings(input_dir)
+
+    if len(metadata) != len(embeddings):
+        raise ValueError(
+            f"{input_dir}: {len(metadata)} metadata rows but {len(embeddings)} embeddings"
+        )
+
+    return metadata, (embeddings if mmap else embeddings.to_array())
+
+
+def load_segments(
+    input_dir: Path,
+    since: int = 0,
+    mmap: bool = False,
+    columns: list[str] | None = None,
+) -> tuple[list[dict], np.ndarray | EmbeddingMatrix, int]:
+    """
+    Load only the rows of manifest segments `since` and later.
+
+    When no segment is that recent, the embeddings are empty but keep
+    the store's width: (0, dim) float32, or an empty EmbeddingMatrix with
+    the store's dim and storage dtype when mmap=True.
+
+    Returns:
+        (metadata, embeddings, row_offset) where row_offset is the global
+        row index of the first returned row
+    """
+    manifest = read_manifest(input_dir)
+    if manifest is None:
+        if since:
+            raise ValueError(f"{input_dir} has no {MANIFEST_FILE}; only since=0 is available")
+        metadata, embeddings = load_embedding_dir(input_dir, mmap=mmap, columns=columns)
+        return metadata, embeddings, 0
+
+    segments = manifest["segments"][since:]
+    if not segments:
+        stored = open_embeddings(input_dir)
+        empty = EmbeddingMatrix([], dim=stored.dim, storage_dtype=stored.storage_dtype)
+        return [], (empty if mmap else empty.to_array()), sum(s["rows"] for s in manifest["segments"])
+
+    shards = read_checkpoint(input_dir)["shards"][segments[0]["shards"][0]:segments[-1]["shards"][1]]
+    metadata = []
+    for shard in shards:
+        metadata.extend(read_songs(shard_paths(input_dir, shard["index"])[1], columns))
+    embeddings = _open_shards(input_dir, shards)
+
+    if len(metadata) != len(embeddings):
+        raise ValueError(
+            f"{input_dir}: {len(metadata)} metadata rows but {len(embeddings)} embeddings"
+        )
+    return metadata, (embeddings if mmap else embeddings.to_array()), segments[0]["row_offset"]
+
+
+def quantization_recall(
+    embeddings: np.ndarray,
+    dtype: str,
+    k: int = 10,
+    n_queries: int = 200,
+    seed: int = 42,
+) -> float:
+    """
+    Mean recall@k of cosine top-k on quantized vectors vs float32.
+
+    Each query is a corpus vector; its own row is excluded from both lists.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(len(embeddings), size=min(n_queries, len(embeddings)), replace=False)
+
+    def top_k(matrix: np.ndarray) -> np.ndarray:
+        normed = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        scores = normed[queries] @ normed.T
+        scores[np.arange(len(queries)), queries] = -np.inf
+        return np.argpartition(-scores, k, axis=1)[:, :k]
+
+    exact = top_k(embeddings)
+    approx = top_k(dequantize(*quantize(embeddings, dtype)))
+    hits = sum(len(np.intersect1d(a, b)) for a, b in zip(exact, approx))
+    return hits / (len(queries) * k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect an embedding directory")
+    parser.add_argument("--input", "-i", type=Path, default=Path("./lyric_embeddings"), help="Embedding directory")
+    parser.add_argument("--recall-check", action="store_true", help="Top-10 cosine recall of float16/int8 vs float32")
+    parser.add_argument("--queries", type=int, default=200, help="Query vectors for --recall-check")
+
+    args = parser.parse_args()
+
+    checkpoint = read_checkpoint(args.input)
+    metadata, embeddings = load_embedding_dir(args.input, mmap=True)
+
+    layout = "sharded" if checkpoint else "single file"
+    print(f"Layout: {layout}")
+    print(f"Songs: {len(metadata)}")
+    print(f"Embeddings: {embeddings.shape} stored as {embeddings.storage_dtype}")
+    if checkpoint:
+        status = "complete" if checkpoint["complete"] else "in progress (resumable)"
+        print(f"Shards: {len(checkpoint['shards'])} ({status})")
+        print(f"Input songs consumed: {checkpoint['songs_consumed']}")
+    manifest = read_manifest(args.input)
+    if manifest:
+        for segment in manifest["segments"]:
+            print(f"Segment {segment['segment']}: rows {segment['row_offset']}-"
+                  f"{segment['row_offset'] + segment['rows'] - 1} ({segment['created']})")
+
+    if args.recall_check:
+        if embeddings.storage_dtype != "float32":
+            print("Recall check needs a float32 directory as the reference")
+            return
+        vectors = embeddings.to_array()
+        print(f"\nTop-10 cosine recall vs float32 ({min(args.queries, len(vectors))} queries):")
+        for dtype in ("float16", "int8"):
+            recall = quantization_recall(vectors, dtype, n_queries=args.queries)
+            size = vectors.shape[0] * vectors.shape[1] * np.dtype(dtype).itemsize
+            print(f"  {dtype:8} recall@10 = {recall:.4f}  ({size / 1e6:.2f} MB)")
+
+
+if __name__ == "__main__":
+    main()
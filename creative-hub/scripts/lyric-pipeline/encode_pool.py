@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - Multi-Process Encoder
+
+CPU-only boxes get more songs/sec out of several small SentenceTransformer
+processes than out of one process with a big intra-op thread pool.
+PoolEncoder splits the input into chunks, each worker holds its own model
+copy with a pinned thread count (and CPU set, where the OS allows), and
+results come back as float32 rows written straight into shared memory
+instead of pickled lists.
+
+Usage:
+    python encode_pool.py --input ./lyric_embeddings --workers 1 2 4 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+
+import numpy as np
+from tqdm import tqdm
+
+from embedding_store import load_metadata
+
+# Per-worker globals, set by _init_worker
+_MODEL = None
+_BARRIER = None
+
+
+def _init_worker(model_name: str, threads: int, core_sets, barrier):
+    """Pin threads (and CPUs if available), then load this worker's model copy."""
+    global _MODEL, _BARRIER
+
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    cores = core_sets.get()
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    _MODEL = SentenceTransformer(model_name, device="cpu")
+    _BARRIER = barrier
+
+
+def _ready() -> int:
+    """Block until every worker is up, so warm-up touches the whole pool."""
+    _BARRIER.wait()
+    return _MODEL.get_sentence_embedding_dimension()
+
+
+def _encode_chunk(shm_name: str, shape: tuple[int, int], start: int, texts: list[str], batch_size: int) -> int:
+    """Encode `texts` and write them into rows [start, start + len(texts)) of the shared matrix."""
+    vectors = _MODEL.encode(
+        texts,
+        batch_size=batch_size,
+        show_progress_bar=False,
+        convert_to_numpy=True,
+    )
+    # Workers share the parent's resource tracker, so attaching here doesn't
+    # leave a second owner that could unlink the segment early.
+    shm = SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        out[start:start + len(texts)] = vectors
+        del out
+    finally:
+        shm.close()
+    return len(texts)
+
+
+class PoolEncoder:
+    """SentenceTransformer.encode-compatible encoder backed by a process pool."""
+
+    def __init__(self, model_name: str, workers: int, threads_per_worker: int | None = None):
+        self.model_name = model_name
+        self.workers = workers
+        self.threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+
+        ctx = mp.get_context("spawn")
+        core_sets = ctx.Queue()
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+        for w in range(workers):
+            core_sets.put(cpus[w * self.threads:(w + 1) * self.threads] or None)
+        barrier = ctx.Barrier(workers)
+
+        print(f"Starting {workers} encoder workers ({self.threads} threads each): {model_name}")
+        start = time.perf_counter()
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(model_name, self.threads, core_sets, barrier),
+        )
+        dims = [self.executor.submit(_ready) for _ in range(workers)]
+        self.dim = dims[0].result()
+        for future in dims:
+            future.result()
+        self.startup_seconds = time.perf_counter() - start
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(
+        self,
+        sentences: list[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+        **kwargs,
+    ) -> np.ndarray:
+        n = len(sentences)
+        if n == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        # ~4 chunks per worker keeps the pool busy without tiny tasks
+        chunk = max(batch_size, math.ceil(n / (self.workers * 4) / batch_size) * batch_size)
+        shape = (n, self.dim)
+        shm = SharedMemory(create=True, size=n * self.dim * 4)
+        try:
+            futures = [
+                self.executor.submit(_encode_chunk, shm.name, shape, start, sentences[start:start + chunk], batch_size)
+                for start in range(0, n, chunk)
+            ]
+            with tqdm(total=n, desc="Encoding", disable=not show_progress_bar) as bar:
+                for future in as_completed(futures):
+                    bar.update(future.result())
+
+            view = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+            embeddings = view.copy()
+            del view
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return embeddings
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def benchmark_workers(
+    model_name: str,
+    texts: list[str],
+    worker_counts: tuple[int, ...] = (1, 2, 4, 8),
+    batch_size: int = 32,
+) -> list[dict]:
+    """
+    Measure encode throughput (songs/sec) for each pool size.
+
+    Pool start-up and model loading are timed separately from encoding,
+    since they are paid once per run rather than per song.
+    """
+    results = []
+    for workers in worker_counts:
+        pool = PoolEncoder(model_name, workers)
+        try:
+            start = time.perf_counter()
+            pool.encode(texts, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+        finally:
+            pool.close()
+
+        result = {
+            "workers": workers,
+            "threads_per_worker": pool.threads,
+            "songs": len(texts),
+            "seconds": round(elapsed, 3),
+            "songs_per_sec": round(len(texts) / elapsed, 2),
+            "startup_seconds": round(pool.startup_seconds, 2),
+        }
+        print(f"  {workers} workers: {result['songs_per_sec']:8.2f} songs/sec")
+        results.append(result)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multi-process lyric encoding")
+    parser.add_argument("--input", "-i", type=Path, default=Path("./lyric_embeddings"), help="Directory with metadata.jsonl")
+    parser.add_argument("--model", type=str, default="all-MiniLM-L6-v2", help="Sentence transformer model")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Pool sizes to compare")
+    parser.add_argument("--samples", type=int, default=512, help="Songs to encode per pool size")
+    parser.add_argument("--batch-size", type=int, default=32, help="Embedding batch size")
+
+    args = parser.parse_args()
+
+    songs = load_metadata(args.input)[:args.samples]
+    texts = [s.get("lyrics_clean") or s.get("lyrics_preview", "") for s in songs]
+
+    print(f"Encoding {len(texts)} songs with pool sizes {args.workers}")
+    benchmark_workers(args.model, texts, tuple(args.workers), batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Lyric Intelligence Pipeline - Encoder Factory
+
+Builds the object both embedders call `.encode()` on. Everything returned
+here follows the SentenceTransformer.encode signature, so embed_lyrics()
+and process_and_embed() don't care which one they get.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+
+from embedding_cache import CachedEncoder, EmbeddingCache
+
+SERVER_ENV = "LYRIC_EMBED_SERVER"
+DEFAULT_SERVER_URL = "http://127.0.0.1:8765"  # embed_server.py's default bind
+
+
+def add_server_args(parser: argparse.ArgumentParser):
+    """--server [URL] / --no-server; the embedding server is only used when asked for."""
+    parser.add_argument(
+        "--server", nargs="?", const=DEFAULT_SERVER_URL, default=os.environ.get(SERVER_ENV), metavar="URL",
+        help=f"Encode through a running embed_server.py (default {DEFAULT_SERVER_URL}; also ${SERVER_ENV})",
+    )
+    parser.add_argument(
+        "--no-server", dest="server", action="store_const", const=None,
+        help=f"Load the model here even if ${SERVER_ENV} is set",
+    )
+
+
+def load_encoder(
+    model_name: str,
+    cache: EmbeddingCache | None = None,
+    workers: int = 1,
+    server: str | None = None,
+):
+    """
+    SentenceTransformer, wrapped so only cache misses reach the model.
+
+    With `server` (a URL), an embed_server running the same model there is
+    used instead of loading one here. With workers > 1 the model runs in
+    a PoolEncoder process pool instead.
+    """
+    def load_model():
+        if server and workers == 1:
+            from embed_server import find_server
+
+            encoder = find_server(model_name, server)
+            if encoder is not None:
+                print(f"Using embedding server: {server} ({model_name})")
+                return encoder
+
+        if workers > 1:
+            from encode_pool import PoolEncoder
+
+            return PoolEncoder(model_name, workers)
+
+        from sentence_transformers import SentenceTransformer
+
+        print(f"Loading model: {model_name}")
+        return SentenceTransformer(model_name)
+
+    if cache is None:
+        return load_model()
+    return CachedEncoder(load_model, model_name, cache)
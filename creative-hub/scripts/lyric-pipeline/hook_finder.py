@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - Hook Finder (Suffix Automaton)
+
+The default hook detector counts 2-5 word phrases, so a repeated chorus
+line shows up only as its overlapping 5-word fragments. This engine
+builds a suffix automaton over a song's word ids (linear in its length)
+and reads off every maximal repeated phrase of any length with its
+count: a phrase whose occurrences cannot all be extended by the same
+word on either side. A chorus sung three times is one hook, not dozens.
+
+Hooks are ranked by the words they cover (count x length), then count,
+then first occurrence. Phrases that contain, or are contained in, an
+already-chosen hook are skipped, so "yeah yeah yeah ..." runs and chorus fragments don't crowd
+out the rest. embed_hiphop_viral.py uses it with --hook-engine automaton.
+
+Usage:
+    python hook_finder.py --input lyrics.txt
+    python hook_finder.py --benchmark --longest 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+
+class SuffixAutomaton:
+    """
+    Suffix automaton over a token sequence.
+
+    Per state: longest match length, suffix link, transitions, the end
+    position of its first occurrence and its occurrence count.
+    """
+
+    def __init__(self, tokens: list):
+        self.length = [0]
+        self.link = [-1]
+        self.next: list[dict] = [{}]
+        self.first_end = [-1]
+        count = [0]
+
+        last = 0
+        for i, token in enumerate(tokens):
+            cur = len(self.length)
+            self.length.append(self.length[last] + 1)
+            self.link.append(0)
+            self.next.append({})
+            self.first_end.append(i)
+            count.append(1)
+
+            p = last
+            while p != -1 and token not in self.next[p]:
+                self.next[p][token] = cur
+                p = self.link[p]
+
+            if p != -1:
+                q = self.next[p][token]
+                if self.length[p] + 1 == self.length[q]:
+                    self.link[cur] = q
+                else:
+                    clone = len(self.length)
+                    self.length.append(self.length[p] + 1)
+                    self.link.append(self.link[q])
+                    self.next.append(dict(self.next[q]))
+                    self.first_end.append(self.first_end[q])
+                    count.append(0)
+                    while p != -1 and self.next[p].get(token) == q:
+                        self.next[p][token] = clone
+                        p = self.link[p]
+                    self.link[q] = self.link[cur] = clone
+            last = cur
+
+        # Occurrences flow up suffix links, longest states first (counting sort)
+        buckets: list[list[int]] = [[] for _ in range(len(tokens) + 1)]
+        for state, n in enumerate(self.length):
+            buckets[n].append(state)
+        for n in range(len(tokens), 0, -1):
+            for state in buckets[n]:
+                count[self.link[state]] += count[state]
+        self.count = count
+
+    def maximal_repeats(self, min_count: int = 2, min_length: int = 1) -> list[tuple[int, int, int]]:
+        """
+        (start, length, count) of every maximal repeat.
+
+        A state's longest string is already left-maximal; it is also
+        right-maximal when no single next token continues every occurrence,
+        i.e. no transition keeps the full count.
+        """
+        repeats = []
+        for state in range(1, len(self.length)):
+            n, c = self.length[state], self.count[state]
+            if n < min_length or c < min_count:
+                continue
+            if any(self.count[target] == c for target in self.next[state].values()):
+                continue
+            repeats.append((self.first_end[state] - n + 1, n, c))
+        return repeats
+
+
+def find_hooks(words: list[str], min_count: int = 3, min_length: int = 2, top: int = 10) -> list[tuple[str, int]]:
+    """
+    Up to `top` (phrase, count) hooks: maximal phrases of min_length+ words
+    repeated min_count+ times, ranked by words covered.
+    """
+    if len(words) < min_length:
+        return []
+    ids: dict[str, int] = {}
+    tokens = [ids.setdefault(w, len(ids)) for w in words]
+
+    repeats = SuffixAutomaton(tokens).maximal_repeats(min_count, min_length)
+    repeats.sort(key=lambda r: (-r[1] * r[2], -r[2], r[0], r[1]))
+
+    hooks: list[tuple[str, int]] = []
+    chosen: list[str] = []  # " id id id " keys, for contiguous containment checks
+    for start, length, count in repeats:
+        key = " " + " ".join(map(str, tokens[start:start + length])) + " "
+        if any(key in other or other in key for other in chosen):
+            continue
+        chosen.append(key)
+        hooks.append((" ".join(words[start:start + length]), count))
+        if len(hooks) >= top:
+            break
+    return hooks
+
+
+def benchmark(corpus: Path, longest: int = 100, repeats: int = 3) -> dict:
+    """Time the n-gram hook engines against find_hooks on the corpus's longest songs."""
+    from embed_hiphop_viral import _batch_hooks, extract_viral_features
+
+    with open(corpus, "r", encoding="utf-8") as f:
+        songs = [json.loads(line) for line in f if line.strip()]
+    texts = [s.get("lyrics") or s.get("lyrics_clean") or s.get("lyrics_preview", "") for s in songs]
+    texts = sorted(texts, key=lambda t: -len(t.split()))[:longest]
+    word_lists = [t.lower().split() for t in texts]
+    print(f"Corpus: {corpus} (longest {len(texts)} songs, {min(map(len, word_lists))}-{max(map(len, word_lists))} words)")
+
+    def best_of(fn) -> float:
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    timings = {
+        "ngram_counter_sec": best_of(lambda: [extract_viral_features(t) for t in texts]),
+        "ngram_batch_sec": best_of(lambda: _batch_hooks(word_lists)),
+        "automaton_sec": best_of(lambda: [find_hooks(w) for w in word_lists]),
+    }
+    for name, seconds in timings.items():
+        print(f"  {name[:-4]:16} {seconds * 1000:8.1f} ms  ({seconds / len(texts) * 1000:.2f} ms/song)")
+
+    ngram_hooks = [hooks for _, hooks in _batch_hooks(word_lists)]
+    automaton_hooks = [[p for p, _ in find_hooks(w)[:5]] for w in word_lists]
+    longest_ngram = sum(max((len(h.split()) for h in hooks), default=0) for hooks in ngram_hooks) / len(texts)
+    longest_auto = sum(max((len(h.split()) for h in hooks), default=0) for hooks in automaton_hooks) / len(texts)
+    print(f"  mean longest top hook: {longest_ngram:.1f} words (n-gram) vs {longest_auto:.1f} (automaton)")
+
+    return {"songs": len(texts), **{k: round(v, 4) for k, v in timings.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find maximal repeated phrases (hooks) in lyrics")
+    parser.add_argument("--input", "-i", type=str, help="Lyrics text file or string")
+    parser.add_argument("--min-count", type=int, default=3, help="Repeats needed to count as a hook")
+    parser.add_argument("--min-length", type=int, default=2, help="Shortest hook, in words")
+    parser.add_argument("--top", type=int, default=10, help="Hooks to list")
+    parser.add_argument("--benchmark", action="store_true", help="Compare against the n-gram engines")
+    parser.add_argument(
+        "--corpus", type=Path,
+        default=Path(__file__).parent / "lyric_embeddings" / "metadata.jsonl",
+        help="JSONL corpus for --benchmark (lyrics, lyrics_clean or lyrics_preview field)",
+    )
+    parser.add_argument("--longest", type=int, default=100, help="Benchmark on this many of the longest songs")
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.corpus, longest=args.longest)
+    elif args.input:
+        text = Path(args.input).read_text() if Path(args.input).exists() else args.input
+        for phrase, count in find_hooks(text.lower().split(), args.min_count, args.min_length, args.top):
+            print(f"{count:4d}x  {phrase}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
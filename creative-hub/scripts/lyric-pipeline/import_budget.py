@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - Import-Time Budget
+
+Runs every pipeline script as `python -X importtime <script> --help` in a
+fresh interpreter and fails if its cold start imports too much:
+
+  - total import time above --budget-ms (best of --repeats runs), or
+  - any module from lazy_imports.HEAVY_MODULES loaded just for --help
+
+Exit status is 1 when any script is over budget, so it can gate CI.
+
+Usage:
+    python import_budget.py
+    python import_budget.py --budget-ms 250 --top 8
+    python import_budget.py --scripts cluster_lyrics.py embed_lyrics.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+from lazy_imports import HEAVY_MODULES
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_BUDGET_MS = 400
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """
+    Parse `-X importtime` output.
+
+    Returns:
+        (module, depth, self_us, cumulative_us) per import, in output order
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name[1:]  # single space after the separator
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        imports.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def measure(script: Path) -> dict:
+    """Import profile of one cold `script --help` run."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", script.name, "--help"],
+        cwd=script.parent,
+        capture_output=True,
+        text=True,
+    )
+    imports = parse_importtime(result.stderr)
+    top_level = [(name, cum) for name, depth, _, cum in imports if depth == 0]
+    loaded = {name for name, *_ in imports}
+    return {
+        "script": script.name,
+        "exit_code": result.returncode,
+        "total_ms": sum(cum for _, cum in top_level) / 1000,
+        "top_level": sorted(top_level, key=lambda item: -item[1]),
+        "heavy": sorted(m for m in HEAVY_MODULES if m in loaded),
+    }
+
+
+def find_scripts() -> list[Path]:
+    """Every CLI script in the pipeline directory (except this one)."""
+    return [
+        path for path in sorted(SCRIPT_DIR.glob("*.py"))
+        if path.name != Path(__file__).name and 'if __name__ == "__main__":' in path.read_text(encoding="utf-8")
+    ]
+
+
+def check(scripts: list[Path], budget_ms: float, repeats: int = 3, top: int = 5) -> bool:
+    """Print a report and return True if every script is within budget."""
+    ok = True
+    for script in scripts:
+        runs = [measure(script) for _ in range(repeats)]
+        best = min(runs, key=lambda run: run["total_ms"])
+
+        failures = []
+        if best["exit_code"] != 0:
+            failures.append(f"--help exited with {best['exit_code']}")
+        if best["total_ms"] > budget_ms:
+            failures.append(f"{best['total_ms']:.0f} ms > {budget_ms:.0f} ms budget")
+        if best["heavy"]:
+            failures.append(f"imports {', '.join(best['heavy'])}")
+
+        status = "FAIL" if failures else "ok"
+        print(f"{status:4}  {script.name:28} {best['total_ms']:7.1f} ms")
+        for name, cumulative_us in best["top_level"][:top]:
+            print(f"        {cumulative_us / 1000:7.1f} ms  {name}")
+        for failure in failures:
+            print(f"      ! {failure}")
+        ok = ok and not failures
+
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if any pipeline script's --help imports too much")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Max total import time per script")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per script (best is used)")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest top-level imports to list")
+    parser.add_argument("--scripts", nargs="+", type=Path, help="Scripts to check (default: all)")
+
+    args = parser.parse_args()
+
+    scripts = [SCRIPT_DIR / s.name for s in args.scripts] if args.scripts else find_scripts()
+    print(f"Import budget: {args.budget_ms:.0f} ms per script, heavy modules: {', '.join(HEAVY_MODULES)}\n")
+    if not check(scripts, args.budget_ms, repeats=args.repeats, top=args.top):
+        sys.exit(1)
+    print("\nAll scripts within budget")
+
+
+if __name__ == "__main__":
+    main()
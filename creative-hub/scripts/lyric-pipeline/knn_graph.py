@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - kNN Graph
+
+Precomputes every song's top-k most similar songs (cosine), so "similar
+tracks" is an array lookup instead of one vector search per song.
+
+The corpus is normalized once into a scratch exact index (nn_index.py).
+Row blocks of --block-rows songs are then searched against it in a
+process pool: each worker scores its block against the corpus one tile
+at a time, with the tile sized so its score matrix stays within
+--memory-mb, and keeps a running argpartition top-k. A song is never its
+own neighbor. Results stream into two arrays next to the embeddings:
+
+    knn_ids.npy       (rows, k) int32 neighbor rows, best first (-1 = none)
+    knn_scores.npy    (rows, k) float16 cosine similarities
+    knn_graph.json    k, rows, dim
+
+Uploaders attach the lists as payload with --neighbors.
+
+Usage:
+    python knn_graph.py --input ./hiphop_embeddings --k 50 --workers 4
+    python knn_graph.py --input ./hiphop_embeddings --show 0
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from pipeline_profile import NULL_PROFILER, RunProfiler, add_profile_args
+
+KNN_IDS_FILE = "knn_ids.npy"
+KNN_SCORES_FILE = "knn_scores.npy"
+KNN_FILE = "knn_graph.json"
+
+
+def _knn_block(
+    span: tuple[int, int],
+    index_dir: Path,
+    k: int,
+    memory_mb: float,
+    threads: int | None,
+) -> tuple[int, np.ndarray, np.ndarray]:
+    """Top-k neighbors of rows [start, stop); runs in a pool worker."""
+    from threadpoolctl import threadpool_limits
+
+    from nn_index import load_index
+
+    start, stop = span
+    with threadpool_limits(limits=threads):
+        index = load_index(index_dir)
+        rows, scores = index.search(
+            index.vectors[start:stop], k, exclude=np.arange(start, stop),
+            query_batch=stop - start, memory_mb=memory_mb,
+        )
+    return start, rows, scores.astype(np.float16)
+
+
+def build_knn_graph(
+    input_dir: Path,
+    k: int = 50,
+    workers: int = 1,
+    block_rows: int = 2048,
+    memory_mb: float = 256,
+    output_dir: Path | None = None,
+    profiler: RunProfiler | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute and save the kNN graph of an embedding directory.
+
+    Memory per worker is about `memory_mb` for the score tile plus one
+    block of queries; the full graph is written to memory-mapped files
+    as blocks finish, never held whole.
+
+    Returns:
+        (ids, scores) memory-mapped from the written files
+    """
+    from embedding_store import atomic_write_json, open_embeddings
+    from nn_index import build_index
+    from prefetch import pool_map
+
+    profiler = profiler or NULL_PROFILER
+    output_dir = Path(output_dir or input_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    embeddings = open_embeddings(input_dir)
+    n, dim = embeddings.shape
+    spans = [(start, min(start + block_rows, n)) for start in range(0, n, block_rows)]
+    workers = max(1, min(workers, len(spans)))
+    # Split the cores between workers instead of letting each BLAS pool take all of them
+    threads = max(1, (os.cpu_count() or 1) // workers) if workers > 1 else None
+    print(f"kNN graph: {n} rows x {dim}, k={k}, {len(spans)} blocks of {block_rows} rows, "
+          f"{workers} workers, {memory_mb:g} MB tiles")
+
+    id_tmp = output_dir / (KNN_IDS_FILE + ".tmp")
+    score_tmp = output_dir / (KNN_SCORES_FILE + ".tmp")
+    with tempfile.TemporaryDirectory(dir=output_dir, prefix=".knn-") as scratch:
+        with profiler.stage("normalize", items=n):
+            build_index(embeddings, "exact", output_dir=Path(scratch))
+
+        ids = np.lib.format.open_memmap(id_tmp, mode="w+", dtype=np.int32, shape=(n, k))
+        scores = np.lib.format.open_memmap(score_tmp, mode="w+", dtype=np.float16, shape=(n, k))
+        search = partial(_knn_block, index_dir=Path(scratch), k=k, memory_mb=memory_mb, threads=threads)
+        started = time.perf_counter()
+        done = 0
+        with profiler.stage("knn", items=n):
+            for start, block_ids, block_scores in pool_map(search, spans, workers):
+                ids[start:start + len(block_ids)] = block_ids
+                scores[start:start + len(block_ids)] = block_scores
+                done += len(block_ids)
+                rate = done / max(time.perf_counter() - started, 1e-9)
+                print(f"  {done}/{n} rows ({rate:.0f} rows/s)")
+        ids.flush()
+        scores.flush()
+        del ids, scores
+
+    os.replace(id_tmp, output_dir / KNN_IDS_FILE)
+    os.replace(score_tmp, output_dir / KNN_SCORES_FILE)
+    atomic_write_json(output_dir / KNN_FILE, {"k": k, "rows": n, "dim": dim, "metric": "cosine"})
+    print(f"Saved: {output_dir / KNN_IDS_FILE}, {output_dir / KNN_SCORES_FILE}")
+    return load_knn_graph(output_dir)
+
+
+def load_knn_graph(input_dir: Path) -> tuple[np.ndarray, np.ndarray] | None:
+    """(ids, scores) memory-mapped, or None if the directory has no graph."""
+    input_dir = Path(input_dir)
+    if not (input_dir / KNN_FILE).exists():
+        return None
+    return (
+        np.load(input_dir / KNN_IDS_FILE, mmap_mode="r"),
+        np.load(input_dir / KNN_SCORES_FILE, mmap_mode="r"),
+    )
+
+
+def load_neighbors(input_dir: Path, rows: int, count: int) -> tuple[np.ndarray, np.ndarray]:
+    """load_knn_graph for an uploader: fails if the graph is missing or doesn't cover `rows` songs."""
+    graph = load_knn_graph(input_dir)
+    if graph is None:
+        raise ValueError(f"No {KNN_FILE} in {input_dir}; run knn_graph.py first")
+    if len(graph[0]) != rows:
+        raise ValueError(f"{input_dir / KNN_FILE} covers {len(graph[0])} rows, not {rows}; rebuild it")
+    if count > graph[0].shape[1]:
+        print(f"kNN graph has {graph[0].shape[1]} neighbors per song; attaching all of them")
+    return graph
+
+
+def neighbor_payload(
+    ids: np.ndarray,
+    scores: np.ndarray,
+    row: int,
+    point_ids: list,
+    limit: int | None = None,
+) -> dict:
+    """Payload fields for one point: its neighbors' point ids and similarities, best first."""
+    neighbors = np.asarray(ids[row][:limit])
+    similarity = np.asarray(scores[row][:limit], dtype=np.float32)
+    valid = neighbors >= 0
+    return {
+        "similar_ids": [point_ids[j] for j in neighbors[valid]],
+        "similar_scores": [round(float(s), 3) for s in similarity[valid]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute every song's top-k similar songs")
+    parser.add_argument("--input", "-i", type=Path, default=Path("./hiphop_embeddings"), help="Embedding directory")
+    parser.add_argument("--k", type=int, default=50, help="Neighbors per song")
+    parser.add_argument("--workers", type=int, default=max(1, min(4, os.cpu_count() or 1)), help="Processes")
+    parser.add_argument("--block-rows", type=int, default=2048, help="Songs per worker task")
+    parser.add_argument("--memory-mb", type=float, default=256, help="Score tile budget per worker")
+    parser.add_argument("--show", type=int, nargs="+", help="Print the stored neighbors of these rows and exit")
+    add_profile_args(parser)
+
+    args = parser.parse_args()
+
+    if args.show:
+        graph = load_knn_graph(args.input)
+        if graph is None:
+            print(f"No {KNN_FILE} in {args.input}; build it first")
+            return
+        ids, scores = graph
+        for row in args.show:
+            pairs = ", ".join(f"{j} ({s:.3f})" for j, s in zip(ids[row][:10], scores[row][:10]) if j >= 0)
+            print(f"Row {row}: {pairs}")
+        return
+
+    profiler = RunProfiler.from_args(args, "knn_graph")
+    started = time.perf_counter()
+    build_knn_graph(
+        args.input, k=args.k, workers=args.workers, block_rows=args.block_rows,
+        memory_mb=args.memory_mb, profiler=profiler,
+    )
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+    profiler.save(args.input)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Lyric Intelligence Pipeline - Lazy Imports
+
+pandas, sklearn, torch and friends cost seconds to import, which every
+script used to pay before argparse could even print --help. lazy_import()
+returns a module stand-in that performs the real import on first
+attribute access, so module-level aliases like `pd` stay cheap until a
+code path actually uses them.
+
+Named imports (`from sklearn.cluster import KMeans`) go inside the
+function that needs them instead, as the embedders already do for
+sentence_transformers and datasets. import_budget.py checks that --help
+stays clear of all of these.
+"""
+
+from __future__ import annotations
+
+import importlib
+import sys
+import types
+
+# Modules that must never be imported just to parse arguments
+HEAVY_MODULES = (
+    "torch",
+    "sentence_transformers",
+    "transformers",
+    "datasets",
+    "sklearn",
+    "scipy",
+    "pandas",
+    "pyarrow",
+    "qdrant_client",
+)
+
+
+class _LazyModule(types.ModuleType):
+    """Placeholder that imports `name` the first time an attribute is read."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        if self.__dict__["_module"] is None:
+            self.__dict__["_module"] = importlib.import_module(self.__name__)
+        return self.__dict__["_module"]
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Module `name`, imported on first use (or right away if already loaded)."""
+    if name in sys.modules:
+        return sys.modules[name]
+    return _LazyModule(name)
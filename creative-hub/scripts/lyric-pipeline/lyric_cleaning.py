@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - Lyric Cleaning
+
+One cleaner shared by embed_lyrics.py and embed_hiphop_viral.py.
+Patterns are compiled once at import. Each song is scanned once for
+section markers, once for Genius header lines and once for whitespace,
+and the regex scans are skipped entirely when a cheap substring check
+shows they cannot match (most rows in our corpora have no markup left).
+
+    keep_line_breaks=False  ->  one line, for semantic embedding
+    keep_line_breaks=True   ->  one cleaned line per lyric line, for
+                                line-based viral feature extraction
+
+Usage:
+    python lyric_cleaning.py --benchmark
+    python lyric_cleaning.py --benchmark --corpus ./lyric_embeddings/metadata.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+# [Verse 1], [Chorus: X], (Hook), (yeah) - never spanning lines
+_SECTION_MARKERS = re.compile(r"\[[^\]\n]*\]|\([^)\n]*\)")
+
+# "123 Contributors..." and "<Title> Lyrics" header lines, newline included
+_HEADER_LINES = re.compile(r"^(?:\d+\s*Contributors.*|.*Lyrics)$\n?", re.MULTILINE)
+
+
+def clean_lyrics(lyrics: str, keep_line_breaks: bool = False) -> str:
+    """
+    Clean lyrics for embedding.
+    Removes section markers and metadata, normalizes whitespace.
+    """
+    if not lyrics:
+        return ""
+
+    cleaned = lyrics
+    if "[" in cleaned or "(" in cleaned:
+        cleaned = _SECTION_MARKERS.sub("", cleaned)
+    if "Lyrics" in cleaned or "Contributors" in cleaned:
+        cleaned = _HEADER_LINES.sub("", cleaned)
+    if cleaned.endswith(("Embed", "Embed\n")):  # Genius footer
+        cleaned = cleaned[:cleaned.rindex("Embed")]
+
+    if not keep_line_breaks:
+        return " ".join(cleaned.split())
+
+    lines = (" ".join(line.split()) for line in cleaned.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def clean_many(
+    lyrics_list: list[str],
+    keep_line_breaks: bool = False,
+    workers: int = 1,
+    chunksize: int = 256,
+) -> list[str]:
+    """Clean a batch of lyrics, optionally across a process pool."""
+    clean = partial(clean_lyrics, keep_line_breaks=keep_line_breaks)
+    if workers <= 1:
+        return [clean(lyrics) for lyrics in lyrics_list]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(clean, lyrics_list, chunksize=chunksize))
+
+
+def _multi_pass_clean(lyrics: str, keep_line_breaks: bool = False) -> str:
+    """The previous per-script cleaners (4-5 re.sub passes), kept for the benchmark."""
+    if not lyrics:
+        return ""
+
+    cleaned = re.sub(r"\[.*?\]", "", lyrics)
+    cleaned = re.sub(r"\(.*?\)", "", cleaned)
+    cleaned = re.sub(r"^\d+\s*Contributors.*$", "", cleaned, flags=re.MULTILINE)
+    cleaned = re.sub(r"^.*Lyrics$", "", cleaned, flags=re.MULTILINE)
+
+    if not keep_line_breaks:
+        return " ".join(cleaned.split()).strip()
+
+    cleaned = re.sub(r"Embed$", "", cleaned)
+    lines = [" ".join(line.split()) for line in cleaned.split("\n")]
+    cleaned = "\n".join(line for line in lines if line)
+    return cleaned.strip()
+
+
+def _load_corpus(path: Path) -> list[str]:
+    texts = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                song = json.loads(line)
+                texts.append(song.get("lyrics") or song.get("lyrics_clean") or song.get("lyrics_preview", ""))
+    return texts
+
+
+def _best_of(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(corpus: Path, repeats: int = 5, workers: int = 4) -> dict:
+    """
+    Time the old multi-pass cleaners against clean_lyrics/clean_many on a corpus.
+
+    Mismatches in single_line mode are expected for songs ending in the
+    Genius "Embed" footer, which only the hip hop cleaner used to strip.
+    """
+    texts = _load_corpus(corpus)
+    print(f"Corpus: {corpus} ({len(texts)} songs, {sum(map(len, texts)) / 1e6:.2f} MB)")
+
+    results = {"songs": len(texts)}
+    for keep in (False, True):
+        mode = "keep_line_breaks" if keep else "single_line"
+
+        old = _best_of(lambda: [_multi_pass_clean(t, keep) for t in texts], repeats)
+        new = _best_of(lambda: [clean_lyrics(t, keep) for t in texts], repeats)
+        mismatches = sum(
+            1 for t in texts if _multi_pass_clean(t, keep) != clean_lyrics(t, keep)
+        )
+
+        results[mode] = {
+            "multi_pass_sec": round(old, 4),
+            "clean_lyrics_sec": round(new, 4),
+            "speedup": round(old / new, 2),
+            "mismatches": mismatches,
+        }
+        print(f"\n{mode}:")
+        print(f"  multi-pass re.sub: {old * 1000:8.1f} ms")
+        print(f"  clean_lyrics:      {new * 1000:8.1f} ms  ({old / new:.2f}x)")
+        print(f"  output mismatches: {mismatches}")
+
+    start = time.perf_counter()
+    clean_many(texts, keep_line_breaks=True, workers=workers)
+    pooled = time.perf_counter() - start
+    results["clean_many"] = {"workers": workers, "sec": round(pooled, 4)}
+    print(f"\nclean_many(workers={workers}): {pooled * 1000:8.1f} ms (includes pool start-up)")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lyric cleaning micro-benchmark")
+    parser.add_argument("--benchmark", action="store_true", help="Compare against the multi-pass cleaners")
+    parser.add_argument(
+        "--corpus", type=Path,
+        default=Path(__file__).parent / "hiphop_embeddings" / "metadata.jsonl",
+        help="JSONL corpus (lyrics, lyrics_clean or lyrics_preview field)",
+    )
+    parser.add_argument("--repeats", type=int, default=5, help="Timing repeats (best is reported)")
+    parser.add_argument("--workers", type=int, default=4, help="Processes for the clean_many run")
+    parser.add_argument("--input", "-i", type=str, help="Lyrics text file or string to clean")
+    parser.add_argument("--keep-line-breaks", action="store_true", help="Keep one line per lyric line")
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.corpus, repeats=args.repeats, workers=args.workers)
+    elif args.input:
+        text = Path(args.input).read_text() if Path(args.input).exists() else args.input
+        print(clean_lyrics(text, keep_line_breaks=args.keep_line_breaks))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Lyric Intelligence Pipeline - Windowed Long-Lyric Embedding
+
+all-MiniLM-L6-v2 silently drops every token past its max sequence length,
+which for a long rap verse is most of the song. LyricWindows splits each
+cleaned lyric into overlapping token windows, encodes the windows of all
+songs in one flat batched pass, and pools them back into one vector per
+song with segment reductions (np.add.reduceat) instead of a Python loop.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+POOLING_MODES = ("mean", "attention")
+
+
+class LyricWindows:
+    """Split -> flat encode -> pool, with truncation stats for stats.json."""
+
+    def __init__(
+        self,
+        model_name: str,
+        max_seq_length: int = 256,
+        overlap: int = 64,
+        pooling: str = "mean",
+        max_windows: int | None = None,
+    ):
+        if pooling not in POOLING_MODES:
+            raise ValueError(f"Unknown pooling {pooling!r}, expected one of {POOLING_MODES}")
+
+        from transformers import AutoTokenizer
+
+        repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        self.tokenizer = AutoTokenizer.from_pretrained(repo)
+        self.window_tokens = max_seq_length - 2  # room for [CLS] and [SEP]
+        if not 0 <= overlap < self.window_tokens:
+            raise ValueError(f"overlap must be in [0, {self.window_tokens})")
+        self.stride = self.window_tokens - overlap
+        self.overlap = overlap
+        self.pooling = pooling
+        self.max_windows = max_windows
+
+        self.songs = 0
+        self.windows = 0
+        self.truncated_before = 0
+        self.truncated_after = 0
+
+    def split(self, texts: list[str]) -> tuple[list[str], np.ndarray]:
+        """
+        Split texts into window texts.
+
+        Returns:
+            (window_texts, offsets) where song i owns windows offsets[i]:offsets[i + 1]
+        """
+        token_ids = self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+
+        window_texts = []
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        for i, (text, ids) in enumerate(zip(texts, token_ids)):
+            if len(ids) <= self.window_tokens:
+                window_texts.append(text)  # untouched, so short songs embed exactly as before
+            else:
+                self.truncated_before += 1
+                starts = list(range(0, len(ids) - self.overlap, self.stride))
+                if self.max_windows and len(starts) > self.max_windows:
+                    starts = starts[:self.max_windows]
+                    self.truncated_after += 1
+                window_texts.extend(
+                    self.tokenizer.batch_decode([ids[s:s + self.window_tokens] for s in starts])
+                )
+            offsets[i + 1] = len(window_texts)
+
+        self.songs += len(texts)
+        self.windows += len(window_texts)
+        return window_texts, offsets
+
+    def pool(self, window_vectors: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """Reduce each song's windows to one L2-normalized vector."""
+        starts = offsets[:-1]
+        counts = np.diff(offsets).astype(window_vectors.dtype)[:, None]
+        segment = np.repeat(np.arange(len(starts)), np.diff(offsets))
+
+        pooled = np.add.reduceat(window_vectors, starts, axis=0) / counts
+
+        if self.pooling == "attention":
+            # Windows that agree with the song's overall meaning get more weight
+            scores = np.einsum("ij,ij->i", window_vectors, pooled[segment])
+            scores /= np.sqrt(window_vectors.shape[1])
+            scores -= np.maximum.reduceat(scores, starts)[segment]
+            weights = np.exp(scores)
+            weights /= np.add.reduceat(weights, starts)[segment]
+            pooled = np.add.reduceat(window_vectors * weights[:, None], starts, axis=0)
+
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.maximum(norms, 1e-12)
+
+    def encode(self, model, texts: list[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        """Encode all windows of all songs in one pass, then pool per song."""
+        window_texts, offsets = self.split(texts)
+        print(f"Encoding {len(window_texts)} windows for {len(texts)} songs...")
+        window_vectors = model.encode(
+            window_texts,
+            batch_size=batch_size,
+            show_progress_bar=show_progress_bar,
+            convert_to_numpy=True,
+        )
+        return self.pool(np.asarray(window_vectors, dtype=np.float32), offsets)
+
+    def stats(self) -> dict:
+        return {
+            "pooling": self.pooling,
+            "window_tokens": self.window_tokens,
+            "overlap": self.overlap,
+            "songs": self.songs,
+            "windows": self.windows,
+            "truncated_before": self.truncated_before,
+            "truncated_after": self.truncated_after,
+        }
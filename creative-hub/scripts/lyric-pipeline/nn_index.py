@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - Local Nearest-Neighbor Index
+
+Cosine top-k search over an embedding directory without a running
+Qdrant, for offline analysis ("which songs sound like this one?").
+
+Two kinds of index, built from the same unit-normalized float32 rows:
+
+  exact  every query is scored against the whole corpus, one block of
+         rows at a time (bounded by memory_mb), keeping a running
+         top-k per query with argpartition. Recall is 1 by definition.
+  ivf    rows are bucketed by nearest K-means centroid (nlist ~ sqrt(n))
+         and stored contiguously per bucket. A query scans only the
+         nprobe buckets whose centroids are closest, so cost falls by
+         about nlist / nprobe at some loss of recall.
+
+Queries are answered in batches; IVF groups a batch by bucket so each
+bucket is one matrix product for all the queries that probe it.
+
+An index lives in its own directory (default <input>/nn_index):
+
+    index.json       kind, rows, dim, nlist, nprobe
+    vectors.npy      normalized float32 rows (IVF: in bucket order)
+    ids.npy          IVF only: embedding row of each stored vector
+    offsets.npy      IVF only: bucket b is vectors[offsets[b]:offsets[b + 1]]
+    centroids.npy    IVF only: (nlist, dim) float32
+
+Index files are written block by block and memory-mapped on load, so a
+corpus larger than RAM can be indexed and searched.
+
+Usage:
+    python nn_index.py --input ./lyric_embeddings --build --kind ivf
+    python nn_index.py --input ./lyric_embeddings --query 0 --top 10
+    python nn_index.py --benchmark --sizes 1000,100000,1000000
+    python nn_index.py --benchmark --input ./lyric_embeddings
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from embedding_store import EmbeddingMatrix, atomic_write_json
+
+INDEX_DIR = "nn_index"
+INDEX_FILE = "index.json"
+INDEX_KINDS = ("exact", "ivf")
+DEFAULT_NPROBE = 16
+
+
+def _rows(embeddings: np.ndarray | EmbeddingMatrix, start: int, stop: int) -> np.ndarray:
+    return np.asarray(embeddings[start:stop], dtype=np.float32)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length float32 rows (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _allocate(output_dir: Path | None, name: str, shape: tuple, dtype) -> np.ndarray:
+    """Array to fill while building: a writable .npy memmap when writing to disk."""
+    if output_dir is None:
+        return np.empty(shape, dtype=dtype)
+    return np.lib.format.open_memmap(output_dir / name, mode="w+", dtype=dtype, shape=shape)
+
+
+def _block_rows(queries: int, dim: int, memory_mb: float) -> int:
+    """
+    Corpus rows per block so one block's working set stays within memory_mb:
+    per score, float32 scores + their negation + argpartition's int64 index.
+    """
+    return max(1024, int(memory_mb * 1024 * 1024 / (16 * queries + 4 * dim)))
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k highest scores per row, unordered."""
+    if scores.shape[1] <= k:
+        return np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def _merge(best_scores: np.ndarray, best_rows: np.ndarray, scores: np.ndarray, rows: np.ndarray, k: int):
+    """Fold candidate (scores, rows) into the running per-query top-k."""
+    pick = _top_k(scores, k)
+    scores = np.concatenate([best_scores, np.take_along_axis(scores, pick, axis=1)], axis=1)
+    rows = np.concatenate([best_rows, np.take_along_axis(rows, pick, axis=1)], axis=1)
+    pick = _top_k(scores, k)
+    return np.take_along_axis(scores, pick, axis=1), np.take_along_axis(rows, pick, axis=1)
+
+
+def _sorted(scores: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+class ExactIndex:
+    """Brute-force cosine search over normalized rows, in blocks."""
+
+    kind = "exact"
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        exclude: np.ndarray | None = None,
+        query_batch: int = 1024,
+        memory_mb: float = 256,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows by cosine similarity for every query.
+
+        `exclude` gives one row per query to leave out (e.g. the query
+        song itself). Returns (rows int32, scores float32), each
+        (queries, k), best first; missing results are -1 / -inf.
+        """
+        queries = normalize(np.atleast_2d(queries))
+        rows_out = np.full((len(queries), k), -1, dtype=np.int32)
+        scores_out = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        for q0 in range(0, len(queries), query_batch):
+            batch = queries[q0:q0 + query_batch]
+            skip = None if exclude is None else np.asarray(exclude[q0:q0 + query_batch])
+            best_scores = scores_out[q0:q0 + len(batch)]
+            best_rows = rows_out[q0:q0 + len(batch)].astype(np.int64)
+            block = _block_rows(len(batch), self.dim, memory_mb)
+
+            for start in range(0, len(self), block):
+                stored = _rows(self.vectors, start, start + block)
+                scores = batch @ stored.T
+                if skip is not None:
+                    inside = (skip >= start) & (skip < start + len(stored))
+                    scores[np.flatnonzero(inside), skip[inside] - start] = -np.inf
+                rows = np.broadcast_to(np.arange(start, start + len(stored)), scores.shape)
+                best_scores, best_rows = _merge(best_scores, best_rows, scores, rows, k)
+
+            rows_out[q0:q0 + len(batch)], scores_out[q0:q0 + len(batch)] = _sorted(best_scores, best_rows)
+
+        rows_out[~np.isfinite(scores_out)] = -1
+        return rows_out, scores_out
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        return {"vectors.npy": self.vectors}
+
+    def config(self) -> dict:
+        return {}
+
+
+class IVFIndex:
+    """Inverted-file index: rows grouped by nearest centroid, nprobe buckets scanned per query."""
+
+    kind = "ivf"
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        ids: np.ndarray,
+        offsets: np.ndarray,
+        centroids: np.ndarray,
+        nprobe: int = DEFAULT_NPROBE,
+    ):
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self.nprobe = nprobe
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def probe(self, queries: np.ndarray, nprobe: int) -> np.ndarray:
+        """(queries, nprobe) buckets whose centroids are nearest each normalized query."""
+        distances = self.centroid_norms - 2 * queries @ self.centroids.T
+        return _top_k(-distances, min(nprobe, self.nlist))
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        exclude: np.ndarray | None = None,
+        query_batch: int = 4096,
+        nprobe: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k, same contract as ExactIndex.search; `nprobe` overrides the index default."""
+        queries = normalize(np.atleast_2d(queries))
+        nprobe = nprobe or self.nprobe
+        rows_out = np.full((len(queries), k), -1, dtype=np.int32)
+        scores_out = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        for q0 in range(0, len(queries), query_batch):
+            batch = queries[q0:q0 + query_batch]
+            skip = None if exclude is None else np.asarray(exclude[q0:q0 + query_batch])
+            best_scores = scores_out[q0:q0 + len(batch)].copy()
+            best_rows = rows_out[q0:q0 + len(batch)].astype(np.int64)
+
+            # (query, bucket) pairs grouped by bucket: one product per bucket
+            probes = self.probe(batch, nprobe)
+            pair_query = np.repeat(np.arange(len(batch)), probes.shape[1])
+            pair_bucket = probes.ravel()
+            order = np.argsort(pair_bucket, kind="stable")
+            pair_query, pair_bucket = pair_query[order], pair_bucket[order]
+            buckets, starts = np.unique(pair_bucket, return_index=True)
+            ends = np.append(starts[1:], len(pair_bucket))
+
+            for bucket, lo, hi in zip(buckets, starts, ends):
+                start, stop = self.offsets[bucket], self.offsets[bucket + 1]
+                if start == stop:
+                    continue
+                members = pair_query[lo:hi]
+                scores = batch[members] @ _rows(self.vectors, start, stop).T
+                rows = np.broadcast_to(np.asarray(self.ids[start:stop], dtype=np.int64), scores.shape)
+                if skip is not None:
+                    scores[rows == skip[members, None]] = -np.inf
+                best_scores[members], best_rows[members] = _merge(
+                    best_scores[members], best_rows[members], scores, rows, k
+                )
+
+            rows_out[q0:q0 + len(batch)], scores_out[q0:q0 + len(batch)] = _sorted(best_scores, best_rows)
+
+        rows_out[~np.isfinite(scores_out)] = -1
+        return rows_out, scores_out
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        return {
+            "vectors.npy": self.vectors,
+            "ids.npy": self.ids,
+            "offsets.npy": self.offsets,
+            "centroids.npy": self.centroids,
+        }
+
+    def config(self) -> dict:
+        return {"nlist": self.nlist, "nprobe": self.nprobe}
+
+
+def _write_normalized(embeddings: np.ndarray | EmbeddingMatrix, vectors: np.ndarray, batch_rows: int):
+    for start in range(0, len(embeddings), batch_rows):
+        vectors[start:start + batch_rows] = normalize(_rows(embeddings, start, start + batch_rows))
+
+
+def build_index(
+    embeddings: np.ndarray | EmbeddingMatrix,
+    kind: str = "exact",
+    output_dir: Path | None = None,
+    nlist: int | None = None,
+    nprobe: int = DEFAULT_NPROBE,
+    train_size: int | None = None,
+    train_iters: int = 10,
+    batch_rows: int = 65536,
+    seed: int = 42,
+) -> ExactIndex | IVFIndex:
+    """
+    Build an index over `embeddings` (array or memory-mapped EmbeddingMatrix).
+
+    With `output_dir` the index files are written there as they are
+    built and the returned index reads them memory-mapped; otherwise it
+    is built in memory (save() it later). IVF trains nlist (default
+    sqrt(n)) centroids on `train_size` (default 64 x nlist) random rows
+    with `train_iters` Lloyd iterations from randomly chosen rows, then
+    assigns every row. (MiniBatchKMeans and k-means++ seeding leave
+    buckets far more uneven here, and an oversized bucket is scanned
+    by every query that probes it.)
+    """
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index kind {kind!r}; expected one of {', '.join(INDEX_KINDS)}")
+    n, dim = embeddings.shape
+    if output_dir is not None:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    if kind == "exact":
+        vectors = _allocate(output_dir, "vectors.npy", (n, dim), np.float32)
+        _write_normalized(embeddings, vectors, batch_rows)
+        index = ExactIndex(vectors)
+    else:
+        from sklearn.cluster import KMeans
+
+        from cluster_lyrics import assign_clusters
+
+        normalized = _allocate(output_dir, "vectors.tmp.npy", (n, dim), np.float32)
+        _write_normalized(embeddings, normalized, batch_rows)
+
+        nlist = min(n, nlist or max(1, int(round(np.sqrt(n)))))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(n, size=min(n, train_size or 64 * nlist), replace=False))
+        kmeans = KMeans(n_clusters=nlist, init="random", n_init=1, max_iter=train_iters, random_state=seed)
+        centroids = kmeans.fit(normalized[sample]).cluster_centers_.astype(np.float32)
+        buckets = assign_clusters(normalized, centroids, batch_rows=batch_rows)
+        ids = np.argsort(buckets, kind="stable").astype(np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(buckets, minlength=nlist))
+
+        vectors = _allocate(output_dir, "vectors.npy", (n, dim), np.float32)
+        for start in range(0, n, batch_rows):
+            vectors[start:start + batch_rows] = normalized[ids[start:start + batch_rows]]
+        del normalized
+        if output_dir is not None:
+            (output_dir / "vectors.tmp.npy").unlink()
+        index = IVFIndex(vectors, ids, offsets, centroids, nprobe=nprobe)
+
+    if output_dir is not None:
+        save_index(index, output_dir)
+        index = load_index(output_dir)
+    return index
+
+
+def save_index(index: ExactIndex | IVFIndex, output_dir: Path):
+    """Write the index arrays (unless already there, memory-mapped) and index.json."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for name, array in index.arrays().items():
+        if isinstance(array, np.memmap):
+            array.flush()
+            if Path(array.filename).resolve() == (output_dir / name).resolve():
+                continue
+        np.save(output_dir / name, np.asarray(array))
+    atomic_write_json(output_dir / INDEX_FILE, {
+        "kind": index.kind,
+        "rows": len(index),
+        "dim": index.dim,
+        "metric": "cosine",
+        **index.config(),
+    })
+
+
+def load_index(index_dir: Path, mmap: bool = True) -> ExactIndex | IVFIndex:
+    """Open an index written by build_index / save_index."""
+    index_dir = Path(index_dir)
+    with open(index_dir / INDEX_FILE, "r", encoding="utf-8") as f:
+        info = json.load(f)
+    mode = "r" if mmap else None
+    vectors = np.load(index_dir / "vectors.npy", mmap_mode=mode)
+    if info["kind"] == "exact":
+        return ExactIndex(vectors)
+    return IVFIndex(
+        vectors,
+        np.load(index_dir / "ids.npy"),
+        np.load(index_dir / "offsets.npy"),
+        np.load(index_dir / "centroids.npy"),
+        nprobe=info.get("nprobe", DEFAULT_NPROBE),
+    )
+
+
+def recall(approx_rows: np.ndarray, exact_rows: np.ndarray) -> float:
+    """Mean fraction of each exact top-k found in the approximate top-k."""
+    k = exact_rows.shape[1]
+    hits = sum(len(np.intersect1d(a[a >= 0], e[e >= 0])) for a, e in zip(approx_rows, exact_rows))
+    return hits / (len(exact_rows) * k)
+
+
+def synthetic_embeddings(path: Path, n: int, dim: int = 384, centers: int | None = None,
+                         spread: float = 1.0, seed: int = 42, batch_rows: int = 65536) -> np.ndarray:
+    """
+    Write n clustered random vectors to `path` (.npy) and return them memory-mapped.
+
+    Each row is a random center plus Gaussian noise of `spread` times
+    the center's scale, so neighborhoods are uneven, as in real lyrics.
+    """
+    rng = np.random.default_rng(seed)
+    centers = centers or max(10, n // 100)
+    means = rng.standard_normal((centers, dim)).astype(np.float32)
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(n, dim))
+    for start in range(0, n, batch_rows):
+        size = min(batch_rows, n - start)
+        noise = rng.standard_normal((size, dim), dtype=np.float32) * spread
+        out[start:start + size] = means[rng.integers(0, centers, size)] + noise
+    out.flush()
+    return np.load(path, mmap_mode="r")
+
+
+def benchmark_index(embeddings: np.ndarray | EmbeddingMatrix, work_dir: Path, queries: int = 1000,
+                    k: int = 10, nprobes: tuple[int, ...] = (1, 4, 16, 64), seed: int = 42) -> dict:
+    """Build both kinds over `embeddings` and report build time, QPS and IVF recall@k vs exact."""
+    n = len(embeddings)
+    rng = np.random.default_rng(seed)
+    query_rows = np.sort(rng.choice(n, size=min(queries, n), replace=False))
+    query_vectors = np.stack([_rows(embeddings, r, r + 1)[0] for r in query_rows])
+
+    result = {"rows": n, "dim": embeddings.shape[1], "queries": len(query_rows), "k": k}
+    indexes = {}
+    for kind in INDEX_KINDS:
+        start = time.perf_counter()
+        indexes[kind] = build_index(embeddings, kind, output_dir=work_dir / kind, seed=seed)
+        result[f"{kind}_build_sec"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    exact_rows, _ = indexes["exact"].search(query_vectors, k, exclude=query_rows)
+    exact_sec = time.perf_counter() - start
+    result["exact_qps"] = round(len(query_rows) / exact_sec, 1)
+    print(f"  {n:>9} rows  exact    build {result['exact_build_sec']:7.2f}s  "
+          f"{result['exact_qps']:9.1f} q/s  recall 1.0000")
+
+    result["ivf_nlist"] = indexes["ivf"].nlist
+    result["ivf"] = []
+    # Untimed pass so every nprobe is measured with the bucket pages already mapped in
+    indexes["ivf"].search(query_vectors, k, nprobe=max(nprobes))
+    for nprobe in nprobes:
+        if nprobe > indexes["ivf"].nlist:
+            continue
+        start = time.perf_counter()
+        rows, _ = indexes["ivf"].search(query_vectors, k, exclude=query_rows, nprobe=nprobe)
+        seconds = time.perf_counter() - start
+        entry = {
+            "nprobe": nprobe,
+            "qps": round(len(query_rows) / seconds, 1),
+            "speedup": round(exact_sec / seconds, 2),
+            f"recall@{k}": round(recall(rows, exact_rows), 4),
+        }
+        result["ivf"].append(entry)
+        print(f"  {n:>9} rows  ivf {nprobe:>4}/{indexes['ivf'].nlist:<5} build {result['ivf_build_sec']:6.2f}s  "
+              f"{entry['qps']:9.1f} q/s  recall {entry[f'recall@{k}']:.4f}  ({entry['speedup']:.1f}x exact)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local exact / IVF nearest-neighbor index over lyric embeddings")
+    parser.add_argument("--input", "-i", type=Path, help="Embedding directory")
+    parser.add_argument("--index-dir", type=Path, help=f"Index directory (default: <input>/{INDEX_DIR})")
+    parser.add_argument("--build", action="store_true", help="Build the index")
+    parser.add_argument("--kind", choices=INDEX_KINDS, default="exact", help="Index kind for --build")
+    parser.add_argument("--nlist", type=int, help="IVF buckets (default: sqrt(rows))")
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE, help="IVF buckets scanned per query")
+    parser.add_argument("--query", type=int, nargs="+", help="Embedding rows to find neighbors for")
+    parser.add_argument("--top", type=int, default=10, help="Neighbors per query")
+    parser.add_argument("--benchmark", action="store_true", help="Recall / QPS of IVF vs exact")
+    parser.add_argument("--sizes", type=str, default="1000,100000,1000000", help="Synthetic corpus sizes for --benchmark")
+    parser.add_argument("--queries", type=int, default=1000, help="Queries per benchmark size")
+    parser.add_argument("--work-dir", type=Path, help="Scratch directory for benchmark data (default: a temp dir)")
+    parser.add_argument("--output", "-o", type=Path, help="Write benchmark results as JSON")
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        from embedding_store import open_embeddings
+
+        with tempfile.TemporaryDirectory(dir=args.work_dir) as scratch:
+            scratch = Path(scratch)
+            results = []
+            if args.input:
+                print(f"Benchmarking on {args.input}:")
+                results.append(benchmark_index(open_embeddings(args.input), scratch, queries=args.queries, k=args.top))
+            else:
+                for size in (int(s) for s in args.sizes.split(",")):
+                    print(f"Benchmarking on {size} synthetic vectors:")
+                    embeddings = synthetic_embeddings(scratch / "embeddings.npy", size)
+                    results.append(benchmark_index(embeddings, scratch / str(size), queries=args.queries, k=args.top))
+                    del embeddings
+        if args.output:
+            atomic_write_json(args.output, {"results": results})
+            print(f"Saved: {args.output}")
+        return
+
+    if not args.input:
+        parser.error("--input is required unless --benchmark is given")
+    index_dir = args.index_dir or args.input / INDEX_DIR
+
+    if args.build:
+        from embedding_store import open_embeddings
+
+        embeddings = open_embeddings(args.input)
+        start = time.perf_counter()
+        index = build_index(embeddings, args.kind, output_dir=index_dir, nlist=args.nlist, nprobe=args.nprobe)
+        detail = f", {index.nlist} buckets" if index.kind == "ivf" else ""
+        print(f"Built {index.kind} index over {len(index)} x {index.dim} in {time.perf_counter() - start:.2f}s{detail}")
+        print(f"Saved: {index_dir}")
+
+    if args.query:
+        from embedding_store import load_metadata, open_embeddings
+
+        index = load_index(index_dir)
+        embeddings = open_embeddings(args.input)
+        query_rows = np.array(args.query)
+        queries = np.stack([embeddings[int(r)] for r in query_rows])
+        rows, scores = index.search(queries, args.top, exclude=query_rows)
+        songs = load_metadata(args.input, columns=["title", "artist"])
+        for query, neighbors, similarity in zip(query_rows, rows, scores):
+            song = songs[query]
+            print(f"\n{song.get('title', 'Unknown')} by {song.get('artist', 'Unknown')} (row {query}):")
+            for row, score in zip(neighbors, similarity):
+                if row >= 0:
+                    print(f"  - {songs[row].get('title', 'Unknown')} by {songs[row].get('artist', 'Unknown')} "
+                          f"(score: {score:.3f})")
+
+    if not (args.build or args.query):
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
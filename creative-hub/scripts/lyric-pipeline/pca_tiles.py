@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - PCA Projection Tiles
+
+2-D PCA coordinates for the cluster visualizer, sized for corpora far
+beyond what a JSON float list can carry.
+
+The projection streams over (memory-mapped) embeddings in row batches:
+
+  covariance   one pass accumulates the mean and the dim x dim scatter
+               matrix in float64, and its top eigenvectors are the exact
+               principal axes (default; 384 x 384 is tiny)
+  incremental  sklearn IncrementalPCA, one partial_fit per batch
+
+Coordinates are quantized to uint16 over the data's bounding box and
+cut into a level-of-detail quadtree. Points are visited in a fixed
+random order; at level z (2^z x 2^z tiles) each tile keeps up to
+--tile-points of the points no coarser level took, and the last level
+takes the rest. Each point is stored exactly once, so a viewer at zoom z
+loads only the tiles at levels 0..z that overlap the viewport and sees an
+even sample that gets denser as it zooms in.
+
+    pca_tiles/
+        manifest.json      bounds, levels, dtypes, {"z/x/y": point count}
+        {z}/{x}/{y}.bin    row uint32[n] | x uint16[n] | y uint16[n] | cluster uint8/uint16[n]
+
+Tile x/y are global quantized coordinates: tile (z, tx, ty) holds points
+with x >> (16 - z) == tx and y >> (16 - z) == ty. Corpora up to
+JSON_MAX_POINTS songs still get pca_visualization.json as before.
+
+Usage:
+    python pca_tiles.py --input ./lyric_embeddings
+    python pca_tiles.py --input ./big_embeddings --method incremental --tile-points 8192
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from embedding_store import EmbeddingMatrix, atomic_write_json
+
+TILE_DIR = "pca_tiles"
+MANIFEST_FILE = "manifest.json"
+JSON_FILE = "pca_visualization.json"
+JSON_MAX_POINTS = 50_000
+PCA_METHODS = ("covariance", "incremental")
+COORD_BITS = 16
+MAX_LEVEL = COORD_BITS
+
+
+def _rows(embeddings: np.ndarray | EmbeddingMatrix, start: int, stop: int) -> np.ndarray:
+    return np.asarray(embeddings[start:stop], dtype=np.float32)
+
+
+def fit_pca(
+    embeddings: np.ndarray | EmbeddingMatrix,
+    method: str = "covariance",
+    n_components: int = 2,
+    batch_rows: int = 65536,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Principal axes of `embeddings`, one batch of rows in memory at a time.
+
+    Components are sign-normalized like sklearn's PCA (largest loading
+    positive), so plots keep their orientation between runs.
+
+    Returns:
+        (mean, components (n_components, dim), explained variance ratio)
+    """
+    if method not in PCA_METHODS:
+        raise ValueError(f"Unknown PCA method {method!r}; expected one of {', '.join(PCA_METHODS)}")
+    n, dim = embeddings.shape
+
+    if method == "incremental":
+        from sklearn.decomposition import IncrementalPCA
+
+        pca = IncrementalPCA(n_components=n_components)
+        # partial_fit needs n_components rows; fold a short tail into the previous batch
+        starts = list(range(0, n, batch_rows))
+        if len(starts) > 1 and n - starts[-1] < n_components:
+            starts.pop()
+        for i, start in enumerate(starts):
+            stop = starts[i + 1] if i + 1 < len(starts) else n
+            pca.partial_fit(_rows(embeddings, start, stop))
+        mean, components, ratio = pca.mean_, pca.components_, pca.explained_variance_ratio_
+    else:
+        total = np.zeros(dim)
+        scatter = np.zeros((dim, dim))
+        for start in range(0, n, batch_rows):
+            batch = _rows(embeddings, start, start + batch_rows).astype(np.float64)
+            total += batch.sum(axis=0)
+            scatter += batch.T @ batch
+        mean = total / n
+        covariance = (scatter - n * np.outer(mean, mean)) / max(n - 1, 1)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        top = np.argsort(eigenvalues)[::-1][:n_components]
+        components = eigenvectors[:, top].T
+        ratio = eigenvalues[top] / max(eigenvalues.clip(min=0).sum(), 1e-12)
+
+    components = np.asarray(components, dtype=np.float64)
+    signs = np.sign(components[np.arange(len(components)), np.abs(components).argmax(axis=1)])
+    return mean.astype(np.float64), components * signs[:, None], np.asarray(ratio, dtype=np.float64)
+
+
+def project(
+    embeddings: np.ndarray | EmbeddingMatrix,
+    mean: np.ndarray,
+    components: np.ndarray,
+    batch_rows: int = 65536,
+) -> np.ndarray:
+    """(n, n_components) float32 coordinates, batch by batch."""
+    coords = np.empty((len(embeddings), len(components)), dtype=np.float32)
+    components = components.astype(np.float32)
+    offset = (mean @ components.T.astype(np.float64)).astype(np.float32)
+    for start in range(0, len(embeddings), batch_rows):
+        batch = _rows(embeddings, start, start + batch_rows)
+        coords[start:start + len(batch)] = batch @ components.T - offset
+    return coords
+
+
+def quantize_coords(coords: np.ndarray) -> tuple[np.ndarray, list[list[float]]]:
+    """uint16 (n, 2) grid coordinates plus the [min, max] bounds of each axis."""
+    low = coords.min(axis=0).astype(np.float64)
+    high = coords.max(axis=0).astype(np.float64)
+    scale = (2 ** COORD_BITS - 1) / np.maximum(high - low, 1e-12)
+    grid = np.rint((coords - low) * scale).astype(np.uint16)
+    return grid, [[float(lo), float(hi)] for lo, hi in zip(low, high)]
+
+
+def build_levels(grid: np.ndarray, tile_points: int = 4096, seed: int = 42) -> list[tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Assign every point to one quadtree tile.
+
+    Returns:
+        per level: (level, tile key (tx << level | ty) per point, rows), grouped by tile
+    """
+    x = grid[:, 0].astype(np.int64)
+    y = grid[:, 1].astype(np.int64)
+    priority = np.random.default_rng(seed).permutation(len(grid))  # priority[p] = row visited p-th
+    remaining = np.arange(len(grid))  # positions in `priority`, ascending
+    levels = []
+    for level in range(MAX_LEVEL + 1):
+        if not len(remaining):
+            break
+        rows = priority[remaining]
+        shift = COORD_BITS - level
+        keys = ((x[rows] >> shift) << level) | (y[rows] >> shift)
+        order = np.argsort(keys, kind="stable")  # grouped by tile, priority order within one
+        keys, positions = keys[order], remaining[order]
+        if level < MAX_LEVEL:
+            _, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+            taken = np.arange(len(keys)) - np.repeat(starts, counts) < tile_points
+        else:
+            taken = np.ones(len(keys), dtype=bool)
+        levels.append((level, keys[taken], priority[positions[taken]]))
+        remaining = np.sort(positions[~taken])
+    return levels
+
+
+def tile_path(tile_dir: Path, level: int, tx: int, ty: int) -> Path:
+    return tile_dir / str(level) / str(tx) / f"{ty}.bin"
+
+
+def write_tiles(
+    output_dir: Path,
+    grid: np.ndarray,
+    labels: np.ndarray,
+    bounds: list[list[float]],
+    explained_variance: np.ndarray,
+    tile_points: int = 4096,
+    seed: int = 42,
+) -> dict:
+    """Write pca_tiles/ (replacing an older one) and return its manifest."""
+    tile_dir = output_dir / TILE_DIR
+    if tile_dir.exists():
+        shutil.rmtree(tile_dir)
+    n_clusters = int(labels.max()) + 1 if len(labels) else 0
+    cluster_dtype = np.uint8 if n_clusters <= 256 else np.uint16
+
+    tiles = {}
+    levels = build_levels(grid, tile_points, seed)
+    for level, keys, rows in levels:
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        for chunk_keys, chunk_rows in zip(np.split(keys, boundaries), np.split(rows, boundaries)):
+            tx, ty = int(chunk_keys[0]) >> level, int(chunk_keys[0]) & ((1 << level) - 1)
+            path = tile_path(tile_dir, level, tx, ty)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"".join([
+                chunk_rows.astype(np.uint32).tobytes(),
+                grid[chunk_rows, 0].tobytes(),
+                grid[chunk_rows, 1].tobytes(),
+                labels[chunk_rows].astype(cluster_dtype).tobytes(),
+            ]))
+            tiles[f"{level}/{tx}/{ty}"] = len(chunk_rows)
+
+    manifest = {
+        "format": 1,
+        "points": int(len(grid)),
+        "levels": len(levels),
+        "tile_points": tile_points,
+        "coord_bits": COORD_BITS,
+        "bounds": {"x": bounds[0], "y": bounds[1]},
+        "explained_variance": [round(float(v), 6) for v in explained_variance],
+        "n_clusters": n_clusters,
+        "layout": ["row:uint32", "x:uint16", "y:uint16", f"cluster:{np.dtype(cluster_dtype).name}"],
+        "tiles": tiles,
+    }
+    atomic_write_json(tile_dir / MANIFEST_FILE, manifest)
+    return manifest
+
+
+def read_tile(tile_dir: Path, level: int, tx: int, ty: int, manifest: dict) -> dict[str, np.ndarray]:
+    """One tile's columns (row, x, y, cluster), as the front-end reads them."""
+    count = manifest["tiles"][f"{level}/{tx}/{ty}"]
+    data = tile_path(tile_dir, level, tx, ty).read_bytes()
+    columns, offset = {}, 0
+    for field in manifest["layout"]:
+        name, dtype = field.split(":")
+        columns[name] = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += count * np.dtype(dtype).itemsize
+    return columns
+
+
+def write_projection(
+    embeddings: np.ndarray | EmbeddingMatrix,
+    labels: np.ndarray,
+    output_dir: Path,
+    method: str = "covariance",
+    tile_points: int = 4096,
+    batch_rows: int = 65536,
+) -> dict:
+    """Fit the 2-D PCA, write the tile pyramid and, for small corpora, pca_visualization.json."""
+    labels = np.asarray(labels)
+    mean, components, ratio = fit_pca(embeddings, method, batch_rows=batch_rows)
+    coords = project(embeddings, mean, components, batch_rows)
+    grid, bounds = quantize_coords(coords)
+    manifest = write_tiles(output_dir, grid, labels, bounds, ratio, tile_points)
+
+    size = sum(p.stat().st_size for p in (output_dir / TILE_DIR).rglob("*.bin"))
+    print(f"Saved PCA tiles: {output_dir / TILE_DIR} ({len(manifest['tiles'])} tiles, "
+          f"{manifest['levels']} levels, {size / 1e6:.2f} MB; explained variance {ratio.round(4).tolist()})")
+
+    if len(coords) <= JSON_MAX_POINTS:
+        viz_path = output_dir / JSON_FILE
+        with open(viz_path, "w") as f:
+            json.dump({
+                "x": coords[:, 0].tolist(),
+                "y": coords[:, 1].tolist(),
+                "cluster": labels.tolist(),
+                "explained_variance": ratio.tolist(),
+            }, f)
+        print(f"Saved PCA data: {viz_path}")
+    elif (output_dir / JSON_FILE).exists():
+        # Don't leave an older, smaller corpus's points next to the new tiles
+        (output_dir / JSON_FILE).unlink()
+        print(f"Removed stale {output_dir / JSON_FILE} ({len(coords)} points > {JSON_MAX_POINTS}; use the tiles)")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write PCA projection tiles for the cluster visualizer")
+    parser.add_argument("--input", "-i", type=Path, default=Path("./lyric_embeddings"), help="Embedding directory")
+    parser.add_argument("--output", "-o", type=Path, help="Output directory (defaults to input)")
+    parser.add_argument("--labels", type=Path, help="Cluster labels .npy (default: <input>/cluster_labels.npy)")
+    parser.add_argument("--method", choices=PCA_METHODS, default="covariance", help="Streaming PCA method")
+    parser.add_argument("--tile-points", type=int, default=4096, help="Points per tile at each level")
+    parser.add_argument("--batch-rows", type=int, default=65536, help="Embedding rows in memory at once")
+
+    args = parser.parse_args()
+
+    from embedding_store import open_embeddings
+
+    embeddings = open_embeddings(args.input)
+    labels_path = args.labels or args.input / "cluster_labels.npy"
+    if labels_path.exists():
+        labels = np.load(labels_path)
+    else:
+        print(f"No {labels_path}; writing every point as cluster 0")
+        labels = np.zeros(len(embeddings), dtype=np.int32)
+    if len(labels) != len(embeddings):
+        raise ValueError(f"{labels_path} has {len(labels)} labels for {len(embeddings)} embeddings")
+
+    output_dir = args.output or args.input
+    output_dir.mkdir(parents=True, exist_ok=True)
+    write_projection(embeddings, labels, output_dir, args.method, args.tile_points, args.batch_rows)
+
+
+if __name__ == "__main__":
+    main()
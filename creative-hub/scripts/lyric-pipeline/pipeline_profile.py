@@ -0,0 +1,230 @@
+"""
+Lyric Intelligence Pipeline - Run Profiling
+
+Every script accepts --profile. RunProfiler times named stages (load,
+clean, features, encode, save, upload, ...) and records per stage:
+
+  - wall and CPU seconds (CPU includes worker processes once reaped)
+  - peak RSS of the process so far, in MB
+  - items processed and items/sec, when the stage knows its count
+
+Stage times are exclusive: a nested stage, or a source iterator wrapped
+with iterate(), is charged to its own name and not to the enclosing one,
+so the stage totals add up to the run instead of double counting.
+
+save() writes run_profile.json next to stats.json, one entry per script
+so embedding, clustering and uploading the same directory keep their own
+profiles. With --profile-pstats the whole run also executes under
+cProfile and run_profile_<script>.pstats is dumped alongside it (inspect
+with `python -m pstats run_profile_embed_lyrics.pstats`).
+
+Without --profile, scripts get NULL_PROFILER instead: same interface,
+stages and iterators pass straight through and save() writes nothing.
+Library functions take `profiler: RunProfiler | None` and treat None the
+same way.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, TypeVar
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+T = TypeVar("T")
+
+PROFILE_FILE = "run_profile.json"
+PSTATS_FILE = "run_profile_{command}.pstats"
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB (0.0 if unknown)."""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def cpu_seconds() -> float:
+    """User + system CPU of this process and its reaped children."""
+    if resource is None:
+        return time.process_time()
+    usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    return sum(u.ru_utime + u.ru_stime for u in usage)
+
+
+def add_profile_args(parser):
+    """Add --profile / --profile-pstats to a script's argument parser."""
+    parser.add_argument("--profile", action="store_true", help=f"Write per-stage timings to {PROFILE_FILE}")
+    parser.add_argument("--profile-pstats", action="store_true", help="Also run under cProfile and dump a .pstats file")
+
+
+class _Stage:
+    def __init__(self, profiler: RunProfiler, name: str, items: int | None):
+        self.profiler = profiler
+        self.name = name
+        self.items = items  # may be set inside the with-block once known
+        self.nested_wall = 0.0
+        self.nested_cpu = 0.0
+
+    def __enter__(self):
+        self.profiler._active.append(self)
+        self.wall = time.perf_counter()
+        self.cpu = cpu_seconds()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = cpu_seconds() - self.cpu
+        self.profiler._active.pop()
+        self.profiler._record(self.name, wall, cpu, self.items, self.nested_wall, self.nested_cpu)
+        return False
+
+
+class RunProfiler:
+    """Accumulate per-stage wall/CPU/RSS/throughput for one script run."""
+
+    def __init__(self, command: str, pstats: bool = False):
+        self.command = command
+        self.started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.stages: dict[str, dict] = {}
+        self._active: list[_Stage] = []
+        self._wall = time.perf_counter()
+        self._cpu = cpu_seconds()
+
+        self._cprofile = None
+        if pstats:
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    @classmethod
+    def from_args(cls, args, command: str) -> RunProfiler | _NullProfiler:
+        """A profiler if --profile or --profile-pstats was given, else NULL_PROFILER."""
+        if not (args.profile or args.profile_pstats):
+            return NULL_PROFILER
+        return cls(command, pstats=args.profile_pstats)
+
+    def stage(self, name: str, items: int | None = None) -> _Stage:
+        """Context manager timing one stage; repeated names accumulate."""
+        return _Stage(self, name, items)
+
+    def iterate(self, name: str, items: Iterable[T], size: Callable[[T], int] | None = None) -> Iterator[T]:
+        """
+        Yield from `items`, charging the time spent producing each one to `name`.
+
+        Each item counts once, or as size(item) items (e.g. len of a chunk).
+        """
+        iterator = iter(items)
+        while True:
+            # A stage per item, so iterators wrapped inside `items` are excluded too
+            with self.stage(name, items=0) as stage:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                stage.items = size(item) if size is not None else 1
+            yield item
+
+    def _record(self, name: str, wall: float, cpu: float, items: int | None,
+                nested_wall: float = 0.0, nested_cpu: float = 0.0):
+        if self._active:
+            self._active[-1].nested_wall += wall
+            self._active[-1].nested_cpu += cpu
+
+        stage = self.stages.setdefault(
+            name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "items": None, "calls": 0, "peak_rss_mb": 0.0}
+        )
+        stage["wall_seconds"] += wall - nested_wall
+        stage["cpu_seconds"] += cpu - nested_cpu
+        stage["calls"] += 1
+        stage["peak_rss_mb"] = peak_rss_mb()
+        if items is not None:
+            stage["items"] = (stage["items"] or 0) + items
+
+    def report(self) -> dict:
+        """Run totals plus one entry per stage, in first-seen order."""
+        wall = time.perf_counter() - self._wall
+        stages = {}
+        for name, stage in self.stages.items():
+            entry = {
+                "wall_seconds": round(stage["wall_seconds"], 4),
+                "cpu_seconds": round(stage["cpu_seconds"], 4),
+                "calls": stage["calls"],
+                "peak_rss_mb": round(stage["peak_rss_mb"], 1),
+            }
+            if stage["items"] is not None:
+                entry["items"] = stage["items"]
+                entry["items_per_sec"] = round(stage["items"] / stage["wall_seconds"], 1) if stage["wall_seconds"] > 0 else None
+            stages[name] = entry
+
+        return {
+            "command": self.command,
+            "started": self.started,
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(cpu_seconds() - self._cpu, 4),
+            "unstaged_seconds": round(wall - sum(s["wall_seconds"] for s in self.stages.values()), 4),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "stages": stages,
+        }
+
+    def save(self, output_dir: Path) -> dict:
+        """Add this run to output_dir/run_profile.json (plus .pstats) and print a summary."""
+        from embedding_store import atomic_write_json
+
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            pstats_path = output_dir / PSTATS_FILE.format(command=self.command)
+            self._cprofile.dump_stats(pstats_path)
+            print(f"Saved cProfile stats: {pstats_path}")
+
+        report = self.report()
+        profile_path = output_dir / PROFILE_FILE
+        profiles = json.loads(profile_path.read_text(encoding="utf-8")) if profile_path.exists() else {}
+        profiles[self.command] = report
+        atomic_write_json(profile_path, profiles)
+
+        print(f"\nRun profile ({report['wall_seconds']:.2f}s wall, peak RSS {report['peak_rss_mb']:.0f} MB):")
+        for name, stage in report["stages"].items():
+            rate = f"{stage['items_per_sec']:>10.1f}/s" if stage.get("items_per_sec") else ""
+            print(f"  {name:12} {stage['wall_seconds']:9.2f}s wall {stage['cpu_seconds']:9.2f}s cpu {rate}")
+        print(f"Saved run profile: {profile_path}")
+        return report
+
+
+class _NullStage:
+    items = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _NullProfiler:
+    """Stand-in used when profiling is off; stages and iterators pass straight through."""
+
+    def stage(self, name: str, items: int | None = None) -> _NullStage:
+        return _NullStage()
+
+    def iterate(self, name: str, items: Iterable[T], size: Callable[[T], int] | None = None) -> Iterable[T]:
+        return items
+
+    def save(self, output_dir: Path) -> None:
+        return None
+
+
+NULL_PROFILER = _NullProfiler()
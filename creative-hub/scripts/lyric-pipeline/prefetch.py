@@ -0,0 +1,110 @@
+"""
+Lyric Intelligence Pipeline - Prefetching Iterator
+
+Streaming Hugging Face datasets download and decode rows lazily, so a
+plain for-loop alternates between waiting on the network and encoding.
+prefetch() moves the source iterator onto a background thread that keeps
+a bounded buffer filled, in order, while the caller works on earlier rows.
+Order is preserved so --resume can still skip by count.
+
+pool_map() is the process-pool counterpart for CPU-bound stages: it keeps
+a bounded number of chunks in flight in worker processes while the
+caller consumes finished ones, again in input order.
+"""
+
+from __future__ import annotations
+
+import multiprocessing as mp
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def prefetch(items: Iterable[T], depth: int = 1024) -> Iterator[T]:
+    """
+    Iterate `items` on a reader thread, buffering up to `depth` ahead.
+
+    Errors raised by the source are re-raised in the caller. With
+    depth <= 0 the source is returned unchanged.
+    """
+    if depth <= 0:
+        yield from items
+        return
+
+    buffer: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # Give up if the consumer has gone away instead of blocking forever
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failed(e))
+            return
+        put(_DONE)
+
+    reader = threading.Thread(target=read, name="prefetch", daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failed):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+
+def pool_map(fn: Callable[[T], R], items: Iterable[T], workers: int, depth: int | None = None) -> Iterator[R]:
+    """
+    Ordered map of `fn` over `items` in `workers` processes.
+
+    At most `depth` (default 2 * workers) items are submitted ahead of the
+    consumer, so workers keep running while the caller handles earlier
+    results, and memory is bounded by depth rather than by len(items).
+    Workers are spawned, not forked: the caller may already hold a model
+    and its threads. With workers <= 1 everything runs inline.
+    """
+    if workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    depth = depth or 2 * workers
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(pool.submit(fn, item))
+                if len(pending) >= depth:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
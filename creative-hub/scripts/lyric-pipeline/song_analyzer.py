@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - Fused Song Analyzer
+
+extract_viral_features, cluster_lyrics.analyze_structural_features and
+theme_classifier.classify_lyrics each lower-case and split every lyric
+again, and each script re-reads the metadata to do it. This analyzer
+reads the lyrics once, tokenizes each song once into integer word ids,
+and computes all three from the same arrays:
+
+  - one song-scoped n-gram pass (embed_hiphop_viral.song_ngrams) gives
+    the hooks, the unique-word ratio and the 3-5-gram repetition score
+  - ad-lib / phonk / "!?" / theme keyword matches are worked out once
+    per distinct word, then summed per song with bincount
+  - multi-word theme keywords ("used to") are matched as id sequences
+    within a line
+
+Results match the per-script functions exactly (--benchmark checks).
+Everything is written under <input>/analysis/:
+
+    tokens_ids.npy, tokens_offsets.npy          ragged word ids per song
+    line_lengths.npy, line_offsets.npy          words per non-empty line
+    vocab.json                                  id -> word
+    structural.npy, theme_counts.npy, hooks.npy per-song arrays
+    features.npy, features_schema.json          viral features (viral_scorer)
+    analysis.json                               columns, row count, metadata hash
+
+The viral features are also copied to the top level for viral_scorer.py,
+but only when the directory has no features.npy yet and every song had
+full lyrics_clean; features from lyrics_preview would not reproduce the
+stored viral scores. cluster_lyrics.py and theme_classifier.py --corpus
+use these arrays instead of re-reading the lyrics when the metadata
+still hashes to the value recorded in analysis.json.
+
+Usage:
+    python song_analyzer.py --input ./lyric_embeddings
+    python song_analyzer.py --input ./lyric_embeddings --benchmark
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+from embed_hiphop_viral import ADLIBS, PHONK_MARKERS, hook_spans, song_ngrams
+from embedding_store import atomic_write_json, iter_metadata, metadata_fingerprint
+from pipeline_profile import NULL_PROFILER, RunProfiler, add_profile_args
+from theme_classifier import THEMES
+from viral_scorer import FEATURE_COLUMNS, FEATURES_FILE, save_features
+
+ANALYSIS_DIR = "analysis"
+SCHEMA_FILE = "analysis.json"
+ARRAY_FILES = {
+    "token_ids": "tokens_ids.npy",
+    "token_offsets": "tokens_offsets.npy",
+    "line_lengths": "line_lengths.npy",
+    "line_offsets": "line_offsets.npy",
+    "structural": "structural.npy",
+    "theme_counts": "theme_counts.npy",
+    "hooks": "hooks.npy",
+}
+VOCAB_FILE = "vocab.json"
+
+# Per-song values behind analyze_structural_features (0 for songs with no words)
+STRUCTURAL_COLUMNS = ["word_count", "unique_ratio", "line_count", "repetition_score"]
+THEME_COLUMNS = list(THEMES)
+
+# Feature columns extract_viral_features reports as ints
+INT_FEATURES = {"hook_score", "first_line_punch", "exclamation_energy", "word_count", "line_count"}
+
+# Metadata field analyzed; hip hop directories only keep the preview
+TEXT_COLUMNS = ["lyrics_clean", "lyrics_preview"]
+
+
+def _keyword_patterns() -> tuple[list[tuple[int, str, re.Pattern]], list[tuple[int, list[str], re.Pattern]]]:
+    """(theme column, keyword, pattern) for one-word and multi-word theme keywords."""
+    single, multi = [], []
+    for t, config in enumerate(THEMES.values()):
+        for kw in config["keywords"]:
+            pattern = re.compile(rf"\b{re.escape(kw)}\b")
+            if " " in kw:
+                multi.append((t, kw.split(" "), pattern))
+            else:
+                single.append((t, kw, pattern))
+    return single, multi
+
+
+class SongAnalyzer:
+    """
+    Tokenize songs once and compute viral, structural and theme arrays.
+
+    Call add() with consecutive batches of lyrics; the vocabulary and the
+    per-word lookup tables grow as new words appear.
+    """
+
+    def __init__(self):
+        self.vocab: dict[str, int] = {}
+        self.words: list[str] = []
+        self._single, self._multi = _keyword_patterns()
+
+        # Per-word tables, extended for each batch's new words
+        self._adlib = np.zeros(0, dtype=np.int64)
+        self._phonk = np.zeros(0, dtype=np.int64)
+        self._marks = np.zeros(0, dtype=np.int64)
+        self._themes = np.zeros((0, len(THEMES)), dtype=np.int64)
+        self._ends_first = np.zeros((0, len(self._multi)), dtype=bool)
+        self._starts_last = np.zeros((0, len(self._multi)), dtype=bool)
+
+        self.songs = 0
+        self.tokens = 0
+        self.text_column = "lyrics_clean"  # analyze_dir: lyrics_preview if any song lacked lyrics_clean
+        self.lines = 0
+        self._parts: dict[str, list[np.ndarray]] = {name: [] for name in (*ARRAY_FILES, "features")}
+
+    def _extend_tables(self, start: int):
+        """Lookup rows for words added since vocab size `start`."""
+        new = self.words[start:]
+        if not new:
+            return
+        themes = np.zeros((len(new), len(THEMES)), dtype=np.int64)
+        ends_first = np.zeros((len(new), len(self._multi)), dtype=bool)
+        starts_last = np.zeros((len(new), len(self._multi)), dtype=bool)
+        # Keyword matches never cross whitespace, so each word is matched once, not once per use
+        for i, word in enumerate(new):
+            for t, kw, pattern in self._single:
+                if kw in word:
+                    themes[i, t] += len(pattern.findall(word))
+            for k, (_, parts, _) in enumerate(self._multi):
+                if word.endswith(parts[0]):
+                    ends_first[i, k] = re.search(rf"\b{re.escape(parts[0])}\Z", word) is not None
+                if word.startswith(parts[-1]):
+                    starts_last[i, k] = re.match(rf"{re.escape(parts[-1])}\b", word) is not None
+
+        self._adlib = np.concatenate([self._adlib, [w in ADLIBS for w in new]])
+        self._phonk = np.concatenate([self._phonk, [w in PHONK_MARKERS for w in new]])
+        self._marks = np.concatenate([self._marks, [w.count("!") + w.count("?") for w in new]])
+        self._themes = np.concatenate([self._themes, themes])
+        self._ends_first = np.concatenate([self._ends_first, ends_first])
+        self._starts_last = np.concatenate([self._starts_last, starts_last])
+
+    def _tokenize(self, texts: list[str]):
+        """Word ids, words per song, lines per song, words per non-empty line, and songs needing regex keyword matching."""
+        vocab, words = self.vocab, self.words
+        ids: list[int] = []
+        lengths, line_counts, line_lengths = [], [], []
+        irregular = set()  # songs with a line spaced other than by single spaces
+
+        for s, text in enumerate(texts):
+            before, lines = len(ids), 0
+            for line in text.lower().split("\n"):
+                line_words = line.split()
+                if not line_words:
+                    continue
+                for w in line_words:
+                    i = vocab.get(w)
+                    if i is None:
+                        i = vocab[w] = len(words)
+                        words.append(w)
+                    ids.append(i)
+                line_lengths.append(len(line_words))
+                lines += 1
+                if len(line_words) > 1 and " ".join(line_words) not in line:
+                    irregular.add(s)
+            lengths.append(len(ids) - before)
+            line_counts.append(lines)
+
+        return (
+            np.array(ids, dtype=np.int64),
+            np.array(lengths, dtype=np.int64),
+            np.array(line_counts, dtype=np.int64),
+            np.array(line_lengths, dtype=np.int64),
+            irregular,
+        )
+
+    def add(self, texts: list[str], profiler: RunProfiler | None = None) -> dict:
+        """
+        Analyze one batch of lyrics.
+
+        Returns:
+            the batch's rows: features (viral_scorer.FEATURE_COLUMNS,
+            unrounded), structural, theme_counts, hooks ((songs, 5, 2)
+            start-in-song / length, -1 padded) and hook_texts
+        """
+        profiler = profiler or NULL_PROFILER
+        n = len(texts)
+        with profiler.stage("tokenize", items=n):
+            start = len(self.words)
+            tokens, lengths, line_counts, line_lengths, irregular = self._tokenize(texts)
+            self._extend_tables(start)
+
+        with profiler.stage("analyze", items=n):
+            song = np.repeat(np.arange(n), lengths)
+            offsets = np.concatenate(([0], np.cumsum(lengths)))
+            line_offsets = np.concatenate(([0], np.cumsum(line_counts)))
+            line_song = np.repeat(np.arange(n), line_counts)
+
+            def per_song(weights: np.ndarray, owners: np.ndarray = song) -> np.ndarray:
+                return np.bincount(owners, weights=weights, minlength=n)
+
+            # One n-gram pass: unique words, hooks and 3-5-gram repetition
+            grams = list(song_ngrams(tokens, song, max(len(self.words), 1)))
+            unique = np.bincount(song[grams[0][2]], minlength=n)
+            hook_scores, spans = hook_spans(iter(grams), song, n)
+
+            distinct = np.zeros(n)
+            repeated = np.zeros(n)
+            for size, ids, first, _ in grams:
+                if size < 3:
+                    continue
+                m = len(ids)
+                # analyze_structural_features stops one n-gram short of the end of each song
+                valid = np.arange(m) - offsets[song[:m]] < lengths[song[:m]] - size
+                counts = np.bincount(ids[valid], minlength=len(first))
+                distinct += per_song(counts > 0, song[first])
+                repeated += per_song(counts > 1, song[first])
+            del grams
+
+            words = np.maximum(lengths, 1)
+            lines = np.maximum(line_counts, 1)
+            has_lines = line_counts > 0
+            first_line = np.zeros(n, dtype=np.int64)
+            first_line[has_lines] = line_lengths[line_offsets[:-1][has_lines]]
+
+            raw = {
+                "hook_score": hook_scores,
+                "repetition_ratio": 1 - unique / words,
+                "adlib_density": per_song(self._adlib[tokens]) / words,
+                "short_line_ratio": per_song(line_lengths <= 6, line_song) / lines,
+                "first_line_punch": (first_line <= 8).astype(np.int64),
+                "phonk_score": per_song(self._phonk[tokens]) / words,
+                "exclamation_energy": per_song(self._marks[tokens]),
+                "word_count": lengths,
+                "line_count": line_counts,
+            }
+            features = np.column_stack([raw[name] for name in FEATURE_COLUMNS]).astype(np.float64)
+            features[[not text for text in texts]] = 0  # extract_viral_features returns {} for empty lyrics
+
+            structural = np.column_stack([
+                lengths,
+                np.where(lengths > 0, unique / words, 0.0),
+                line_counts,
+                repeated / np.maximum(distinct, 1),
+            ]).astype(np.float64)
+
+            themes = np.column_stack([per_song(self._themes[tokens, t]) for t in range(len(THEMES))])
+            line_of = np.repeat(np.arange(len(line_lengths)), line_lengths)
+            regular = np.ones(len(line_lengths), dtype=bool)
+            for s in irregular:
+                regular[line_offsets[s]:line_offsets[s + 1]] = False
+            for k, (t, parts, _) in enumerate(self._multi):
+                m = len(tokens) - len(parts) + 1
+                if m <= 0:
+                    continue
+                hit = self._ends_first[tokens[:m], k] & self._starts_last[tokens[len(parts) - 1:], k]
+                for j, middle in enumerate(parts[1:-1], start=1):
+                    hit &= tokens[j:j + m] == self.vocab.get(middle, -1)
+                hit &= (line_of[:m] == line_of[len(parts) - 1:]) & regular[line_of[:m]]
+                themes[:, t] += per_song(hit, song[:m])
+            # Songs with irregular spacing: multi-word keywords by regex, one line at a time
+            for s in irregular:
+                for line in texts[s].lower().split("\n"):
+                    for t, _, pattern in self._multi:
+                        themes[s, t] += len(pattern.findall(line))
+            themes = themes.astype(np.int32)
+
+            hooks = np.full((n, 5, 2), -1, dtype=np.int32)
+            hook_texts = []
+            for s, song_spans in enumerate(spans):
+                hook_texts.append([" ".join(self.words[i] for i in tokens[a:a + size]) for a, size in song_spans])
+                for h, (a, size) in enumerate(song_spans):
+                    hooks[s, h] = (a - offsets[s], size)
+
+        self._parts["token_ids"].append(tokens.astype(np.int32))
+        self._parts["token_offsets"].append(offsets[1:] + self.tokens)
+        self._parts["line_lengths"].append(line_lengths.astype(np.int32))
+        self._parts["line_offsets"].append(line_offsets[1:] + self.lines)
+        self._parts["structural"].append(structural)
+        self._parts["theme_counts"].append(themes)
+        self._parts["hooks"].append(hooks)
+        self._parts["features"].append(features)
+        self.songs += n
+        self.tokens += len(tokens)
+        self.lines += len(line_lengths)
+
+        return {
+            "features": features,
+            "structural": structural,
+            "theme_counts": themes,
+            "hooks": hooks,
+            "hook_texts": hook_texts,
+        }
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """Everything added so far, concatenated (offsets start with 0)."""
+        out = {}
+        for name, parts in self._parts.items():
+            if name in ("token_offsets", "line_offsets"):
+                out[name] = np.concatenate([[0], *parts]).astype(np.int64)
+            elif parts:
+                out[name] = np.concatenate(parts)
+        out.setdefault("features", np.zeros((0, len(FEATURE_COLUMNS))))
+        return out
+
+    def save(self, output_dir: Path):
+        """Write analysis/ arrays, vocab and schema, plus features.npy for viral_scorer if safe."""
+        arrays = self.arrays()
+        output_dir = Path(output_dir)
+        analysis_dir = output_dir / ANALYSIS_DIR
+        analysis_dir.mkdir(parents=True, exist_ok=True)
+        for name, filename in ARRAY_FILES.items():
+            if name in arrays:
+                np.save(analysis_dir / filename, arrays[name])
+        with open(analysis_dir / VOCAB_FILE, "w", encoding="utf-8") as f:
+            json.dump(self.words, f, ensure_ascii=False)
+        atomic_write_json(analysis_dir / SCHEMA_FILE, {
+            "rows": self.songs,
+            "tokens": self.tokens,
+            "vocab_size": len(self.words),
+            "structural_columns": STRUCTURAL_COLUMNS,
+            "theme_columns": THEME_COLUMNS,
+            "hooks": "start within song, length (-1 padded), top 5",
+            "text_column": self.text_column,
+            "metadata_sha256": metadata_fingerprint(output_dir),
+        })
+        save_features(analysis_dir, arrays["features"])
+        if (output_dir / FEATURES_FILE).exists():
+            print(f"Keeping existing {output_dir / FEATURES_FILE}")
+        elif self.text_column != "lyrics_clean":
+            print(f"Not writing {output_dir / FEATURES_FILE}: features from {self.text_column} "
+                  f"would not match the stored viral scores")
+        else:
+            save_features(output_dir, arrays["features"])
+        print(f"Saved analysis: {analysis_dir} ({self.songs} songs, {self.tokens} tokens, {len(self.words)} words)")
+
+
+def _text(song: dict) -> str:
+    return song.get("lyrics_clean") or song.get("lyrics_preview") or ""
+
+
+def analyze_dir(input_dir: Path, batch_size: int = 2048, profiler: RunProfiler | None = None) -> SongAnalyzer:
+    """Stream an embedding directory's lyrics through a SongAnalyzer."""
+    profiler = profiler or NULL_PROFILER
+    analyzer = SongAnalyzer()
+    batches = iter_metadata(input_dir, columns=TEXT_COLUMNS, batch_size=batch_size)
+    for batch in profiler.iterate("load", batches, size=len):
+        if any(not song.get("lyrics_clean") and song.get("lyrics_preview") for song in batch):
+            analyzer.text_column = "lyrics_preview"
+        analyzer.add([_text(song) for song in batch], profiler=profiler)
+    return analyzer
+
+
+def load_analysis(input_dir: Path, rows: int | None = None) -> dict | None:
+    """
+    Memory-mapped analysis arrays for `input_dir`, or None when missing,
+    written from different metadata, or (given `rows`) written for a
+    different number of songs.
+    """
+    analysis_dir = Path(input_dir) / ANALYSIS_DIR
+    if not (analysis_dir / SCHEMA_FILE).exists():
+        return None
+    with open(analysis_dir / SCHEMA_FILE, "r", encoding="utf-8") as f:
+        schema = json.load(f)
+    if rows is not None and schema["rows"] != rows:
+        print(f"Ignoring {analysis_dir}: {schema['rows']} rows, metadata has {rows} (re-run song_analyzer.py)")
+        return None
+    if schema.get("metadata_sha256") != metadata_fingerprint(input_dir):
+        print(f"Ignoring {analysis_dir}: metadata changed since it was written (re-run song_analyzer.py)")
+        return None
+
+    arrays = {
+        name: np.load(analysis_dir / filename, mmap_mode="r")
+        for name, filename in ARRAY_FILES.items()
+        if (analysis_dir / filename).exists()
+    }
+    return {"schema": schema, **arrays}
+
+
+def load_vocab(input_dir: Path) -> list[str]:
+    """Word for each token id."""
+    with open(Path(input_dir) / ANALYSIS_DIR / VOCAB_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def benchmark(input_dir: Path, repeats: int = 3) -> dict:
+    """Time the three separate passes against the fused one and count mismatches."""
+    from cluster_lyrics import analyze_structural_features
+    from embed_hiphop_viral import _viral_features, extract_viral_features_batch
+    from embedding_store import load_metadata
+    from theme_classifier import classify_lyrics, theme_scores
+
+    texts = [_text(song) for song in load_metadata(input_dir, columns=TEXT_COLUMNS)]
+    songs = [{"lyrics_clean": t} for t in texts]
+    print(f"Corpus: {input_dir} ({len(texts)} songs)")
+
+    def best_of(fn) -> float:
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    each_song = np.arange(len(texts))
+    timings = {
+        "viral_sec": best_of(lambda: extract_viral_features_batch(texts)),
+        "structural_sec": best_of(lambda: analyze_structural_features(songs, each_song)),
+        "themes_sec": best_of(lambda: [classify_lyrics(t) for t in texts]),
+        "fused_sec": best_of(lambda: SongAnalyzer().add(texts)),
+    }
+    separate = timings["viral_sec"] + timings["structural_sec"] + timings["themes_sec"]
+    for name, seconds in timings.items():
+        print(f"  {name[:-4]:12} {seconds * 1000:8.1f} ms")
+    print(f"  fused vs separate: {separate / timings['fused_sec']:.2f}x")
+
+    fused = SongAnalyzer().add(texts)
+    viral = [
+        _viral_features({c: int(v) if c in INT_FEATURES else float(v) for c, v in zip(FEATURE_COLUMNS, row)}, hooks)
+        if text else {}
+        for text, row, hooks in zip(texts, fused["features"], fused["hook_texts"])
+    ]
+    # One cluster per song turns the per-cluster averages into per-song values
+    structural = analyze_structural_features(songs, each_song)
+    themes = [
+        theme_scores(dict(zip(THEME_COLUMNS, map(int, counts))), int(words))
+        for counts, words in zip(fused["theme_counts"], fused["structural"][:, 0])
+    ]
+    mismatches = {
+        "viral": sum(
+            json.dumps(a) != json.dumps(b) for a, b in zip(extract_viral_features_batch(texts), viral)
+        ),
+        "structural": sum(
+            [float(structural[i][f"avg_{c}"]) for c in STRUCTURAL_COLUMNS] != fused["structural"][i].tolist()
+            for i in structural
+        ),
+        "themes": sum(classify_lyrics(t) != s for t, s in zip(texts, themes)),
+    }
+    print(f"  mismatches: {mismatches}")
+    return {"songs": len(texts), **{k: round(v, 4) for k, v in timings.items()}, "mismatches": mismatches}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenize lyrics once; write viral, structural and theme arrays")
+    parser.add_argument("--input", "-i", type=Path, default=Path("./lyric_embeddings"), help="Embedding directory")
+    parser.add_argument("--batch-size", type=int, default=2048, help="Songs per analysis batch")
+    parser.add_argument("--benchmark", action="store_true", help="Compare against the separate per-script passes")
+    add_profile_args(parser)
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.input)
+        return
+
+    profiler = RunProfiler.from_args(args, "song_analyzer")
+    analyzer = analyze_dir(args.input, args.batch_size, profiler=profiler)
+    with profiler.stage("save"):
+        analyzer.save(args.input)
+    profiler.save(args.input)
+
+    print("Next: cluster_lyrics.py and theme_classifier.py --corpus pick up the arrays automatically")
+
+
+if __name__ == "__main__":
+    main()
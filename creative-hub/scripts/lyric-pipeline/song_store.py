@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - Song Store
+
+Columnar song metadata stored next to the embeddings. Each metadata file
+is written as Parquet (metadata.parquet, shards/metadata-00000.parquet),
+so readers can ask for just the columns they use and stream row groups
+instead of json.loads-ing every field of every song.
+
+Older directories with metadata.jsonl are still readable; the Parquet
+file wins when both exist. Convert them in place with --convert.
+
+Usage:
+    python song_store.py --convert ./lyric_embeddings
+    python song_store.py --input ./lyric_embeddings --columns title genre
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Iterator
+
+METADATA_FORMATS = ("parquet", "jsonl")
+ROW_GROUP_SIZE = 1024
+
+
+def _pyarrow():
+    # Imported lazily so JSONL-only runs don't pay for (or need) pyarrow
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    return pa, pq
+
+
+def resolve(path: Path) -> Path:
+    """Existing metadata file for `path`, preferring Parquet over JSONL."""
+    parquet = path.with_suffix(".parquet")
+    if parquet.exists():
+        return parquet
+    return path.with_suffix(".jsonl")
+
+
+def write_songs(path: Path, songs: list[dict], fmt: str = "parquet") -> Path:
+    """
+    Write song dicts to `path` in the given format (suffix is replaced).
+
+    Parquet columns are the union of keys across songs, in first-seen
+    order. A column whose values mix types is stored as strings (non-string
+    values JSON-encoded), since JSONL input doesn't promise one type per
+    field. The file is written under a temporary name and renamed into
+    place, so a failed write leaves the previous metadata untouched. The
+    other format's file is removed so resolve() can't pick up a stale copy.
+    """
+    if fmt not in METADATA_FORMATS:
+        raise ValueError(f"Unknown metadata format {fmt!r}, expected one of {METADATA_FORMATS}")
+
+    out = path.with_suffix(f".{fmt}")
+    tmp = out.with_name(out.name + ".tmp")
+    if fmt == "parquet":
+        pa, pq = _pyarrow()
+        keys = dict.fromkeys(k for song in songs for k in song)
+        columns, mixed = {}, []
+        for k in keys:
+            values = [song.get(k) for song in songs]
+            try:
+                columns[k] = pa.array(values)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # e.g. id 1 in one song and "b-2" in another
+                columns[k] = pa.array(
+                    [v if v is None or isinstance(v, str) else json.dumps(v) for v in values], pa.string()
+                )
+                mixed.append(k)
+        if mixed:
+            print(f"{out.name}: mixed-type columns stored as strings: {', '.join(mixed)}")
+        table = pa.table(columns)
+        pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE)
+    else:
+        with open(tmp, "w", encoding="utf-8") as f:
+            for song in songs:
+                f.write(json.dumps(song) + "\n")
+    os.replace(tmp, out)
+
+    stale = path.with_suffix(".jsonl" if fmt == "parquet" else ".parquet")
+    if stale.exists():
+        stale.unlink()
+    return out
+
+
+def _project(row: dict, columns: list[str] | None) -> dict:
+    if columns is None:
+        return row
+    return {k: row[k] for k in columns if k in row}
+
+
+def _parquet_columns(pq_file, columns: list[str] | None) -> list[str] | None:
+    # Asking for a column the file doesn't have is an error in pyarrow;
+    # JSONL just leaves the key out, so mirror that.
+    if columns is None:
+        return None
+    names = set(pq_file.schema_arrow.names)
+    return [c for c in columns if c in names]
+
+
+def iter_song_batches(
+    path: Path,
+    columns: list[str] | None = None,
+    batch_size: int = ROW_GROUP_SIZE,
+) -> Iterator[list[dict]]:
+    """Yield lists of song dicts from one metadata file, `batch_size` rows at a time."""
+    path = resolve(path)
+    if path.suffix == ".parquet":
+        _, pq = _pyarrow()
+        pq_file = pq.ParquetFile(path)
+        for batch in pq_file.iter_batches(batch_size=batch_size, columns=_parquet_columns(pq_file, columns)):
+            yield batch.to_pylist()
+        return
+
+    batch = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                batch.append(_project(json.loads(line), columns))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def read_songs(path: Path, columns: list[str] | None = None) -> list[dict]:
+    """Read every song from one metadata file, keeping only `columns` if given."""
+    path = resolve(path)
+    if path.suffix == ".parquet":
+        _, pq = _pyarrow()
+        pq_file = pq.ParquetFile(path)
+        return pq_file.read(columns=_parquet_columns(pq_file, columns)).to_pylist()
+
+    return [song for batch in iter_song_batches(path, columns) for song in batch]
+
+
+def read_columns(path: Path, columns: list[str]) -> dict[str, list]:
+    """Read whole columns as lists (missing columns are omitted)."""
+    path = resolve(path)
+    if path.suffix == ".parquet":
+        _, pq = _pyarrow()
+        pq_file = pq.ParquetFile(path)
+        table = pq_file.read(columns=_parquet_columns(pq_file, columns))
+        return {name: table.column(name).to_pylist() for name in table.column_names}
+
+    songs = read_songs(path, columns)
+    return {c: [s.get(c) for s in songs] for c in columns if any(c in s for s in songs)}
+
+
+def convert_dir(input_dir: Path) -> list[Path]:
+    """Rewrite every metadata*.jsonl in a directory (and its shards/) as Parquet."""
+    converted = []
+    for path in sorted([*input_dir.glob("metadata.jsonl"), *input_dir.glob("shards/metadata-*.jsonl")]):
+        songs = read_songs(path)
+        converted.append(write_songs(path, songs, "parquet"))
+        print(f"Converted {path} -> {converted[-1].name} ({len(songs)} songs)")
+    return converted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert or inspect lyric song metadata")
+    parser.add_argument("--convert", type=Path, help="Directory whose metadata JSONL files should become Parquet")
+    parser.add_argument("--input", "-i", type=Path, help="Directory to inspect")
+    parser.add_argument("--columns", nargs="+", help="Columns to read when inspecting")
+
+    args = parser.parse_args()
+
+    if args.convert:
+        if not convert_dir(args.convert):
+            print(f"No metadata JSONL files in {args.convert}")
+    elif args.input:
+        from embedding_store import load_metadata
+
+        songs = load_metadata(args.input, columns=args.columns)
+        print(f"Songs: {len(songs)}")
+        if songs:
+            print(f"Columns: {', '.join(songs[0])}")
+            print(json.dumps(songs[0], indent=2)[:1000])
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
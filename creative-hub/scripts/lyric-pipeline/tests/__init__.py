@@ -0,0 +1 @@
+"""Tests for the lyric pipeline scripts (run from lyric-pipeline/: python -m pytest tests)."""
@@ -0,0 +1,73 @@
+"""Tests for cluster_lyrics' fitted-model cache."""
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from cluster_lyrics import clear_cluster_cache, fit_cached, prune_cluster_cache
+
+
+def _write(path: Path, size: int, mtime: float):
+    path.write_bytes(b"\0" * size)
+    os.utime(path, (mtime, mtime))
+
+
+class TestClusterCache(unittest.TestCase):
+    """The fit cache stays under its byte cap, dropping least recently used fits first."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def names(self) -> list[str]:
+        return sorted(p.name for p in self.cache_dir.iterdir())
+
+    def test_prune_oldest_first(self):
+        mb = 1024 * 1024
+        for i, name in enumerate(["a.npz", "b.npz", "c.npz"]):
+            _write(self.cache_dir / f"{name}", mb, 1000 + i)
+        _write(self.cache_dir / "d.tmp.npz", mb, 0)  # being written by another worker
+
+        self.assertEqual(prune_cluster_cache(self.cache_dir, max_size_mb=2), 1)
+        self.assertEqual(self.names(), ["b.npz", "c.npz", "d.tmp.npz"])
+
+    def test_prune_never_removes_keep(self):
+        _write(self.cache_dir / "old.npz", 2048, 1000)
+        _write(self.cache_dir / "new.npz", 2048, 2000)
+        prune_cluster_cache(self.cache_dir, max_size_mb=0, keep=self.cache_dir / "old.npz")
+        self.assertEqual(self.names(), ["old.npz"])
+
+    def test_fit_cached_hit_refresh_and_cap(self):
+        rng = np.random.default_rng(0)
+        embeddings = rng.normal(size=(60, 4)).astype(np.float32)
+
+        labels, centers, hit = fit_cached(embeddings, 3, cache_dir=self.cache_dir)
+        self.assertFalse(hit)
+        (first,) = self.cache_dir.glob("*.npz")
+        os.utime(first, (1000, 1000))
+
+        again, _, hit = fit_cached(embeddings, 3, cache_dir=self.cache_dir)
+        self.assertTrue(hit)
+        np.testing.assert_array_equal(again, labels)
+        self.assertGreater(first.stat().st_mtime, 1000)
+
+        # A cap smaller than two fits keeps only the newest one
+        fit_cached(embeddings, 4, cache_dir=self.cache_dir, cache_mb=first.stat().st_size * 1.5 / (1024 * 1024))
+        (kept,) = self.cache_dir.glob("*.npz")
+        self.assertTrue(kept.name.startswith("k004_"))
+
+    def test_clear(self):
+        _write(self.cache_dir / "a.npz", 10, 1000)
+        _write(self.cache_dir / "b.tmp.npz", 10, 1000)
+        self.assertEqual(clear_cluster_cache(self.cache_dir), 2)
+        self.assertEqual(self.names(), [])
+        self.assertEqual(clear_cluster_cache(self.cache_dir / "missing"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
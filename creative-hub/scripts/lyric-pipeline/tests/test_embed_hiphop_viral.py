@@ -0,0 +1,80 @@
+"""Tests for embed_hiphop_viral's save path."""
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from embed_hiphop_viral import process_and_embed, save_results
+from embedding_store import CHECKPOINT_FILE, ShardWriter, load_embedding_dir, record_segment
+
+
+def _tracks(count: int, score: int = 10) -> list[dict]:
+    return [{"id": f"t{i}", "title": f"track {i}", "viral_score": score} for i in range(count)]
+
+
+class _FakeEncoder:
+    """SentenceTransformer stand-in with a fixed width."""
+
+    dim = 8
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts, **kwargs):
+        return np.ones((len(texts), self.dim), dtype=np.float32)
+
+
+def _quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+class TestSaveResults(unittest.TestCase):
+    """save_results leaves a directory the loaders read as exactly what was saved."""
+
+    def test_replaces_sharded_run(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = Path(tmp)
+            writer = ShardWriter(output_dir, "test-model", shard_size=5, metadata_format="jsonl")
+            writer.write_shard(_tracks(5), np.zeros((5, 4), dtype=np.float32), 5)
+            writer.finish(5)
+            record_segment(output_dir)
+
+            _quiet(save_results, _tracks(3, score=60), np.ones((3, 4), dtype=np.float32), output_dir)
+
+            self.assertFalse((output_dir / CHECKPOINT_FILE).exists())
+            metadata, embeddings = load_embedding_dir(output_dir)
+            self.assertEqual(len(metadata), 3)
+            np.testing.assert_array_equal(embeddings, np.ones((3, 4), dtype=np.float32))
+
+
+    def test_all_tracks_filtered(self):
+        songs = [{"id": f"t{i}", "lyrics": "too short to keep"} for i in range(4)]
+        with mock.patch("embed_hiphop_viral.load_encoder", return_value=_FakeEncoder()):
+            processed, embeddings, features = _quiet(process_and_embed, iter(songs), feature_workers=1)
+        self.assertEqual(processed, [])
+        self.assertEqual(embeddings.shape, (0, _FakeEncoder.dim))
+        self.assertEqual(features.shape[0], 0)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = Path(tmp)
+            _quiet(save_results, processed, embeddings, output_dir, features=features)
+
+            metadata, stored = load_embedding_dir(output_dir)
+            self.assertEqual((len(metadata), stored.shape), (0, (0, _FakeEncoder.dim)))
+            self.assertEqual(np.load(output_dir / "features.npy").shape, features.shape)
+            with open(output_dir / "stats.json", "r", encoding="utf-8") as f:
+                stats = json.load(f)
+            self.assertEqual(stats["total_tracks"], 0)
+            self.assertEqual(stats["embedding_dim"], _FakeEncoder.dim)
+            self.assertEqual(stats["viral_analysis"]["total_tracks"], 0)
+            self.assertEqual(set(stats["viral_analysis"]["score_distribution"].values()), {0})
+
+
+if __name__ == "__main__":
+    unittest.main()
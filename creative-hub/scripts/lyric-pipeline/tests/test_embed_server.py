@@ -0,0 +1,67 @@
+"""Tests for embed_server's client-side probe."""
+import json
+import socket
+import threading
+import unittest
+
+from embed_server import find_server
+
+
+def _listener(reply: bytes) -> tuple[socket.socket, str]:
+    """Local socket that answers every connection with `reply` and closes it."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+
+    def serve():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                conn.recv(4096)
+                conn.sendall(reply)
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.getsockname()[1]}"
+
+
+def _http(body: dict) -> bytes:
+    data = json.dumps(body).encode("utf-8")
+    return b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(data), data)
+
+
+class TestFindServer(unittest.TestCase):
+    """Anything but a matching embed_server falls back to a local model (None)."""
+
+    def check(self, reply: bytes, model: str = "m"):
+        server, url = _listener(reply)
+        try:
+            return find_server(model, url, timeout=2)
+        finally:
+            server.close()
+
+    def test_non_http_listener(self):
+        self.assertIsNone(self.check(b"SSH-2.0-OpenSSH_9.6\r\n"))
+
+    def test_health_without_dim(self):
+        self.assertIsNone(self.check(_http({"model": "m"})))
+
+    def test_other_model(self):
+        self.assertIsNone(self.check(_http({"model": "other", "dim": 8})))
+
+    def test_matching_server(self):
+        encoder = self.check(_http({"model": "m", "dim": 8}))
+        self.assertEqual(encoder.get_sentence_embedding_dimension(), 8)
+
+    def test_nothing_listening(self):
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        url = f"http://127.0.0.1:{server.getsockname()[1]}"
+        server.close()
+        self.assertIsNone(find_server("m", url, timeout=2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Tests for embedding_store's memory-mapped matrix and segment loading."""
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from embedding_store import EmbeddingMatrix, ShardWriter, load_segments, record_segment
+
+
+def _songs(start: int, count: int) -> list[dict]:
+    return [{"id": str(i), "lyrics_clean": f"song {i}"} for i in range(start, start + count)]
+
+
+class TestEmbeddingMatrix(unittest.TestCase):
+    """Slicing across parts matches the same slice of a plain array."""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.array = rng.normal(size=(10, 4)).astype(np.float32)
+        self.matrix = EmbeddingMatrix([(self.array[:3], None), (self.array[3:7], None), (self.array[7:], None)])
+
+    def test_slices_match_array(self):
+        for index in (slice(None), slice(2, 8), slice(1, 9, 3), slice(None, None, -1),
+                      slice(8, 1, -2), slice(-1, -5, -1), slice(5, 5), slice(2, 8, -1)):
+            with self.subTest(index=index):
+                np.testing.assert_array_equal(self.matrix[index], self.array[index])
+
+    def test_empty_slice_keeps_width(self):
+        self.assertEqual(self.matrix[::-1][:0].shape, (0, 4))
+        self.assertEqual(self.matrix[3:1].shape, (0, 4))
+        self.assertEqual(self.matrix[3:1:1].shape, (0, 4))
+
+    def test_empty_parts_keep_dim_and_dtype(self):
+        matrix = EmbeddingMatrix([(np.zeros((0, 6), dtype=np.int8), np.ones(6, dtype=np.float32))])
+        self.assertEqual(matrix.shape, (0, 6))
+        self.assertEqual(matrix.storage_dtype, "int8")
+        self.assertEqual(matrix.to_array().shape, (0, 6))
+
+
+class TestLoadSegments(unittest.TestCase):
+    """load_segments past the last segment returns an empty (0, dim) result."""
+
+    def test_no_new_segments(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = Path(tmp)
+            writer = ShardWriter(output_dir, "test-model", shard_size=4, storage_dtype="float16", metadata_format="jsonl")
+            writer.write_shard(_songs(0, 4), np.ones((4, 5), dtype=np.float32), 4)
+            writer.finish(4)
+            record_segment(output_dir)
+
+            metadata, embeddings, offset = load_segments(output_dir, since=1)
+            self.assertEqual((metadata, offset), ([], 4))
+            self.assertEqual(embeddings.shape, (0, 5))
+            self.assertEqual(embeddings.dtype, np.float32)
+
+            _, matrix, _ = load_segments(output_dir, since=1, mmap=True)
+            self.assertEqual(matrix.shape, (0, 5))
+            self.assertEqual(matrix.storage_dtype, "float16")
+
+
+if __name__ == "__main__":
+    unittest.main()
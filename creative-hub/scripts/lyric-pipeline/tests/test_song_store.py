@@ -0,0 +1,45 @@
+"""Tests for song_store's Parquet / JSONL metadata files."""
+import tempfile
+import unittest
+from pathlib import Path
+
+from song_store import read_songs, resolve, write_songs
+
+
+class TestWriteSongs(unittest.TestCase):
+    """Metadata the JSONL baseline accepted round-trips through Parquet."""
+
+    def test_mixed_type_fields(self):
+        songs = [
+            {"id": 1, "title": "a", "year": 2019, "tags": ["x"]},
+            {"id": "b-2", "title": "b", "year": "2020s", "tags": None},
+            {"id": None, "title": "c", "year": 2021.5},
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            out = write_songs(Path(tmp) / "metadata.jsonl", songs, "parquet")
+            self.assertEqual(out.suffix, ".parquet")
+            rows = read_songs(out)
+
+        self.assertEqual([r["id"] for r in rows], ["1", "b-2", None])
+        self.assertEqual([r["year"] for r in rows], ["2019", "2020s", "2021.5"])
+        self.assertEqual([r["title"] for r in rows], ["a", "b", "c"])
+        self.assertEqual([r["tags"] for r in rows], [["x"], None, None])
+
+    def test_single_type_fields_keep_their_type(self):
+        songs = [{"id": 1, "score": 0.5}, {"id": 2, "score": 1}]
+        with tempfile.TemporaryDirectory() as tmp:
+            rows = read_songs(write_songs(Path(tmp) / "metadata.jsonl", songs, "parquet"))
+        self.assertEqual(rows, [{"id": 1, "score": 0.5}, {"id": 2, "score": 1.0}])
+
+    def test_replaces_other_format(self):
+        songs = [{"id": "1"}]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "metadata.jsonl"
+            write_songs(path, songs, "parquet")
+            write_songs(path, songs, "jsonl")
+            self.assertEqual(resolve(path).suffix, ".jsonl")
+            self.assertEqual(sorted(p.name for p in Path(tmp).iterdir()), ["metadata.jsonl"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+"""Tests for viral_scorer's score clamping and distributions."""
+import unittest
+
+import numpy as np
+
+from viral_scorer import FEATURE_COLUMNS, SCORE_BUCKETS, VIRAL_WEIGHTS, distribution, sweep, viral_scores, weight_vector
+
+
+class TestViralScores(unittest.TestCase):
+    """Scores stay within [0, SCORE_CAP] whatever the weights."""
+
+    def test_negative_weights_clamp_to_zero(self):
+        features = np.ones((3, len(FEATURE_COLUMNS)))
+        scores = viral_scores(features, -weight_vector(VIRAL_WEIGHTS))
+        np.testing.assert_array_equal(scores, [0, 0, 0])
+        self.assertEqual(distribution(scores)["score_distribution"]["0-20"], 3)
+
+
+class TestDistribution(unittest.TestCase):
+    """distribution() and sweep() summarize an empty corpus as zeros."""
+
+    def test_empty_scores(self):
+        for scores in ([], np.zeros(0, dtype=np.int64)):
+            with self.subTest(dtype=np.asarray(scores).dtype):
+                summary = distribution(scores)
+                self.assertEqual(summary["total_tracks"], 0)
+                self.assertEqual(summary["avg_viral_score"], 0.0)
+                self.assertEqual((summary["max_viral_score"], summary["min_viral_score"]), (0, 0))
+                self.assertEqual(summary["high_viral_count"], 0)
+                self.assertEqual(summary["score_distribution"], {name: 0 for name in SCORE_BUCKETS})
+
+    def test_empty_sweep(self):
+        weight_sets = np.stack([weight_vector(VIRAL_WEIGHTS)] * 2)
+        results = sweep(np.zeros((0, len(FEATURE_COLUMNS))), weight_sets)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]["avg_viral_score"], 0.0)
+        self.assertEqual(results[0]["score_distribution"], {name: 0 for name in SCORE_BUCKETS})
+
+    def test_buckets(self):
+        summary = distribution([0, 19, 20, 55, 100])
+        self.assertEqual(summary["score_distribution"], {"0-20": 2, "20-40": 1, "40-60": 1, "60-80": 0, "80-100": 1})
+        self.assertEqual((summary["max_viral_score"], summary["min_viral_score"]), (100, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -25,6 +25,7 @@ The 12 Proven Hit Themes:
 Usage:
     python theme_classifier.py --input lyrics.txt
     python theme_classifier.py --corpus ./lyric_embeddings
+    python theme_classifier.py --corpus ./lyric_embeddings --profile
 """
 
 from __future__ import annotations
@@ -37,6 +38,9 @@ from typing import Optional
 
 import numpy as np
 
+from embedding_store import load_metadata
+from pipeline_profile import NULL_PROFILER, RunProfiler, add_profile_args
+
 # The 12 proven hit themes with keyword patterns
 THEMES = {
     # Primary themes (strong predictors)
@@ -162,22 +166,28 @@ def classify_lyrics(lyrics: str) -> dict[str, float]:
         return {theme: 0.0 for theme in THEMES}
 
     lyrics_lower = lyrics.lower()
+
+    # Count keyword matches
+    matches = {
+        theme: sum(len(re.findall(rf"\b{re.escape(kw)}\b", lyrics_lower)) for kw in config["keywords"])
+        for theme, config in THEMES.items()
+    }
+    return theme_scores(matches, len(lyrics_lower.split()))
+
+
+def theme_scores(matches: dict[str, int], word_count: int) -> dict[str, float]:
+    """
+    Normalized theme scores from per-theme keyword match counts
+    (classify_lyrics without the matching, for precomputed counts).
+    """
     scores = {}
 
     for theme, config in THEMES.items():
-        keywords = config["keywords"]
         weight = config["weight"]
 
-        # Count keyword matches
-        matches = sum(
-            len(re.findall(rf"\b{re.escape(kw)}\b", lyrics_lower))
-            for kw in keywords
-        )
-
         # Normalize by lyrics length (per 100 words)
-        word_count = len(lyrics_lower.split())
         if word_count > 0:
-            score = (matches / word_count) * 100 * weight
+            score = (matches[theme] / word_count) * 100 * weight
         else:
             score = 0.0
 
@@ -202,7 +212,11 @@ def get_theme_profile(lyrics: str) -> dict:
     Full theme analysis for lyrics.
     Returns scores, dominant themes, and generation hints.
     """
-    scores = classify_lyrics(lyrics)
+    return profile_from_scores(classify_lyrics(lyrics))
+
+
+def profile_from_scores(scores: dict[str, float]) -> dict:
+    """get_theme_profile for already computed theme scores."""
     dominant = get_dominant_themes(scores, top_k=3)
 
     # Determine decade alignment
@@ -228,15 +242,25 @@ def get_theme_profile(lyrics: str) -> dict:
     }
 
 
-def classify_corpus(input_dir: Path) -> dict:
+def classify_corpus(input_dir: Path, profiler: RunProfiler | None = None) -> dict:
     """
     Classify entire corpus and compute statistics.
+
+    Uses song_analyzer.py's theme counts when they cover the corpus,
+    instead of re-reading and re-matching the lyrics.
     """
-    metadata = []
-    with open(input_dir / "metadata.jsonl", "r", encoding="utf-8") as f:
-        for line in f:
-            if line.strip():
-                metadata.append(json.loads(line))
+    from song_analyzer import load_analysis
+
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage("load") as stage:
+        columns = ["id", "title", "artist"]
+        analysis = load_analysis(input_dir)
+        metadata = load_metadata(input_dir, columns=columns if analysis else columns + ["lyrics_clean"])
+        if analysis is not None and analysis["schema"]["rows"] != len(metadata):
+            print(f"Ignoring stale song analysis ({analysis['schema']['rows']} rows, metadata has {len(metadata)})")
+            analysis = None
+            metadata = load_metadata(input_dir, columns=columns + ["lyrics_clean"])
+        stage.items = len(metadata)
 
     print(f"Classifying {len(metadata)} songs...")
 
@@ -244,19 +268,23 @@ def classify_corpus(input_dir: Path) -> dict:
     results = []
     theme_totals = {theme: 0.0 for theme in THEMES}
 
-    for song in metadata:
-        lyrics = song.get("lyrics_clean", "")
-        profile = get_theme_profile(lyrics)
+    with profiler.stage("classify", items=len(metadata)):
+        for i, song in enumerate(metadata):
+            if analysis is not None:
+                matches = dict(zip(analysis["schema"]["theme_columns"], analysis["theme_counts"][i].tolist()))
+                profile = profile_from_scores(theme_scores(matches, int(analysis["structural"][i, 0])))
+            else:
+                profile = get_theme_profile(song.get("lyrics_clean", ""))
 
-        results.append({
-            "id": song.get("id"),
-            "title": song.get("title"),
-            "artist": song.get("artist"),
-            **profile,
-        })
+            results.append({
+                "id": song.get("id"),
+                "title": song.get("title"),
+                "artist": song.get("artist"),
+                **profile,
+            })
 
-        for theme, score in profile["scores"].items():
-            theme_totals[theme] += score
+            for theme, score in profile["scores"].items():
+                theme_totals[theme] += score
 
     # Average theme distribution
     n = len(results)
@@ -295,10 +323,12 @@ def save_classification(results: dict, output_dir: Path):
 def main():
     parser = argparse.ArgumentParser(description="Classify lyrics into 12 hit themes")
     parser.add_argument("--input", "-i", type=str, help="Single lyrics text file or lyrics string")
-    parser.add_argument("--corpus", "-c", type=Path, help="Directory with metadata.jsonl")
+    parser.add_argument("--corpus", "-c", type=Path, help="Embedding directory (metadata.parquet or .jsonl)")
     parser.add_argument("--output", "-o", type=Path, help="Output directory")
+    add_profile_args(parser)
 
     args = parser.parse_args()
+    profiler = RunProfiler.from_args(args, "theme_classifier")
 
     if args.input:
         # Classify single input
@@ -312,9 +342,11 @@ def main():
 
     elif args.corpus:
         # Classify corpus
-        results = classify_corpus(args.corpus)
+        results = classify_corpus(args.corpus, profiler=profiler)
         output_dir = args.output or args.corpus
-        save_classification(results, output_dir)
+        with profiler.stage("save"):
+            save_classification(results, output_dir)
+        profiler.save(output_dir)
 
     else:
         # Demo
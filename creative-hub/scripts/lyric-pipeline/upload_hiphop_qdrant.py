@@ -7,33 +7,44 @@ Replaces old garbage pop/country data.
 
 Usage:
     python upload_hiphop_qdrant.py --input ./hiphop_embeddings --replace
+    python upload_hiphop_qdrant.py --input ./hiphop_embeddings --profile
+    python upload_hiphop_qdrant.py --input ./hiphop_embeddings --neighbors 50
 """
 
 from __future__ import annotations
 
 import argparse
-import json
 import os
 import uuid
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import numpy as np
-from qdrant_client import QdrantClient
-from qdrant_client.models import (
-    Distance,
-    PointStruct,
-    VectorParams,
-)
 from tqdm import tqdm
 
+from embedding_store import EmbeddingMatrix, load_embedding_dir
+from pipeline_profile import RunProfiler, add_profile_args
+
+if TYPE_CHECKING:
+    import numpy as np
+    from qdrant_client import QdrantClient
+
 # New collection for hip hop / viral patterns
 COLLECTION_NAME = "hiphop_viral"
 OLD_COLLECTION = "lyric_patterns"  # The garbage we're replacing
 EMBEDDING_DIM = 384
 
+# Metadata fields that end up in the point payload (full lyrics_clean is skipped)
+SONG_COLUMNS = [
+    "source", "lyrics_preview", "viral_score", "hook_score", "repetition_ratio",
+    "adlib_density", "short_line_ratio", "exclamation_energy", "phonk_score",
+    "first_line_punch", "word_count", "line_count", "top_hooks",
+]
+
 
 def get_qdrant_client() -> QdrantClient:
     """Initialize Qdrant client from environment."""
+    from qdrant_client import QdrantClient
+
     url = os.environ.get("QDRANT_URL")
     api_key = os.environ.get("QDRANT_API_KEY")
 
@@ -59,6 +70,8 @@ def delete_old_collection(client: QdrantClient):
 
 def ensure_collection(client: QdrantClient, dim: int, recreate: bool = False):
     """Create or recreate collection."""
+    from qdrant_client.models import Distance, VectorParams
+
     collections = client.get_collections().collections
     exists = any(c.name == COLLECTION_NAME for c in collections)
 
@@ -77,64 +90,76 @@ def ensure_collection(client: QdrantClient, dim: int, recreate: bool = False):
         print(f"Collection exists: {COLLECTION_NAME}")
 
 
-def load_data(input_dir: Path) -> tuple[list[dict], np.ndarray]:
-    """Load metadata and embeddings."""
-    embeddings = np.load(input_dir / "embeddings.npy")
-
-    metadata = []
-    with open(input_dir / "metadata.jsonl", "r", encoding="utf-8") as f:
-        for line in f:
-            if line.strip():
-                metadata.append(json.loads(line))
-
-    return metadata, embeddings
+def load_data(input_dir: Path) -> tuple[list[dict], EmbeddingMatrix]:
+    """
+    Load metadata and memory-mapped embeddings (any layout or precision).
+    Vectors are dequantized batch by batch during upload.
+    """
+    return load_embedding_dir(input_dir, mmap=True, columns=SONG_COLUMNS)
 
 
 def upload_to_qdrant(
     client: QdrantClient,
     metadata: list[dict],
-    embeddings: np.ndarray,
+    embeddings: EmbeddingMatrix,
     batch_size: int = 100,
+    neighbors: tuple[np.ndarray, np.ndarray] | None = None,
+    neighbor_count: int | None = None,
 ):
-    """Upload hip hop embeddings with viral features."""
+    """
+    Upload hip hop embeddings with viral features.
+
+    With `neighbors` (knn_graph.load_knn_graph output) each payload also
+    gets the point ids and scores of its top `neighbor_count` similar tracks.
+    """
+    from qdrant_client.models import PointStruct
+
     print(f"Uploading {len(metadata)} hip hop tracks to Qdrant...")
 
-    points = []
-    for i, meta in enumerate(tqdm(metadata, desc="Preparing")):
-        # Build payload with viral features
-        payload = {
-            "source": meta.get("source", "rap_lyrics_english"),
-            "lyrics_preview": meta.get("lyrics_preview", "")[:300],
-            # Viral features
-            "viral_score": meta.get("viral_score", 0),
-            "hook_score": meta.get("hook_score", 0),
-            "repetition_ratio": meta.get("repetition_ratio", 0),
-            "adlib_density": meta.get("adlib_density", 0),
-            "short_line_ratio": meta.get("short_line_ratio", 0),
-            "exclamation_energy": meta.get("exclamation_energy", 0),
-            "phonk_score": meta.get("phonk_score", 0),
-            "first_line_punch": meta.get("first_line_punch", 0),
-            "word_count": meta.get("word_count", 0),
-            "line_count": meta.get("line_count", 0),
-            "top_hooks": meta.get("top_hooks", []),
-        }
-
-        point_id = str(uuid.uuid4())
-        points.append(PointStruct(
-            id=point_id,
-            vector=embeddings[i].tolist(),
-            payload=payload,
-        ))
-
-    # Upload in batches
-    for i in tqdm(range(0, len(points), batch_size), desc="Uploading"):
-        batch = points[i:i + batch_size]
-        client.upsert(collection_name=COLLECTION_NAME, points=batch)
-
-    print(f"Uploaded {len(points)} hip hop tracks")
-
-
-def test_search(client: QdrantClient, embeddings: np.ndarray):
+    # Ids up front so a payload can name points that aren't uploaded yet
+    point_ids = [str(uuid.uuid4()) for _ in metadata]
+    if neighbors is not None:
+        from knn_graph import neighbor_payload
+
+    uploaded = 0
+    batches = embeddings.iter_batches(batch_size)
+    for start, vectors in tqdm(batches, total=-(-len(metadata) // batch_size), desc="Uploading"):
+        points = []
+        for offset, vector in enumerate(vectors):
+            meta = metadata[start + offset]
+            # Build payload with viral features
+            payload = {
+                "source": meta.get("source", "rap_lyrics_english"),
+                "lyrics_preview": meta.get("lyrics_preview", "")[:300],
+                # Viral features
+                "viral_score": meta.get("viral_score", 0),
+                "hook_score": meta.get("hook_score", 0),
+                "repetition_ratio": meta.get("repetition_ratio", 0),
+                "adlib_density": meta.get("adlib_density", 0),
+                "short_line_ratio": meta.get("short_line_ratio", 0),
+                "exclamation_energy": meta.get("exclamation_energy", 0),
+                "phonk_score": meta.get("phonk_score", 0),
+                "first_line_punch": meta.get("first_line_punch", 0),
+                "word_count": meta.get("word_count", 0),
+                "line_count": meta.get("line_count", 0),
+                "top_hooks": meta.get("top_hooks", []),
+            }
+            if neighbors is not None:
+                payload.update(neighbor_payload(*neighbors, start + offset, point_ids, neighbor_count))
+
+            points.append(PointStruct(
+                id=point_ids[start + offset],
+                vector=vector.tolist(),
+                payload=payload,
+            ))
+
+        client.upsert(collection_name=COLLECTION_NAME, points=points)
+        uploaded += len(points)
+
+    print(f"Uploaded {uploaded} hip hop tracks")
+
+
+def test_search(client: QdrantClient, embeddings: EmbeddingMatrix):
     """Test search and show high viral tracks."""
     print("\n" + "="*50)
     print("SEARCHING FOR VIRAL PATTERNS")
@@ -186,8 +211,11 @@ def main():
     parser.add_argument("--batch-size", type=int, default=100)
     parser.add_argument("--replace", action="store_true", help="Delete old collection first")
     parser.add_argument("--delete-old", action="store_true", help="Also delete old lyric_patterns collection")
+    parser.add_argument("--neighbors", type=int, default=0, help="Attach this many similar tracks from knn_graph.py")
+    add_profile_args(parser)
 
     args = parser.parse_args()
+    profiler = RunProfiler.from_args(args, "upload_hiphop_qdrant")
 
     # Load dotenv
     try:
@@ -206,17 +234,28 @@ def main():
         delete_old_collection(client)
 
     # Load data
-    metadata, embeddings = load_data(args.input)
+    with profiler.stage("load") as stage:
+        metadata, embeddings = load_data(args.input)
+        stage.items = len(metadata)
     print(f"Loaded {len(metadata)} hip hop tracks")
+    neighbors = None
+    if args.neighbors:
+        from knn_graph import load_neighbors
+
+        neighbors = load_neighbors(args.input, len(metadata), args.neighbors)
 
     # Ensure collection exists
     ensure_collection(client, embeddings.shape[1], recreate=args.replace)
 
     # Upload
-    upload_to_qdrant(client, metadata, embeddings, batch_size=args.batch_size)
+    with profiler.stage("upload", items=len(metadata)):
+        upload_to_qdrant(client, metadata, embeddings, batch_size=args.batch_size,
+                         neighbors=neighbors, neighbor_count=args.neighbors)
 
     # Test
-    test_search(client, embeddings)
+    with profiler.stage("search"):
+        test_search(client, embeddings)
+    profiler.save(args.input)
 
     print("\n" + "="*50)
     print("HIP HOP INTELLIGENCE IS LIVE!")
@@ -7,6 +7,8 @@ Creates a searchable lyric intelligence database.
 
 Usage:
     python upload_to_qdrant.py --input ./lyric_embeddings
+    python upload_to_qdrant.py --input ./lyric_embeddings --profile
+    python upload_to_qdrant.py --input ./lyric_embeddings --neighbors 20
 """
 
 from __future__ import annotations
@@ -16,23 +18,29 @@ import json
 import os
 import uuid
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import numpy as np
-from qdrant_client import QdrantClient
-from qdrant_client.models import (
-    Distance,
-    PointStruct,
-    VectorParams,
-)
 from tqdm import tqdm
 
+from embedding_store import EmbeddingMatrix, load_embedding_dir
+from pipeline_profile import RunProfiler, add_profile_args
+
+if TYPE_CHECKING:
+    from qdrant_client import QdrantClient
+
 # Collection for lyric embeddings (separate from audio embeddings)
 COLLECTION_NAME = "lyric_patterns"
 EMBEDDING_DIM = 384  # all-MiniLM-L6-v2 outputs 384 dims
 
+# Metadata fields that end up in the point payload
+SONG_COLUMNS = ["title", "artist", "genre", "lyrics_clean", "performance"]
+
 
 def get_qdrant_client() -> QdrantClient:
     """Initialize Qdrant client from environment."""
+    from qdrant_client import QdrantClient
+
     url = os.environ.get("QDRANT_URL", "http://localhost:6333")
     api_key = os.environ.get("QDRANT_API_KEY")
 
@@ -44,6 +52,8 @@ def get_qdrant_client() -> QdrantClient:
 
 def ensure_collection(client: QdrantClient, dim: int):
     """Create collection if it doesn't exist."""
+    from qdrant_client.models import Distance, VectorParams
+
     collections = client.get_collections().collections
     exists = any(c.name == COLLECTION_NAME for c in collections)
 
@@ -57,15 +67,12 @@ def ensure_collection(client: QdrantClient, dim: int):
         print(f"Collection exists: {COLLECTION_NAME}")
 
 
-def load_data(input_dir: Path) -> tuple[list[dict], np.ndarray]:
-    """Load metadata and embeddings."""
-    embeddings = np.load(input_dir / "embeddings.npy")
-
-    metadata = []
-    with open(input_dir / "metadata.jsonl", "r", encoding="utf-8") as f:
-        for line in f:
-            if line.strip():
-                metadata.append(json.loads(line))
+def load_data(input_dir: Path) -> tuple[list[dict], EmbeddingMatrix, dict]:
+    """
+    Load metadata and memory-mapped embeddings (any layout or precision).
+    Vectors are dequantized batch by batch during upload.
+    """
+    metadata, embeddings = load_embedding_dir(input_dir, mmap=True, columns=SONG_COLUMNS)
 
     # Load cluster labels if available
     labels_path = input_dir / "cluster_labels.npy"
@@ -88,53 +95,67 @@ def load_data(input_dir: Path) -> tuple[list[dict], np.ndarray]:
 def upload_to_qdrant(
     client: QdrantClient,
     metadata: list[dict],
-    embeddings: np.ndarray,
+    embeddings: EmbeddingMatrix,
     cluster_info: dict,
     batch_size: int = 100,
+    neighbors: tuple[np.ndarray, np.ndarray] | None = None,
+    neighbor_count: int | None = None,
 ):
-    """Upload embeddings and metadata to Qdrant."""
+    """Upload embeddings and metadata to Qdrant; `neighbors` as in upload_hiphop_qdrant."""
+    from qdrant_client.models import PointStruct
+
     print(f"Uploading {len(metadata)} points to Qdrant...")
 
-    points = []
-    for i, meta in enumerate(tqdm(metadata, desc="Preparing")):
-        # Build payload
-        payload = {
-            "title": meta.get("title", "Unknown"),
-            "artist": meta.get("artist", "Unknown"),
-            "genre": meta.get("genre", ""),
-            "lyrics_preview": meta.get("lyrics_clean", "")[:500],  # First 500 chars
-            "cluster": meta.get("cluster", -1),
-        }
-
-        # Add cluster info if available
-        cluster_id = str(meta.get("cluster", -1))
-        if cluster_id in cluster_info:
-            cinfo = cluster_info[cluster_id]
-            payload["cluster_terms"] = [t["term"] for t in cinfo.get("distinctive_terms", [])[:5]]
-            payload["cluster_size"] = cinfo.get("size", 0)
-
-        # Add performance data if available
-        if "performance" in meta and meta["performance"]:
-            for k, v in meta["performance"].items():
-                if isinstance(v, (int, float, str, bool)):
-                    payload[f"perf_{k}"] = v
-
-        point_id = str(uuid.uuid4())
-        points.append(PointStruct(
-            id=point_id,
-            vector=embeddings[i].tolist(),
-            payload=payload,
-        ))
-
-    # Upload in batches
-    for i in tqdm(range(0, len(points), batch_size), desc="Uploading"):
-        batch = points[i:i + batch_size]
-        client.upsert(collection_name=COLLECTION_NAME, points=batch)
-
-    print(f"Uploaded {len(points)} points")
-
-
-def test_search(client: QdrantClient, embeddings: np.ndarray):
+    # Ids up front so a payload can name points that aren't uploaded yet
+    point_ids = [str(uuid.uuid4()) for _ in metadata]
+    if neighbors is not None:
+        from knn_graph import neighbor_payload
+
+    uploaded = 0
+    batches = embeddings.iter_batches(batch_size)
+    for start, vectors in tqdm(batches, total=-(-len(metadata) // batch_size), desc="Uploading"):
+        points = []
+        for offset, vector in enumerate(vectors):
+            meta = metadata[start + offset]
+            # Build payload
+            payload = {
+                "title": meta.get("title", "Unknown"),
+                "artist": meta.get("artist", "Unknown"),
+                "genre": meta.get("genre", ""),
+                "lyrics_preview": meta.get("lyrics_clean", "")[:500],  # First 500 chars
+                "cluster": meta.get("cluster", -1),
+            }
+
+            # Add cluster info if available
+            cluster_id = str(meta.get("cluster", -1))
+            if cluster_id in cluster_info:
+                cinfo = cluster_info[cluster_id]
+                payload["cluster_terms"] = [t["term"] for t in cinfo.get("distinctive_terms", [])[:5]]
+                payload["cluster_size"] = cinfo.get("size", 0)
+
+            # Add performance data if available
+            if "performance" in meta and meta["performance"]:
+                for k, v in meta["performance"].items():
+                    if isinstance(v, (int, float, str, bool)):
+                        payload[f"perf_{k}"] = v
+
+            # Similar songs from knn_graph.py
+            if neighbors is not None:
+                payload.update(neighbor_payload(*neighbors, start + offset, point_ids, neighbor_count))
+
+            points.append(PointStruct(
+                id=point_ids[start + offset],
+                vector=vector.tolist(),
+                payload=payload,
+            ))
+
+        client.upsert(collection_name=COLLECTION_NAME, points=points)
+        uploaded += len(points)
+
+    print(f"Uploaded {uploaded} points")
+
+
+def test_search(client: QdrantClient, embeddings: EmbeddingMatrix):
     """Test search functionality."""
     print("\nTesting search...")
 
@@ -154,8 +175,11 @@ def main():
     parser = argparse.ArgumentParser(description="Upload lyrics to Qdrant")
     parser.add_argument("--input", "-i", type=Path, default=Path("./lyric_embeddings"), help="Input directory")
     parser.add_argument("--batch-size", type=int, default=100, help="Upload batch size")
+    parser.add_argument("--neighbors", type=int, default=0, help="Attach this many similar songs from knn_graph.py")
+    add_profile_args(parser)
 
     args = parser.parse_args()
+    profiler = RunProfiler.from_args(args, "upload_to_qdrant")
 
     # Load dotenv if available
     try:
@@ -168,17 +192,28 @@ def main():
     client = get_qdrant_client()
 
     # Load data
-    metadata, embeddings, cluster_info = load_data(args.input)
+    with profiler.stage("load") as stage:
+        metadata, embeddings, cluster_info = load_data(args.input)
+        stage.items = len(metadata)
     print(f"Loaded {len(metadata)} songs with {embeddings.shape[1]}-dim embeddings")
+    neighbors = None
+    if args.neighbors:
+        from knn_graph import load_neighbors
+
+        neighbors = load_neighbors(args.input, len(metadata), args.neighbors)
 
     # Ensure collection exists
     ensure_collection(client, embeddings.shape[1])
 
     # Upload
-    upload_to_qdrant(client, metadata, embeddings, cluster_info, batch_size=args.batch_size)
+    with profiler.stage("upload", items=len(metadata)):
+        upload_to_qdrant(client, metadata, embeddings, cluster_info, batch_size=args.batch_size,
+                         neighbors=neighbors, neighbor_count=args.neighbors)
 
     # Test
-    test_search(client, embeddings)
+    with profiler.stage("search"):
+        test_search(client, embeddings)
+    profiler.save(args.input)
 
     print("\nDone! Lyric intelligence is now searchable in Qdrant.")
     print(f"Collection: {COLLECTION_NAME}")
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Lyric Intelligence Pipeline - Viral Score Re-Weighting
+
+embed_hiphop_viral.py writes every track's viral features as one row of
+features.npy (float64, unrounded, metadata row order) and the column
+layout plus the weights it scored with to features_schema.json. Here
+viral_score becomes a single matrix-vector product:
+
+    viral_score = min(100, max(0, int(features @ weights)))
+
+so new weights rescore a whole corpus without touching the lyrics, and
+a sweep scores thousands of weight sets at once as one matrix product
+(features @ weight_sets.T). Directories written before features.npy
+existed fall back to the (rounded) feature fields in their metadata.
+
+Usage:
+    python viral_scorer.py --input ./hiphop_embeddings
+    python viral_scorer.py --input ./hiphop_embeddings --weights '{"hook_score": 5, "phonk_score": 0}'
+    python viral_scorer.py --input ./hiphop_embeddings --sweep 5000 --output sweep.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+FEATURES_FILE = "features.npy"
+SCHEMA_FILE = "features_schema.json"
+
+# Column order of features.npy
+FEATURE_COLUMNS = [
+    "hook_score",
+    "repetition_ratio",
+    "adlib_density",
+    "short_line_ratio",
+    "first_line_punch",
+    "phonk_score",
+    "exclamation_energy",
+    "word_count",
+    "line_count",
+]
+
+# Weights of the shipped viral_score; columns not listed weigh 0
+VIRAL_WEIGHTS = {
+    "hook_score": 10,
+    "repetition_ratio": 30,
+    "adlib_density": 100,
+    "short_line_ratio": 20,
+    "first_line_punch": 10,
+    "phonk_score": 50,
+}
+SCORE_CAP = 100
+
+# analyze_viral_distribution buckets: [low, high) with the last one open
+SCORE_BUCKETS = {"0-20": 0, "20-40": 20, "40-60": 40, "60-80": 60, "80-100": 80}
+HIGH_VIRAL = 50
+
+
+def save_features(output_dir: Path, matrix: np.ndarray):
+    """Write features.npy and its schema."""
+    np.save(output_dir / FEATURES_FILE, np.asarray(matrix, dtype=np.float64))
+    schema = {
+        "columns": FEATURE_COLUMNS,
+        "dtype": "float64",
+        "rows": int(matrix.shape[0]),
+        "row_order": "metadata",
+        "viral_weights": VIRAL_WEIGHTS,
+        "score_cap": SCORE_CAP,
+    }
+    with open(output_dir / SCHEMA_FILE, "w", encoding="utf-8") as f:
+        json.dump(schema, f, indent=2)
+    print(f"Saved features: {output_dir / FEATURES_FILE} (shape: {matrix.shape})")
+
+
+def load_features(input_dir: Path) -> tuple[np.ndarray, list[str]]:
+    """
+    (features, columns) for an embedding directory.
+
+    Uses features.npy when present; otherwise builds the matrix from the
+    metadata fields, whose ratios are rounded, so rescored values can be
+    off by one near integer boundaries.
+    """
+    if (input_dir / FEATURES_FILE).exists():
+        with open(input_dir / SCHEMA_FILE, "r", encoding="utf-8") as f:
+            columns = json.load(f)["columns"]
+        return np.load(input_dir / FEATURES_FILE, mmap_mode="r"), columns
+
+    from embedding_store import load_metadata
+
+    print(f"No {FEATURES_FILE} in {input_dir}; using rounded metadata fields")
+    songs = load_metadata(input_dir, columns=FEATURE_COLUMNS)
+    matrix = np.array([[song.get(c) or 0 for c in FEATURE_COLUMNS] for song in songs], dtype=np.float64)
+    return matrix, FEATURE_COLUMNS
+
+
+def weight_vector(weights: dict[str, float], columns: list[str] = FEATURE_COLUMNS) -> np.ndarray:
+    """Dense weight vector over `columns`; unknown names are an error."""
+    unknown = set(weights) - set(columns)
+    if unknown:
+        raise ValueError(f"Unknown feature columns: {', '.join(sorted(unknown))}")
+    return np.array([weights.get(c, 0.0) for c in columns], dtype=np.float64)
+
+
+def viral_scores(features: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Integer viral scores, clamped to [0, SCORE_CAP].
+
+    `weights` is one weight vector (-> shape (n,)) or a stack of them,
+    one per row (-> shape (n, configs)). A single vector is accumulated
+    column by column, the same additions in the same order as
+    extract_viral_features, so the shipped weights reproduce stored
+    scores exactly; stacks use one matrix product, whose summation order
+    can move a score that lands within ~1e-15 of an integer.
+
+    Negative weights can push a track below zero; those scores are
+    clamped to 0 so they land in the lowest bucket of distribution()
+    and sweep().
+    """
+    features = np.asarray(features)
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.ndim == 1:
+        raw = np.zeros(len(features))
+        for j in np.flatnonzero(weights):
+            raw += features[:, j] * weights[j]
+    else:
+        raw = features @ weights.T
+    # int() truncates toward zero; the floor only matters for negative weights
+    return np.clip(np.trunc(raw), 0, SCORE_CAP).astype(np.int64)
+
+
+def distribution(scores: np.ndarray) -> dict:
+    """analyze_viral_distribution() for one score vector (all zeros when it is empty)."""
+    scores = np.asarray(scores)
+    edges = list(SCORE_BUCKETS.values())
+    counts = np.bincount(np.searchsorted(edges, scores, side="right") - 1, minlength=len(edges))
+    return {
+        "total_tracks": int(len(scores)),
+        "avg_viral_score": round(float(np.mean(scores)), 2) if len(scores) else 0.0,
+        "max_viral_score": int(scores.max()) if len(scores) else 0,
+        "min_viral_score": int(scores.min()) if len(scores) else 0,
+        "high_viral_count": int(np.count_nonzero(scores >= HIGH_VIRAL)),
+        "score_distribution": {name: int(c) for name, c in zip(SCORE_BUCKETS, counts)},
+    }
+
+
+def sweep(features: np.ndarray, weight_sets: np.ndarray, columns: list[str] = FEATURE_COLUMNS) -> list[dict]:
+    """
+    Score every weight set (rows of `weight_sets`) and summarize each.
+
+    All configurations are scored by one matrix product, and the bucket
+    counts by one bincount over (config, bucket) pairs.
+    """
+    scores = viral_scores(features, weight_sets)  # (tracks, configs)
+    configs = scores.shape[1]
+    edges = np.array(list(SCORE_BUCKETS.values()))
+    buckets = np.searchsorted(edges, scores, side="right") - 1
+    counts = np.bincount(
+        (np.arange(configs) * len(edges) + buckets).ravel(), minlength=configs * len(edges)
+    ).reshape(configs, len(edges))
+
+    if len(scores):
+        means = scores.mean(axis=0)
+        stds = scores.std(axis=0)
+    else:
+        means = stds = np.zeros(configs)
+    high = np.count_nonzero(scores >= HIGH_VIRAL, axis=0)
+    return [
+        {
+            "weights": {c: round(float(w), 4) for c, w in zip(columns, weight_sets[i]) if w},
+            "avg_viral_score": round(float(means[i]), 2),
+            "std_viral_score": round(float(stds[i]), 2),
+            "high_viral_count": int(high[i]),
+            "score_distribution": {name: int(c) for name, c in zip(SCORE_BUCKETS, counts[i])},
+        }
+        for i in range(configs)
+    ]
+
+
+def random_weight_sets(count: int, base: dict[str, float] = VIRAL_WEIGHTS, columns: list[str] = FEATURE_COLUMNS,
+                       spread: float = 1.0, seed: int = 42) -> np.ndarray:
+    """`count` weight vectors, each base weight scaled by a uniform factor in [1 - spread, 1 + spread]."""
+    rng = np.random.default_rng(seed)
+    base_vector = weight_vector(base, columns)
+    factors = rng.uniform(max(0.0, 1 - spread), 1 + spread, size=(count, len(columns)))
+    return base_vector * factors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute viral scores from stored features")
+    parser.add_argument("--input", "-i", type=Path, default=Path("./hiphop_embeddings"), help="Embedding directory")
+    parser.add_argument("--weights", type=str, help="JSON weight overrides, e.g. '{\"hook_score\": 5}'")
+    parser.add_argument("--sweep", type=int, help="Score this many random weight sets around the current weights")
+    parser.add_argument("--spread", type=float, default=1.0, help="Sweep factor range: each weight x U(1-spread, 1+spread)")
+    parser.add_argument("--top", type=int, default=5, help="Sweep configurations to print (by score spread)")
+    parser.add_argument("--output", "-o", type=Path, help="Write the distribution / sweep results as JSON")
+
+    args = parser.parse_args()
+
+    features, columns = load_features(args.input)
+    weights = {**VIRAL_WEIGHTS, **json.loads(args.weights)} if args.weights else dict(VIRAL_WEIGHTS)
+    print(f"Loaded {features.shape[0]} tracks x {features.shape[1]} features")
+
+    if args.sweep:
+        import time
+
+        weight_sets = random_weight_sets(args.sweep, weights, columns, spread=args.spread)
+        start = time.perf_counter()
+        results = sweep(features, weight_sets, columns)
+        elapsed = time.perf_counter() - start
+        print(f"Scored {args.sweep} weight sets in {elapsed:.2f}s")
+
+        results.sort(key=lambda r: -r["std_viral_score"])
+        for result in results[:args.top]:
+            print(f"  std {result['std_viral_score']:6.2f}  avg {result['avg_viral_score']:6.2f}  "
+                  f"high {result['high_viral_count']:5d}  {result['weights']}")
+        output = {"weight_sets": args.sweep, "seconds": round(elapsed, 3), "results": results}
+    else:
+        scores = viral_scores(features, weight_vector(weights, columns))
+        output = {"weights": weights, **distribution(scores)}
+        print(json.dumps(output, indent=2))
+
+        if not args.weights:
+            from embedding_store import load_metadata
+
+            # Directories analyzed by song_analyzer.py may not carry a viral_score
+            stored = [s.get("viral_score") for s in load_metadata(args.input, columns=["viral_score"])]
+            if len(stored) == len(scores) and None not in stored:
+                stored = np.array(stored)
+                print(f"Matches stored viral_score for {int(np.sum(stored == scores))}/{len(scores)} tracks")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        print(f"Saved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()